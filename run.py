@@ -2,63 +2,359 @@
 # -*- coding: utf-8 -*-
 """
 Script de démarrage pour NetMonitor (serveur + application web)
+
+Le serveur de réception des métriques et l'application web tournent dans des
+processus distincts (ils ne se partagent plus un même GIL) et communiquent par
+le répertoire de données : catalogue des hôtes, historique, état du serveur.
+L'application web est servie par plusieurs processus (--workers), chacun
+multi-thread, qui se partagent le même socket d'écoute. Le processus principal
+surveille les autres : un processus arrêté anormalement est relancé, et SIGTERM
+ou CTRL+C arrêtent proprement l'ensemble (requêtes en cours terminées, métriques
+en attente enregistrées).
+
+Usage :
+    python3 run.py [--host HOST] [--port PORT] [--web-port PORT] [--workers N]
+                   [--data-dir DIR] [--config FICHIER] [--dev]
+
+Exemples :
+    python3 run.py --host 0.0.0.0 --port 9000 --web-port 5000 --workers 4
+
+    python3 run.py --config netmonitor.ini
+
+    python3 run.py --dev
+
+Fichier de configuration (format INI, section [netmonitor]) :
+    [netmonitor]
+    host = 0.0.0.0
+    port = 9000
+    web_port = 5000
+    workers = 4
+    data_dir = /var/lib/netmonitor
+    secret_key = une-cle-secrete
+
+Les options de la ligne de commande sont prioritaires sur le fichier.
 """
 
-import threading
-import signal
 import os
 import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import configparser
+import multiprocessing
+
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+# Valeurs par défaut de la configuration
+DEFAULTS = {
+    'host': '0.0.0.0',
+    'port': 9000,
+    'web_port': 5000,
+    'workers': 2,
+    'data_dir': None,
+    'upload_folder': None,
+    'secret_key': None,
+    'graceful_timeout': 10,
+    'debug': False,
+}
+
+# Section du fichier de configuration
+CONFIG_SECTION = 'netmonitor'
+
+# Délai (en secondes) avant de relancer un processus arrêté anormalement
+RESTART_DELAY = 1
+
+
+def load_config(args):
+    """
+    Construit la configuration : valeurs par défaut, puis fichier, puis ligne de commande
+    Args:
+        args (argparse.Namespace): Arguments de la ligne de commande
+    Returns:
+        dict: Configuration
+    """
+    config = dict(DEFAULTS)
+
+    if args.config:
+        parser = configparser.ConfigParser()
+        if not parser.read(args.config):
+            sys.exit(f"Fichier de configuration introuvable : {args.config}")
+
+        if parser.has_section(CONFIG_SECTION):
+            section = parser[CONFIG_SECTION]
+
+            for key, default in DEFAULTS.items():
+                if key not in section:
+                    continue
+                if isinstance(default, bool):
+                    config[key] = section.getboolean(key)
+                elif isinstance(default, int):
+                    config[key] = section.getint(key)
+                else:
+                    config[key] = section.get(key)
 
-from web.settings import app, DATA_DIR
-from server import NetMonitorServer
+    for key in DEFAULTS:
+        value = getattr(args, key, None)
+        if value is not None:
+            config[key] = value
 
-# Configuration
-HOST = '0.0.0.0'
-SERVER_PORT = 9000
-WEB_PORT = 5000
-DATA_DIR = DATA_DIR
-DEBUG = True
+    return config
 
-# Instance du serveur
-server = None
 
-def run_server():
-    """Fonction exécutée dans un thread pour démarrer le serveur NetMonitor"""
-    global server
+def configure_app(config):
+    """
+    Applique la configuration à l'application web (avant la création des processus)
+    Args:
+        config (dict): Configuration
+    Returns:
+        Flask: Application configurée
+    """
+    # Clé commune à tous les processus web (jetons CSRF)
+    if config['secret_key']:
+        os.environ['NETMONITOR_SECRET_KEY'] = config['secret_key']
+
+    from web.settings import app
+
+    if config['secret_key']:
+        app.config['SECRET_KEY'] = config['secret_key']
+
+    if config['data_dir']:
+        app.config['DATA_DIR'] = os.path.abspath(config['data_dir'])
+        app.config['UPLOAD_FOLDER'] = os.path.join(app.config['DATA_DIR'], 'files')
+
+    if config['upload_folder']:
+        app.config['UPLOAD_FOLDER'] = os.path.abspath(config['upload_folder'])
+
+    config['data_dir'] = app.config['DATA_DIR']
+    os.makedirs(config['data_dir'], exist_ok=True)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    return app
+
+
+def run_ingest(config):
+    """Processus du serveur de réception des métriques (arrêt propre sur SIGTERM)"""
+    from server import NetMonitorServer
+
+    # CTRL+C est reçu par tout le groupe de processus : l'arrêt est piloté par le parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
     server = NetMonitorServer(
-        host=HOST, 
-        port=SERVER_PORT, 
-        data_dir=DATA_DIR,
-        debug=DEBUG
+        host=config['host'],
+        port=config['port'],
+        data_dir=config['data_dir'],
+        debug=config['debug']
     )
+
+    def stop(signum, frame):
+        # La boucle du serveur se termine au plus tard après un tour de select (1 s)
+        server.running = False
+
+    signal.signal(signal.SIGTERM, stop)
     server.run()
 
-def handle_exit():
-    """Gère la fermeture propre des deux applications lors d'une interruption"""
-    print("\nArrêt en cours...")
-    
-    # Arrêt du serveur NetMonitor
-    if server:
-        server.stop()
-    
-    # Sortie du programme
-    sys.exit(0)
 
-if __name__ == "__main__":
-    # Configuration du gestionnaire de signal pour CTRL+C
-    signal.signal(signal.SIGINT, handle_exit)
-    
-    # S'assurer que le répertoire de données existe
-    os.makedirs(DATA_DIR, exist_ok=True)
-    
-    # Démarrage du serveur dans un thread séparé
-    server_thread = threading.Thread(target=run_server)
-    server_thread.daemon = True  # Le thread s'arrêtera quand le programme principal s'arrête
-    server_thread.start()
-    
-    print(f"Serveur NetMonitor démarré sur {HOST}:{SERVER_PORT}")
-    print(f"Application web démarrée sur {HOST}:{WEB_PORT}")
+class RequestTracker:
+    """
+    Intergiciel WSGI comptant les requêtes en cours, pour les laisser se
+    terminer avant l'arrêt d'un processus web
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        # Flux d'événements (connexion permanente) : le navigateur se reconnecte seul
+        if environ.get('HTTP_ACCEPT') == 'text/event-stream':
+            return self.app(environ, start_response)
+
+        with self.condition:
+            self.active += 1
+
+        try:
+            iterable = self.app(environ, start_response)
+        except BaseException:
+            self.done()
+            raise
+
+        return ClosingIterator(iterable, self.done)
+
+    def done(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def wait(self, timeout):
+        """Attend la fin des requêtes en cours (au plus timeout secondes)"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.active == 0, timeout)
+
+
+def run_web(app, config, fd):
+    """
+    Processus web : serveur WSGI multi-thread sur le socket d'écoute partagé
+    Sur SIGTERM, le socket est fermé puis les requêtes en cours sont terminées.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    tracker = RequestTracker(app)
+    server = make_server(config['host'], config['web_port'], tracker, threaded=True, fd=fd)
+
+    def stop(signum, frame):
+        # shutdown() attend la fin de serve_forever : appel depuis un autre thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    # serve_forever ferme le socket à sa sortie
+    server.serve_forever()
+
+    if not tracker.wait(config['graceful_timeout']):
+        print(f"Processus web {os.getpid()} : requêtes interrompues après {config['graceful_timeout']} s")
+
+
+class Supervisor:
+    """Processus de NetMonitor : démarrage, relance et arrêt propre"""
+
+    def __init__(self, context):
+        self.context = context
+        self.processes = {}
+        self.targets = {}
+        self.stopping = threading.Event()
+
+    def start(self, name, target, args):
+        """Démarre (ou relance) un processus"""
+        self.targets[name] = (target, args)
+
+        process = self.context.Process(target=target, args=args, name=name)
+        process.start()
+        self.processes[name] = process
+
+    def stop(self, signum=None, frame=None):
+        """Demande l'arrêt de tous les processus"""
+        self.stopping.set()
+
+    def supervise(self, timeout):
+        """
+        Relance les processus arrêtés anormalement jusqu'à la demande d'arrêt,
+        puis arrête les processus (SIGTERM, puis SIGKILL après le délai)
+        Args:
+            timeout (int): Délai accordé aux processus pour s'arrêter
+        """
+        while not self.stopping.wait(RESTART_DELAY):
+            for name, process in list(self.processes.items()):
+                if not process.is_alive():
+                    print(f"Processus {name} arrêté (code {process.exitcode}), redémarrage")
+                    target, args = self.targets[name]
+                    self.start(name, target, args)
+
+        print("\nArrêt en cours...")
+
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + timeout + 5
+        for name, process in self.processes.items():
+            process.join(max(deadline - time.monotonic(), 0))
+
+            if process.is_alive():
+                print(f"Processus {name} toujours actif, arrêt forcé")
+                process.kill()
+                process.join()
+
+
+def run_production(config):
+    """Serveur de réception et processus web supervisés"""
+    app = configure_app(config)
+
+    # Création de processus par fork : le socket d'écoute et l'application déjà
+    # chargée sont hérités (sans fork, un seul processus web : le processus principal)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+    supervisor = Supervisor(context)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    signal.signal(signal.SIGTERM, supervisor.stop)
+
+    # Serveur de réception démarré avant l'ouverture du socket web (non hérité)
+    supervisor.start('ingest', run_ingest, (config,))
+    print(f"Serveur NetMonitor démarré sur {config['host']}:{config['port']}")
+
+    if 'fork' not in methods:
+        config['workers'] = 1
+        print(f"Application web démarrée sur {config['host']}:{config['web_port']}")
+        server = make_server(config['host'], config['web_port'], app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        supervisor.supervise(config['graceful_timeout'])
+        server.shutdown()
+        return
+
+    listener = socket.create_server((config['host'], config['web_port']), backlog=128)
+    listener.set_inheritable(True)
+
+    for i in range(config['workers']):
+        supervisor.start(f'web-{i}', run_web, (app, config, listener.fileno()))
+
+    print(f"Application web démarrée sur {config['host']}:{config['web_port']} ({config['workers']} processus)")
     print("Appuyez sur CTRL+C pour arrêter les deux applications")
-    
-    # Démarrage de l'application web Flask (dans le thread principal)
-    app.run(host=HOST, port=WEB_PORT, debug=DEBUG, use_reloader=True)
\ No newline at end of file
+
+    supervisor.supervise(config['graceful_timeout'])
+    listener.close()
+
+
+def run_development(config):
+    """Serveur de développement Flask (débogage, rechargement automatique)"""
+    app = configure_app(config)
+
+    # Le rechargement relance l'application dans un processus fils
+    # (WERKZEUG_RUN_MAIN) : le serveur de réception n'est démarré qu'une fois,
+    # par le processus initial
+    ingest = None
+    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        ingest = multiprocessing.Process(target=run_ingest, args=(config,), name='ingest')
+        ingest.start()
+        print(f"Serveur NetMonitor démarré sur {config['host']}:{config['port']}")
+        print(f"Application web démarrée sur {config['host']}:{config['web_port']}")
+        print("Appuyez sur CTRL+C pour arrêter les deux applications")
+
+    try:
+        app.run(host=config['host'], port=config['web_port'], debug=True, use_reloader=True)
+    finally:
+        if ingest is not None:
+            ingest.terminate()
+            ingest.join()
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='NetMonitor Server')
+    parser.add_argument('--config', help='Configuration file (INI, [netmonitor] section)')
+    parser.add_argument('--host', help='Listen address (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, help='Metrics server port (default: 9000)')
+    parser.add_argument('--web-port', dest='web_port', type=int, help='Web application port (default: 5000)')
+    parser.add_argument('--workers', type=int, help='Number of web processes (default: 2)')
+    parser.add_argument('--data-dir', dest='data_dir', help='Data directory (default: ./data)')
+    parser.add_argument('--upload-folder', dest='upload_folder', help='Shared files directory (default: <data-dir>/files)')
+    parser.add_argument('--graceful-timeout', dest='graceful_timeout', type=int,
+                        help='Seconds allowed for running requests on shutdown (default: 10)')
+    parser.add_argument('--debug', action='store_true', default=None, help='Enable debug logs')
+    parser.add_argument('--dev', action='store_true', help='Flask development server with auto-reload')
+
+    args = parser.parse_args()
+    config = load_config(args)
+
+    if args.dev:
+        config['debug'] = True
+        run_development(config)
+    else:
+        run_production(config)
+
+
+if __name__ == "__main__":
+    main()
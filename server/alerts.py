@@ -0,0 +1,604 @@
+"""
+alerts.py
+
+Ce module évalue les règles d'alerte à la réception des métriques.
+
+Une règle porte sur un chemin de métrique aplati (voir series.flatten_metrics),
+éventuellement avec des jokers (ex. "disk.partitions.*.percent" : toutes les
+partitions). Types de règles :
+    - threshold : valeur comparée à un seuil ;
+    - rate : variation par seconde depuis l'échantillon précédent ;
+    - anomaly : écart à la moyenne mobile exponentielle (EWMA), en nombre
+      d'écarts-types (z-score), après une période d'apprentissage.
+
+Une alerte se déclenche lorsque la condition est vraie depuis au moins "for"
+secondes et se résout dès qu'elle redevient fausse, ou lorsque sa métrique
+n'est plus reçue depuis STALE_INTERVALS intervalles de réception de l'hôte
+(hôte arrêté, partition démontée, règle rattachée après un redémarrage). Les règles sont compilées
+une fois ; chaque échantillon ne met à jour que l'état de (hôte, règle, chemin)
+en temps constant. Seules les transitions (déclenchement, résolution) sont
+écrites dans la base des alertes (alerts.db), lue par l'application web.
+
+Les règles sont lues dans le fichier alerts.json du répertoire de données
+(liste d'objets), à défaut les règles de DEFAULT_RULES s'appliquent :
+    [
+        {"name": "disk_full", "metric": "disk.partitions.*.percent",
+         "type": "threshold", "op": ">", "value": 90, "for": 300,
+         "severity": "critical", "description": "Partition presque pleine"}
+    ]
+"""
+import os
+import re
+import json
+import math
+import time
+import sqlite3
+import operator
+import threading
+
+from .catalog import ONLINE_TIMEOUT
+
+
+ALERTS_NAME = 'alerts.db'
+RULES_NAME = 'alerts.json'
+
+RULE_TYPES = ('threshold', 'rate', 'anomaly')
+
+SEVERITIES = ('info', 'warning', 'critical')
+
+# Intervalles de réception manqués après lesquels une alerte sans nouvelle valeur est résolue
+# (ONLINE_TIMEOUT si l'intervalle de l'hôte n'est pas encore connu)
+STALE_INTERVALS = 3
+
+# Intervalle (en secondes) de recherche des alertes périmées, hors réception (voir NetMonitorServer)
+SWEEP_INTERVAL = 10
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+# Règles appliquées en l'absence de fichier alerts.json
+DEFAULT_RULES = [
+    {
+        'name': 'disk_full',
+        'metric': 'disk.partitions.*.percent',
+        'type': 'threshold',
+        'op': '>',
+        'value': 90,
+        'for': 300,
+        'severity': 'critical',
+        'description': 'Partition presque pleine',
+    },
+    {
+        'name': 'memory_high',
+        'metric': 'memory.virtual_memory.percent',
+        'type': 'threshold',
+        'op': '>',
+        'value': 95,
+        'for': 300,
+        'severity': 'warning',
+        'description': 'Mémoire saturée',
+    },
+    {
+        'name': 'cpu_high',
+        'metric': 'cpu.cpu_percent_avg',
+        'type': 'threshold',
+        'op': '>',
+        'value': 95,
+        'for': 600,
+        'severity': 'warning',
+        'description': 'Processeur saturé',
+    },
+    {
+        'name': 'cpu_anomaly',
+        'metric': 'cpu.cpu_percent_avg',
+        'type': 'anomaly',
+        'value': 4,
+        'for': 0,
+        'severity': 'info',
+        'description': 'Charge processeur inhabituelle',
+    },
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    hostname TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    description TEXT,
+    value REAL,
+    started_at REAL NOT NULL,
+    resolved_at REAL
+);
+CREATE INDEX IF NOT EXISTS alerts_active ON alerts (resolved_at, started_at);
+CREATE INDEX IF NOT EXISTS alerts_started_at ON alerts (started_at);
+CREATE INDEX IF NOT EXISTS alerts_hostname ON alerts (hostname, started_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+ALERT_COLUMNS = (
+    'id',
+    'hostname',
+    'rule',
+    'metric',
+    'severity',
+    'description',
+    'value',
+    'started_at',
+    'resolved_at',
+)
+
+
+def compile_pattern(metric):
+    """
+    Compile un chemin de métrique avec jokers ("*" : un élément du chemin)
+    Args:
+        metric (str): Chemin de métrique
+    Returns:
+        re.Pattern: Expression régulière, ou None si le chemin n'a pas de joker
+    """
+    if '*' not in metric:
+        return None
+    return re.compile('[^.]+'.join(re.escape(part) for part in metric.split('*')) + '$')
+
+
+class AlertRule:
+    """Règle d'alerte compilée"""
+
+    __slots__ = (
+        'index', 'name', 'metric', 'pattern', 'kind', 'compare', 'op',
+        'threshold', 'duration', 'severity', 'description', 'alpha', 'min_samples',
+    )
+
+    def __init__(self, index, spec):
+        """
+        Compile une règle
+        Args:
+            index (int): Position de la règle
+            spec (dict): Définition de la règle (voir DEFAULT_RULES)
+        Raises:
+            ValueError: Si la définition est invalide
+        """
+        try:
+            self.name = str(spec['name'])
+            self.metric = str(spec['metric'])
+        except (KeyError, TypeError):
+            raise ValueError(f"Rule {index}: 'name' and 'metric' are required")
+
+        self.index = index
+        self.pattern = compile_pattern(self.metric)
+        self.kind = spec.get('type', 'threshold')
+        self.op = spec.get('op', '>')
+        self.severity = spec.get('severity', 'warning')
+        self.description = spec.get('description') or self.name
+
+        if self.kind not in RULE_TYPES:
+            raise ValueError(f"Rule {self.name}: unknown type {self.kind!r}")
+        if self.op not in OPERATORS:
+            raise ValueError(f"Rule {self.name}: unknown operator {self.op!r}")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Rule {self.name}: unknown severity {self.severity!r}")
+
+        try:
+            # Seuil : valeur, variation par seconde ou nombre d'écarts-types
+            self.threshold = float(spec.get('value', 3 if self.kind == 'anomaly' else None))
+            self.duration = float(spec.get('for', 0))
+            self.alpha = float(spec.get('alpha', 0.05))
+            self.min_samples = int(spec.get('min_samples', 60))
+        except (TypeError, ValueError):
+            raise ValueError(f"Rule {self.name}: 'value', 'for', 'alpha' and 'min_samples' must be numbers")
+
+        if not 0 < self.alpha <= 1:
+            raise ValueError(f"Rule {self.name}: 'alpha' must be in ]0, 1]")
+
+        self.compare = OPERATORS[self.op]
+
+    def matches(self, path):
+        """Vérifie si un chemin de métrique relève de la règle"""
+        if self.pattern is None:
+            return path == self.metric
+        return self.pattern.match(path) is not None
+
+    def observe(self, state, value, timestamp):
+        """
+        Met à jour l'état d'une série et évalue la condition
+        Args:
+            state (RuleState): État de la série (hôte, règle, chemin)
+            value (float): Valeur reçue
+            timestamp (float): Date de l'échantillon
+        Returns:
+            tuple: (condition vraie, valeur observée : valeur, variation ou z-score)
+        """
+        if self.kind == 'threshold':
+            return self.compare(value, self.threshold), value
+
+        if self.kind == 'rate':
+            previous, previous_time = state.last_value, state.last_time
+            state.last_value, state.last_time = value, timestamp
+
+            if previous is None or timestamp <= previous_time:
+                return False, None
+
+            rate = (value - previous) / (timestamp - previous_time)
+            return self.compare(rate, self.threshold), rate
+
+        # Anomalie : z-score par rapport à la moyenne et à la variance mobiles
+        # (évalué avant la mise à jour, pour que la valeur ne masque pas son propre écart)
+        score = None
+        if state.count >= self.min_samples and state.variance > 0:
+            score = (value - state.mean) / math.sqrt(state.variance)
+
+        if state.count == 0:
+            state.mean = value
+        else:
+            delta = value - state.mean
+            increment = self.alpha * delta
+            state.mean += increment
+            state.variance = (1 - self.alpha) * (state.variance + delta * increment)
+        state.count += 1
+
+        if score is None:
+            return False, None
+        return abs(score) > self.threshold, score
+
+
+class RuleState:
+    """État d'une règle pour une série (hôte, règle, chemin)"""
+
+    __slots__ = ('mean', 'variance', 'count', 'last_value', 'last_time', 'since', 'alert_id', 'seen')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+        self.last_value = None
+        self.last_time = None
+        # Début de la condition en cours, alerte ouverte
+        self.since = None
+        self.alert_id = None
+        # Date de la dernière valeur reçue
+        self.seen = None
+
+
+def load_rules(path):
+    """
+    Lit et compile les règles d'alerte
+    Args:
+        path (str): Fichier de règles (JSON), DEFAULT_RULES s'il n'existe pas
+    Returns:
+        list: Règles compilées
+    Raises:
+        ValueError: Si le fichier ou une règle est invalide
+    """
+    specs = DEFAULT_RULES
+
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                specs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Cannot read alert rules {path}: {str(e)}")
+
+        if not isinstance(specs, list):
+            raise ValueError(f"Alert rules {path} must be a JSON list")
+
+    rules = [AlertRule(index, spec) for index, spec in enumerate(specs)]
+
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError("Alert rule names must be unique")
+
+    return rules
+
+
+class AlertStore:
+    """Base des alertes (ouvertes et résolues)"""
+
+    def __init__(self, metrics_dir):
+        """
+        Initialise la base
+        Args:
+            metrics_dir (str): Répertoire des métriques contenant la base
+        """
+        self.path = os.path.join(metrics_dir, ALERTS_NAME)
+        self._local = threading.local()
+
+    def connect(self):
+        """Retourne la connexion SQLite du thread courant"""
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+
+        return connection
+
+    def close(self):
+        """Ferme la connexion du thread courant"""
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def open(self, hostname, rule, metric, value, started_at):
+        """
+        Enregistre une alerte déclenchée
+        Args:
+            hostname (str): Nom d'hôte
+            rule (AlertRule): Règle déclenchée
+            metric (str): Chemin de la métrique
+            value (float): Valeur observée au déclenchement
+            started_at (float): Début de la condition
+        Returns:
+            int: Identifiant de l'alerte
+        """
+        connection = self.connect()
+
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO alerts (hostname, rule, metric, severity, description, value, started_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (hostname, rule.name, metric, rule.severity, rule.description, value, started_at)
+            )
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+        return cursor.lastrowid
+
+    def resolve(self, alert_id, resolved_at):
+        """
+        Marque une alerte résolue
+        Args:
+            alert_id (int): Identifiant de l'alerte
+            resolved_at (float): Date de résolution
+        """
+        connection = self.connect()
+
+        with connection:
+            connection.execute(
+                "UPDATE alerts SET resolved_at = ? WHERE id = ? AND resolved_at IS NULL",
+                (resolved_at, alert_id)
+            )
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def version(self):
+        """Retourne la version de la base (modifiée à chaque déclenchement ou résolution)"""
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def active(self, hostname=None):
+        """
+        Retourne les alertes en cours, les plus récentes d'abord
+        Args:
+            hostname (str, optional): Limite aux alertes d'un hôte
+        Returns:
+            list: Alertes (dictionnaires)
+        """
+        query = f"SELECT {', '.join(ALERT_COLUMNS)} FROM alerts WHERE resolved_at IS NULL"
+        params = ()
+
+        if hostname is not None:
+            query += " AND hostname = ?"
+            params = (hostname,)
+
+        rows = self.connect().execute(query + " ORDER BY started_at DESC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def recent(self, limit=50, hostname=None):
+        """
+        Retourne les dernières alertes résolues
+        Args:
+            limit (int): Nombre maximal d'alertes
+            hostname (str, optional): Limite aux alertes d'un hôte
+        Returns:
+            list: Alertes (dictionnaires), les plus récentes d'abord
+        """
+        query = f"SELECT {', '.join(ALERT_COLUMNS)} FROM alerts WHERE resolved_at IS NOT NULL"
+        params = (limit,)
+
+        if hostname is not None:
+            query += " AND hostname = ?"
+            params = (hostname, limit)
+
+        rows = self.connect().execute(query + " ORDER BY started_at DESC LIMIT ?", params).fetchall()
+        return [dict(row) for row in rows]
+
+
+class AlertEngine:
+    """Évaluation des règles d'alerte à la réception des métriques"""
+
+    def __init__(self, rules, store, logger):
+        """
+        Initialise le moteur et reprend les alertes ouvertes
+        Args:
+            rules (list): Règles compilées (voir load_rules)
+            store (AlertStore): Base des alertes
+            logger: Logger pour les messages
+        """
+        self.rules = rules
+        self.store = store
+        self.logger = logger
+
+        # Règles sans joker : lecture directe de la valeur
+        self.exact_rules = [rule for rule in rules if rule.pattern is None]
+        self.pattern_rules = [rule for rule in rules if rule.pattern is not None]
+
+        # Chemin -> règles à jokers correspondantes (calculé une fois par chemin)
+        self.path_rules = {}
+
+        # États par hôte : {(position de la règle, chemin): RuleState}
+        self.states = {}
+
+        # Alertes ouvertes : {(hôte, position de la règle, chemin): RuleState}
+        self.firing = {}
+
+        # Dernier échantillon et intervalle de réception de chaque hôte
+        self.last_sample = {}
+        self.intervals = {}
+
+        # Évaluation (thread de stockage) et recherche des alertes périmées (boucle du serveur)
+        self.lock = threading.Lock()
+
+        self.restore()
+
+    def restore(self):
+        """
+        Rattache les alertes ouvertes avant le redémarrage à leur règle ; les
+        alertes d'une règle supprimée sont résolues
+        """
+        rules = {rule.name: rule for rule in self.rules}
+        now = time.time()
+
+        # Sans nouvelle valeur, l'alerte rattachée sera résolue comme périmée (voir sweep)
+
+        for alert in self.store.active():
+            rule = rules.get(alert['rule'])
+
+            if rule is None or not rule.matches(alert['metric']):
+                self.store.resolve(alert['id'], now)
+                continue
+
+            state = RuleState()
+            state.since = alert['started_at']
+            state.alert_id = alert['id']
+            state.seen = now
+            self.states.setdefault(alert['hostname'], {})[(rule.index, alert['metric'])] = state
+            self.firing[(alert['hostname'], rule.index, alert['metric'])] = state
+
+    def matching_rules(self, path):
+        """Retourne les règles à jokers d'un chemin de métrique"""
+        rules = self.path_rules.get(path)
+
+        if rules is None:
+            rules = self.path_rules[path] = tuple(
+                rule for rule in self.pattern_rules if rule.matches(path)
+            )
+
+        return rules
+
+    def evaluate(self, hostname, values, timestamp):
+        """
+        Évalue les règles sur un échantillon
+        Args:
+            hostname (str): Nom d'hôte
+            values (dict): Métriques aplaties {chemin: valeur}
+            timestamp (float): Date de l'échantillon
+        Returns:
+            int: Nombre de transitions (déclenchements et résolutions)
+        """
+        with self.lock:
+            return self._evaluate(hostname, values, timestamp)
+
+    def _evaluate(self, hostname, values, timestamp):
+        """Évalue les règles sur un échantillon (verrou du moteur détenu)"""
+        states = self.states.get(hostname)
+        if states is None:
+            states = self.states[hostname] = {}
+
+        # Intervalle de réception de l'hôte (délai de péremption de ses alertes)
+        previous = self.last_sample.get(hostname)
+        if previous is not None and timestamp > previous:
+            self.intervals[hostname] = timestamp - previous
+        self.last_sample[hostname] = timestamp
+
+        transitions = 0
+
+        for rule in self.exact_rules:
+            value = values.get(rule.metric)
+            if value is not None:
+                transitions += self.apply(hostname, states, rule, rule.metric, value, timestamp)
+
+        if self.pattern_rules:
+            for path, value in values.items():
+                for rule in self.matching_rules(path):
+                    transitions += self.apply(hostname, states, rule, path, value, timestamp)
+
+        return transitions
+
+    def sweep(self, now=None):
+        """
+        Résout les alertes dont la métrique n'a pas été reçue depuis STALE_INTERVALS
+        intervalles de réception de l'hôte
+        Appelée périodiquement, indépendamment de la réception : les alertes d'un
+        hôte arrêté sont résolues même si plus aucun échantillon n'arrive.
+        Args:
+            now (float, optional): Date de référence (par défaut : maintenant)
+        Returns:
+            int: Nombre d'alertes résolues
+        """
+        now = time.time() if now is None else now
+        resolved = 0
+
+        with self.lock:
+            for key, state in list(self.firing.items()):
+                hostname, index, path = key
+                interval = self.intervals.get(hostname)
+                timeout = STALE_INTERVALS * interval if interval else ONLINE_TIMEOUT
+
+                if now - state.seen > timeout:
+                    self.store.resolve(state.alert_id, now)
+                    state.alert_id = None
+                    state.since = None
+                    del self.firing[key]
+                    self.logger.info(
+                        f"Alert {self.rules[index].name} resolved on {hostname}: {path} no longer reported"
+                    )
+                    resolved += 1
+
+        return resolved
+
+    def apply(self, hostname, states, rule, path, value, timestamp):
+        """Applique une règle à une valeur ; retourne 1 en cas de transition"""
+        key = (rule.index, path)
+        state = states.get(key)
+
+        if state is None:
+            state = states[key] = RuleState()
+
+        state.seen = timestamp
+        active, observed = rule.observe(state, value, timestamp)
+
+        # Pas encore de variation ou apprentissage en cours : état inchangé
+        if observed is None:
+            return 0
+
+        if active:
+            if state.since is None:
+                state.since = timestamp
+
+            if state.alert_id is None and timestamp - state.since >= rule.duration:
+                state.alert_id = self.store.open(hostname, rule, path, observed, state.since)
+                self.firing[(hostname, rule.index, path)] = state
+                self.logger.warning(
+                    f"Alert {rule.name} firing on {hostname}: {path} = {observed:.6g}"
+                )
+                return 1
+
+        else:
+            state.since = None
+
+            if state.alert_id is not None:
+                self.store.resolve(state.alert_id, timestamp)
+                state.alert_id = None
+                del self.firing[(hostname, rule.index, path)]
+                self.logger.info(f"Alert {rule.name} resolved on {hostname}: {path}")
+                return 1
+
+        return 0
+
+    def close(self):
+        """Ferme la base des alertes"""
+        self.store.close()
@@ -0,0 +1,164 @@
+"""
+archive.py
+
+Ce module gère les archives compressées de l'historique des métriques.
+
+Les journées terminées sont regroupées dans une archive par jour et par client
+(archive-YYYYMMDD.nma). Chaque échantillon y est compressé séparément avec zlib,
+à l'aide d'un dictionnaire prédéfini (le premier échantillon de la journée), ce
+qui permet de lire un échantillon isolé sans décompresser toute la journée.
+
+Format d'une archive :
+    en-tête   : b'NMA1', taille du dictionnaire (uint32), dictionnaire
+    données   : échantillons compressés, les uns à la suite des autres
+    index     : (timestamp, offset, longueur) pour chaque échantillon
+    pied      : offset de l'index (uint64), nombre d'entrées (uint32), b'NMAI'
+"""
+import os
+import struct
+import zlib
+import itertools
+from datetime import datetime
+
+
+ARCHIVE_PREFIX = 'archive-'
+ARCHIVE_SUFFIX = '.nma'
+ARCHIVE_MAGIC = b'NMA1'
+INDEX_MAGIC = b'NMAI'
+
+HEADER = struct.Struct('<4sI')
+INDEX_ENTRY = struct.Struct('<dQI')
+FOOTER = struct.Struct('<QI4s')
+
+# Taille maximale d'un dictionnaire prédéfini zlib
+MAX_ZDICT_SIZE = 32 * 1024
+
+
+def archive_filename(day):
+    """Retourne le nom de l'archive d'une journée (day au format YYYYMMDD)"""
+    return f"{ARCHIVE_PREFIX}{day}{ARCHIVE_SUFFIX}"
+
+
+def is_archive(filename):
+    """Vérifie si un nom de fichier désigne une archive d'historique"""
+    return filename.startswith(ARCHIVE_PREFIX) and filename.endswith(ARCHIVE_SUFFIX)
+
+
+def day_of(timestamp):
+    """Retourne la journée (YYYYMMDD, heure locale) d'un timestamp"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y%m%d')
+
+
+def write_archive(path, samples):
+    """
+    Écrit une archive à partir d'une suite d'échantillons
+    L'archive est écrite dans un fichier temporaire puis renommée, de sorte
+    qu'un lecteur ne voit jamais une archive incomplète. Les échantillons sont
+    compressés au fur et à mesure : un seul est en mémoire à la fois.
+    Args:
+        path (str): Chemin de l'archive
+        samples (iterable): (timestamp, données brutes), triés par timestamp
+    Returns:
+        list: Liste de (timestamp, offset, longueur) des échantillons écrits
+    """
+    # Dictionnaire prédéfini : fin du premier échantillon
+    samples = iter(samples)
+    first = next(samples, None)
+    zdict = first[1][-MAX_ZDICT_SIZE:] if first else b''
+    if first is not None:
+        samples = itertools.chain((first,), samples)
+    entries = []
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(ARCHIVE_MAGIC, len(zdict)))
+        f.write(zdict)
+
+        for timestamp, data in samples:
+            compressor = zlib.compressobj(level=9, zdict=zdict)
+            compressed = compressor.compress(data) + compressor.flush()
+
+            entries.append((timestamp, f.tell(), len(compressed)))
+            f.write(compressed)
+
+        index_offset = f.tell()
+        for entry in entries:
+            f.write(INDEX_ENTRY.pack(*entry))
+        f.write(FOOTER.pack(index_offset, len(entries), INDEX_MAGIC))
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return entries
+
+
+def read_zdict(f):
+    """Lit le dictionnaire prédéfini dans l'en-tête d'une archive ouverte"""
+    f.seek(0)
+    magic, zdict_size = HEADER.unpack(f.read(HEADER.size))
+
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError("Invalid history archive")
+    return f.read(zdict_size)
+
+
+def read_member(path, offset, length):
+    """
+    Lit et décompresse un échantillon d'une archive
+    Args:
+        path (str): Chemin de l'archive
+        offset (int): Position de l'échantillon compressé
+        length (int): Taille de l'échantillon compressé
+    Returns:
+        bytes: Données de l'échantillon
+    """
+    with open(path, 'rb') as f:
+        zdict = read_zdict(f)
+        f.seek(offset)
+        compressed = f.read(length)
+
+    decompressor = zlib.decompressobj(zdict=zdict)
+    return decompressor.decompress(compressed) + decompressor.flush()
+
+
+def read_index(path):
+    """
+    Lit l'index interne d'une archive
+    Args:
+        path (str): Chemin de l'archive
+    Returns:
+        list: Liste de (timestamp, offset, longueur)
+    """
+    with open(path, 'rb') as f:
+        f.seek(-FOOTER.size, os.SEEK_END)
+        index_offset, count, magic = FOOTER.unpack(f.read(FOOTER.size))
+
+        if magic != INDEX_MAGIC:
+            raise ValueError("Invalid history archive index")
+
+        f.seek(index_offset)
+        data = f.read(count * INDEX_ENTRY.size)
+
+    return [
+        INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size)
+        for i in range(count)
+    ]
+
+
+def read_entry(client_dir, entry):
+    """
+    Lit les données brutes d'une entrée de l'index d'historique
+    Args:
+        client_dir (str): Répertoire des métriques du client
+        entry (HistoryEntry): Entrée de l'index (fichier isolé ou archive)
+    Returns:
+        bytes: Document JSON de l'échantillon
+    """
+    path = os.path.join(client_dir, entry.location)
+
+    if is_archive(entry.location):
+        return read_member(path, entry.offset, entry.length)
+
+    with open(path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,430 @@
+"""
+catalog.py
+
+Ce module gère le catalogue des hôtes surveillés.
+
+Le catalogue est une base SQLite compacte (un enregistrement par hôte) tenue à
+jour par le serveur à chaque réception de métriques. Il contient la date de
+dernière réception et les champs de synthèse affichés par le tableau de bord,
+ce qui permet de lister la flotte page par page sans parcourir data/metrics.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+CATALOG_NAME = 'catalog.db'
+
+# Délai (en secondes) au-delà duquel un hôte est considéré hors ligne
+ONLINE_TIMEOUT = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    hostname TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL,
+    ip_address TEXT,
+    platform TEXT,
+    cpu_percent REAL,
+    memory_percent REAL,
+    disk_percent REAL,
+    version INTEGER NOT NULL DEFAULT 0,
+    disk_max_percent REAL,
+    net_errors INTEGER,
+    net_drops INTEGER,
+    net_error_rate REAL,
+    net_drop_rate REAL,
+    net_bytes INTEGER,
+    net_bytes_rate REAL,
+    wal_sequence INTEGER
+);
+CREATE INDEX IF NOT EXISTS hosts_last_seen ON hosts (last_seen);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('host_count', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+HOST_COLUMNS = (
+    'hostname',
+    'last_seen',
+    'ip_address',
+    'platform',
+    'cpu_percent',
+    'memory_percent',
+    'disk_percent',
+    'version',
+    'disk_max_percent',
+    'net_error_rate',
+    'net_drop_rate',
+    'net_bytes_rate',
+)
+
+# Champs de synthèse d'un hôte, calculés à la réception (réponses allégées)
+SUMMARY_FIELDS = (
+    'hostname',
+    'status',
+    'last_seen',
+    'platform',
+    'cpu_percent',
+    'memory_percent',
+    'disk_percent',
+    'disk_max_percent',
+    'net_bytes_rate',
+    'net_error_rate',
+    'net_drop_rate',
+)
+
+# Colonnes ajoutées après la création du schéma (migration des catalogues existants)
+ADDED_COLUMNS = (
+    ('version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('disk_max_percent', 'REAL'),
+    ('net_errors', 'INTEGER'),
+    ('net_drops', 'INTEGER'),
+    ('net_error_rate', 'REAL'),
+    ('net_drop_rate', 'REAL'),
+    ('net_bytes', 'INTEGER'),
+    ('net_bytes_rate', 'REAL'),
+    ('wal_sequence', 'INTEGER'),
+)
+
+# Classements disponibles : nom -> colonne indexée
+TOP_METRICS = {
+    'cpu': 'cpu_percent',
+    'memory': 'memory_percent',
+    'disk': 'disk_max_percent',
+    'net_errors': 'net_error_rate',
+    'net_drops': 'net_drop_rate',
+}
+
+
+def host_status(last_seen, now=None):
+    """Retourne le statut d'un hôte ('Online' ou 'Offline') selon sa dernière réception"""
+    now = time.time() if now is None else now
+    return 'Online' if now - last_seen < ONLINE_TIMEOUT else 'Offline'
+
+
+def summarize_metrics(metrics):
+    """
+    Extrait les champs de synthèse d'un document de métriques
+    Args:
+        metrics (dict): Métriques envoyées par le client
+    Returns:
+        dict: Champs de synthèse (adresse, plateforme, CPU, mémoire, disque)
+    """
+    cpu = metrics.get('cpu') or {}
+    memory = (metrics.get('memory') or {}).get('virtual_memory') or {}
+    partitions = (metrics.get('disk') or {}).get('partitions') or []
+
+    # Partition racine, ou à défaut la première (comme le tableau de bord)
+    disk_percent = None
+    for partition in partitions:
+        if partition.get('mountpoint') == '/':
+            disk_percent = partition.get('percent')
+            break
+    else:
+        if partitions:
+            disk_percent = partitions[0].get('percent')
+
+    # Partition la plus remplie
+    disk_max_percent = max(
+        (partition['percent'] for partition in partitions if partition.get('percent') is not None),
+        default=None
+    )
+
+    # Compteurs cumulés d'erreurs, de paquets perdus et d'octets de toutes les interfaces
+    net_errors = net_drops = net_bytes = None
+    network = metrics.get('network')
+    if isinstance(network, dict):
+        interfaces = [stats for stats in network.values() if isinstance(stats, dict)]
+        if interfaces:
+            net_errors = sum(stats.get('errin', 0) + stats.get('errout', 0) for stats in interfaces)
+            net_drops = sum(stats.get('dropin', 0) + stats.get('dropout', 0) for stats in interfaces)
+            net_bytes = sum(stats.get('bytes_sent', 0) + stats.get('bytes_recv', 0) for stats in interfaces)
+
+    return {
+        'ip_address': metrics.get('ip_address'),
+        'platform': metrics.get('platform'),
+        'cpu_percent': cpu.get('cpu_percent_avg'),
+        'memory_percent': memory.get('percent'),
+        'disk_percent': disk_percent,
+        'disk_max_percent': disk_max_percent,
+        'net_errors': net_errors,
+        'net_drops': net_drops,
+        'net_bytes': net_bytes,
+    }
+
+
+class HostCatalog:
+    """Catalogue des hôtes (nom, dernière réception, synthèse des métriques)"""
+
+    def __init__(self, metrics_dir):
+        """
+        Initialise le catalogue
+        Args:
+            metrics_dir (str): Répertoire des métriques contenant la base
+        """
+        self.path = os.path.join(metrics_dir, CATALOG_NAME)
+        self._local = threading.local()
+
+    def connect(self):
+        """Retourne la connexion SQLite du thread courant"""
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self.migrate(connection)
+            self._local.connection = connection
+
+        return connection
+
+    def migrate(self, connection):
+        """Ajoute les colonnes absentes d'un catalogue créé par une version antérieure"""
+        columns = {row['name'] for row in connection.execute('PRAGMA table_info(hosts)')}
+
+        with connection:
+            for name, definition in ADDED_COLUMNS:
+                if name not in columns:
+                    connection.execute(f'ALTER TABLE hosts ADD COLUMN {name} {definition}')
+            connection.execute('CREATE INDEX IF NOT EXISTS hosts_version ON hosts (version)')
+
+            # Index des classements : les premiers hôtes se lisent sans trier la flotte, la
+            # date de réception (filtre des hôtes hors ligne) sans lire les enregistrements
+            for column in TOP_METRICS.values():
+                connection.execute(f'DROP INDEX IF EXISTS hosts_{column}')
+                connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS hosts_{column}_last_seen ON hosts ({column}, last_seen)'
+                )
+
+    def close(self):
+        """Ferme la connexion du thread courant"""
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def update(self, hostname, metrics, timestamp=None, sequence=None):
+        """
+        Met à jour l'enregistrement d'un hôte après réception de métriques
+        Args:
+            hostname (str): Nom d'hôte du client
+            metrics (dict): Métriques reçues
+            timestamp (float, optional): Date de réception (par défaut : maintenant)
+            sequence (int, optional): Numéro du message dans le journal du stockage
+        Returns:
+            dict: Enregistrement mis à jour de l'hôte
+        """
+        summary = summarize_metrics(metrics)
+        summary['hostname'] = hostname
+        summary['last_seen'] = time.time() if timestamp is None else timestamp
+        summary['wal_sequence'] = sequence
+
+        connection = self.connect()
+
+        with connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO hosts (hostname, last_seen) VALUES (:hostname, :last_seen)",
+                summary
+            )
+
+            # Nouvel hôte : mise à jour du compteur maintenu dans la table meta
+            if cursor.rowcount:
+                connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'host_count'")
+
+            # Version du catalogue, incrémentée à chaque modification (invalidation des caches)
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+            connection.execute(
+                """
+                UPDATE hosts SET
+                    last_seen = :last_seen,
+                    ip_address = :ip_address,
+                    platform = :platform,
+                    cpu_percent = :cpu_percent,
+                    memory_percent = :memory_percent,
+                    disk_percent = :disk_percent,
+                    disk_max_percent = :disk_max_percent,
+                    net_errors = :net_errors,
+                    net_drops = :net_drops,
+                    net_bytes = :net_bytes,
+                    net_error_rate = CASE
+                        WHEN :net_errors >= net_errors AND :last_seen > last_seen
+                        THEN (:net_errors - net_errors) / (:last_seen - last_seen)
+                    END,
+                    net_drop_rate = CASE
+                        WHEN :net_drops >= net_drops AND :last_seen > last_seen
+                        THEN (:net_drops - net_drops) / (:last_seen - last_seen)
+                    END,
+                    net_bytes_rate = CASE
+                        WHEN :net_bytes >= net_bytes AND :last_seen > last_seen
+                        THEN (:net_bytes - net_bytes) / (:last_seen - last_seen)
+                    END,
+                    wal_sequence = COALESCE(:wal_sequence, wal_sequence),
+                    version = (SELECT value FROM meta WHERE key = 'version')
+                WHERE hostname = :hostname
+                """,
+                summary
+            )
+
+            # Relecture dans la même transaction (RETURNING exige SQLite 3.35)
+            row = connection.execute(
+                f"SELECT {', '.join(HOST_COLUMNS)} FROM hosts WHERE hostname = ?",
+                (hostname,)
+            ).fetchone()
+
+        return self._to_dict(row, time.time())
+
+    def applied_sequence(self, hostname):
+        """
+        Retourne le numéro du dernier message journalisé appliqué pour un hôte
+        Args:
+            hostname (str): Nom d'hôte du client
+        Returns:
+            int: Numéro dans le journal du stockage, ou None (hôte inconnu ou journal inactif)
+        """
+        row = self.connect().execute(
+            "SELECT wal_sequence FROM hosts WHERE hostname = ?", (hostname,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def max_sequence(self):
+        """Retourne le plus grand numéro de message journalisé appliqué (0 par défaut)"""
+        row = self.connect().execute("SELECT MAX(wal_sequence) FROM hosts").fetchone()
+        return row[0] or 0
+
+    def count(self):
+        """Retourne le nombre d'hôtes connus"""
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'host_count'").fetchone()
+        return row[0] if row else 0
+
+    def version(self):
+        """Retourne la version du catalogue (modifiée à chaque mise à jour d'un hôte)"""
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def _to_dict(self, row, now):
+        """Convertit une ligne du catalogue en dictionnaire (statut compris)"""
+        host = dict(row)
+        host['status'] = host_status(host['last_seen'], now)
+        return host
+
+    def get(self, hostname):
+        """
+        Retourne l'enregistrement d'un hôte
+        Args:
+            hostname (str): Nom d'hôte recherché
+        Returns:
+            dict: Enregistrement de l'hôte, ou None s'il est inconnu
+        """
+        row = self.connect().execute(
+            f"SELECT {', '.join(HOST_COLUMNS)} FROM hosts WHERE hostname = ?",
+            (hostname,)
+        ).fetchone()
+        return self._to_dict(row, time.time()) if row else None
+
+    def list_hosts(self, after=None, before=None, limit=60):
+        """
+        Retourne une page d'hôtes triés par nom (pagination par curseur)
+        Args:
+            after (str, optional): Curseur, hôtes dont le nom suit celui-ci
+            before (str, optional): Curseur, hôtes dont le nom précède celui-ci
+            limit (int): Nombre maximal d'hôtes
+        Returns:
+            list: Enregistrements des hôtes de la page
+        """
+        columns = ', '.join(HOST_COLUMNS)
+        connection = self.connect()
+
+        if before is not None:
+            rows = connection.execute(
+                f"SELECT {columns} FROM hosts WHERE hostname < ? ORDER BY hostname DESC LIMIT ?",
+                (before, limit)
+            ).fetchall()
+            rows.reverse()
+        else:
+            rows = connection.execute(
+                f"SELECT {columns} FROM hosts WHERE hostname > ? ORDER BY hostname LIMIT ?",
+                (after or '', limit)
+            ).fetchall()
+
+        now = time.time()
+        return [self._to_dict(row, now) for row in rows]
+
+    def changed_since(self, version, limit=1000):
+        """
+        Retourne les hôtes mis à jour après une version du catalogue
+        Args:
+            version (int): Version de référence
+            limit (int): Nombre maximal d'hôtes
+        Returns:
+            list: Enregistrements des hôtes modifiés, par version croissante
+        """
+        rows = self.connect().execute(
+            f"SELECT {', '.join(HOST_COLUMNS)} FROM hosts WHERE version > ? ORDER BY version LIMIT ?",
+            (version, limit)
+        ).fetchall()
+
+        now = time.time()
+        return [self._to_dict(row, now) for row in rows]
+
+    def top(self, metric, limit=10, include_offline=False, now=None):
+        """
+        Retourne les hôtes ayant les valeurs les plus élevées d'une métrique
+        L'index (colonne, last_seen) est parcouru dans l'ordre décroissant jusqu'à
+        obtenir `limit` hôtes ; les hôtes hors ligne (dernière valeur connue,
+        peut-être très ancienne) sont écartés par SQLite à la lecture de l'index.
+        Args:
+            metric (str): Classement (clé de TOP_METRICS)
+            limit (int): Nombre maximal d'hôtes
+            include_offline (bool): Si True, classe aussi les hôtes hors ligne
+            now (float, optional): Date de référence des statuts (par défaut : maintenant)
+        Returns:
+            list: Enregistrements des hôtes, par valeur décroissante
+        """
+        column = TOP_METRICS[metric]
+        now = time.time() if now is None else now
+
+        # Même condition que host_status : en ligne si now - last_seen < ONLINE_TIMEOUT
+        condition = f"{column} IS NOT NULL"
+        if not include_offline:
+            condition += " AND last_seen > :cutoff"
+
+        rows = self.connect().execute(
+            f"SELECT {', '.join(HOST_COLUMNS)} FROM hosts WHERE {condition} "
+            f"ORDER BY {column} DESC LIMIT :limit",
+            {'cutoff': now - ONLINE_TIMEOUT, 'limit': limit}
+        ).fetchall()
+
+        return [self._to_dict(row, now) for row in rows]
+
+    def summary_rows(self):
+        """
+        Retourne les champs de synthèse de tous les hôtes (calcul des statistiques de la flotte)
+        Returns:
+            list: Tuples (plateforme, cpu, mémoire, disque)
+        """
+        cursor = self.connect().execute(
+            "SELECT platform, cpu_percent, memory_percent, disk_percent FROM hosts"
+        )
+        # Tuples plutôt que sqlite3.Row : plus rapide sur un grand nombre d'hôtes
+        cursor.row_factory = None
+        return cursor.fetchall()
+
+    def has_before(self, hostname):
+        """Vérifie s'il existe un hôte dont le nom précède celui donné"""
+        return self.connect().execute(
+            "SELECT 1 FROM hosts WHERE hostname < ? LIMIT 1", (hostname,)
+        ).fetchone() is not None
+
+    def has_after(self, hostname):
+        """Vérifie s'il existe un hôte dont le nom suit celui donné"""
+        return self.connect().execute(
+            "SELECT 1 FROM hosts WHERE hostname > ? LIMIT 1", (hostname,)
+        ).fetchone() is not None
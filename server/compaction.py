@@ -0,0 +1,197 @@
+"""
+compaction.py
+
+Ce module archive en arrière-plan les journées terminées de l'historique.
+
+Les hôtes dont la journée a changé sont mis en file par le stockage ; un thread
+traite une journée d'un hôte par tick (voir HistoryCompactor.interval), de
+sorte que le passage à minuit ou le redémarrage du serveur ne retardent jamais
+la réception des métriques. Pour chaque hôte, la fin de la dernière journée
+archivée est enregistrée (archive.mark) : l'index n'est jamais reparcouru
+depuis le début.
+
+Seules les journées antérieures au jour courant sont réécrites, alors que le
+stockage n'ajoute des entrées qu'à la fin de l'index : les deux threads ne
+modifient jamais les mêmes enregistrements.
+"""
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from .utils import atomic_write, host_dir
+from .history import HistoryIndex, HistoryEntry
+from .archive import archive_filename, day_of, is_archive, read_entry, write_archive
+
+
+# Fin (timestamp) de la dernière journée archivée d'un client
+WATERMARK_NAME = 'archive.mark'
+
+
+def read_watermark(client_dir):
+    """Retourne la fin de la dernière journée archivée d'un client (0 si aucune)"""
+    try:
+        with open(os.path.join(client_dir, WATERMARK_NAME), 'r') as f:
+            return float(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def write_watermark(client_dir, timestamp):
+    """Enregistre la fin de la dernière journée archivée d'un client"""
+    atomic_write(os.path.join(client_dir, WATERMARK_NAME), repr(float(timestamp)))
+
+
+class HistoryCompactor:
+    """Archivage des journées terminées, une journée d'un hôte par tick"""
+
+    # Intervalle (en secondes) entre deux journées archivées
+    interval = 1.0
+
+    def __init__(self, metrics_dir, logger):
+        """
+        Initialise l'archivage en arrière-plan
+        Args:
+            metrics_dir (str): Répertoire des métriques
+            logger: Logger pour les messages
+        """
+        self.metrics_dir = metrics_dir
+        self.logger = logger
+
+        # Hôtes en attente (sans doublon)
+        self.pending = deque()
+        self.scheduled = set()
+        self.lock = threading.Lock()
+
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def schedule(self, hostname):
+        """Met un hôte en file pour l'archivage de ses journées terminées"""
+        with self.lock:
+            if hostname not in self.scheduled:
+                self.scheduled.add(hostname)
+                self.pending.append(hostname)
+
+    def start(self):
+        """Démarre le thread d'archivage"""
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='compaction', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Arrête le thread d'archivage (après la journée en cours de traitement)"""
+        self.stopping.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        """Boucle du thread : une journée d'un hôte par intervalle"""
+        while not self.stopping.wait(self.interval):
+            self.tick()
+
+    def tick(self, before=None):
+        """
+        Archive la prochaine journée terminée du premier hôte en file
+        Args:
+            before (float, optional): Limite (par défaut : début de la journée en cours)
+        Returns:
+            bool: True si un hôte a été traité
+        """
+        with self.lock:
+            if not self.pending:
+                return False
+            hostname = self.pending.popleft()
+            self.scheduled.discard(hostname)
+
+        try:
+            more = self.compact_next_day(hostname, before)
+        except Exception as e:
+            self.logger.error(f"Error archiving history for client {hostname}: {str(e)}")
+            more = False
+
+        # Journées restantes : l'hôte repasse en fin de file
+        if more:
+            self.schedule(hostname)
+        return True
+
+    def compact_next_day(self, hostname, before=None):
+        """
+        Archive la première journée terminée d'un hôte après sa dernière archive
+        Les échantillons de la journée (fichiers isolés metrics-*.json) sont écrits
+        dans une archive, l'index est redirigé vers celle-ci, puis les fichiers
+        isolés sont supprimés. Les journées déjà archivées sont seulement franchies.
+        Args:
+            hostname (str): Nom d'hôte du client
+            before (float, optional): Limite (par défaut : début de la journée en cours)
+        Returns:
+            bool: True s'il reste des journées terminées à archiver
+        """
+        if before is None:
+            before = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+        client_dir = host_dir(self.metrics_dir, hostname)
+        index = HistoryIndex(client_dir)
+        watermark = read_watermark(client_dir)
+
+        while True:
+            start = index.bisect_left(watermark)
+            first = index.get(start)
+
+            if first is None or first.timestamp >= before:
+                return False
+
+            day = day_of(first.timestamp)
+            day_start = datetime.strptime(day, '%Y%m%d')
+            day_end = (day_start + timedelta(days=1)).timestamp()
+            stop = index.bisect_left(day_end)
+            last = index.get(stop - 1)
+
+            # Journée déjà archivée (archives écrites avant l'enregistrement de la limite)
+            if is_archive(first.location) and is_archive(last.location):
+                watermark = day_end
+                write_watermark(client_dir, watermark)
+                continue
+
+            break
+
+        entries = index.read_range(start, stop)
+        raw_size = 0
+
+        def read_samples():
+            """Lit les échantillons de la journée un par un (voir write_archive)"""
+            nonlocal raw_size
+            for entry in entries:
+                data = read_entry(client_dir, entry)
+                raw_size += len(data)
+                yield entry.timestamp, data
+
+        archive_name = archive_filename(day)
+        archive_path = os.path.join(client_dir, archive_name)
+
+        # Écriture de l'archive puis redirection de l'index vers celle-ci
+        written = write_archive(archive_path, read_samples())
+        index.write_range(start, [
+            HistoryEntry(timestamp, archive_name, offset, length, entry.sequence)
+            for entry, (timestamp, offset, length) in zip(entries, written)
+        ])
+        write_watermark(client_dir, day_end)
+
+        # Suppression des fichiers isolés désormais archivés
+        for entry in entries:
+            if not is_archive(entry.location):
+                try:
+                    os.remove(os.path.join(client_dir, entry.location))
+                except FileNotFoundError:
+                    pass
+
+        archive_size = os.path.getsize(archive_path)
+        ratio = raw_size / archive_size if archive_size else 0
+        self.logger.info(
+            f"History archived for client {hostname} ({day}): "
+            f"{len(written)} samples, {raw_size} -> {archive_size} bytes (x{ratio:.1f})"
+        )
+
+        return day_end < before
@@ -0,0 +1,412 @@
+"""
+forecast.py
+
+Ce module prévoit la date de remplissage des partitions de la flotte.
+
+À chaque réception de métriques, l'espace utilisé de chaque partition
+(disk.partitions envoyé par SystemMonitor.get_disk_info) est rangé dans une
+fenêtre glissante de taille fixe, à raison d'un point par intervalle de
+RESOLUTION secondes (le dernier reçu dans l'intervalle). Périodiquement, une
+régression linéaire (moindres carrés) est calculée en un seul lot sur toutes
+les partitions de tous les hôtes : avec NumPy, les fenêtres forment une
+matrice (une ligne par partition) traitée par opérations vectorisées ; à
+défaut, un calcul en Python pur donne les mêmes résultats.
+
+La pente donne la vitesse de remplissage et, si elle est positive, la date à
+laquelle l'espace utilisé atteindra la taille de la partition. Les résultats
+sont enregistrés en une transaction dans forecast.db, lue par l'application web.
+Les fenêtres y sont sauvegardées à l'arrêt du serveur et rechargées au démarrage.
+"""
+import os
+import math
+import time
+import sqlite3
+import threading
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel
+    np = None
+
+
+FORECAST_NAME = 'forecast.db'
+
+# Un point par intervalle de 30 minutes sur une fenêtre de 24 heures
+RESOLUTION = 1800
+WINDOW_POINTS = 48
+
+# Points nécessaires à une prévision (3 heures de données)
+MIN_POINTS = 6
+
+# Partition sans nouvelle donnée depuis ce nombre d'intervalles : hôte absent, fenêtre oubliée
+STALE_POINTS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    hostname TEXT NOT NULL,
+    mountpoint TEXT NOT NULL,
+    total REAL NOT NULL,
+    used REAL NOT NULL,
+    rate REAL NOT NULL,
+    full_at REAL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (hostname, mountpoint)
+);
+CREATE INDEX IF NOT EXISTS forecasts_full_at ON forecasts (full_at);
+CREATE TABLE IF NOT EXISTS windows (
+    hostname TEXT NOT NULL,
+    mountpoint TEXT NOT NULL,
+    total REAL NOT NULL,
+    buckets BLOB NOT NULL,
+    used BLOB NOT NULL,
+    PRIMARY KEY (hostname, mountpoint)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('computed_at', 0);
+"""
+
+FORECAST_COLUMNS = (
+    'hostname',
+    'mountpoint',
+    'total',
+    'used',
+    'rate',
+    'full_at',
+    'points',
+)
+
+
+class DiskWindow:
+    """Fenêtre glissante de l'espace utilisé d'une partition"""
+
+    __slots__ = ('buckets', 'used', 'total', 'last')
+
+    def __init__(self):
+        # Intervalle de chaque case (-1 : vide) et espace utilisé
+        self.buckets = array('i', [-1] * WINDOW_POINTS)
+        self.used = array('d', [0.0] * WINDOW_POINTS)
+        self.total = 0.0
+        self.last = -1
+
+    def add(self, bucket, used, total):
+        """Enregistre une valeur (remplace la précédente du même intervalle)"""
+        slot = bucket % WINDOW_POINTS
+        self.buckets[slot] = bucket
+        self.used[slot] = used
+        self.total = total
+        self.last = max(self.last, bucket)
+
+    def copy(self):
+        """Retourne une copie indépendante de la fenêtre"""
+        window = DiskWindow.__new__(DiskWindow)
+        window.buckets = array('i', self.buckets)
+        window.used = array('d', self.used)
+        window.total = self.total
+        window.last = self.last
+        return window
+
+
+def fit_numpy(windows, current):
+    """
+    Régression linéaire de toutes les fenêtres en un lot (NumPy)
+    Args:
+        windows (list): Fenêtres (DiskWindow)
+        current (int): Intervalle courant
+    Returns:
+        tuple: Tableaux (nombre de points, pente par intervalle, dernière valeur)
+    """
+    count = len(windows)
+    buckets = np.frombuffer(b''.join(window.buckets for window in windows), dtype=np.int32)
+    buckets = buckets.reshape(count, WINDOW_POINTS)
+    used = np.frombuffer(b''.join(window.used for window in windows), dtype=np.float64)
+    used = used.reshape(count, WINDOW_POINTS)
+
+    # Points de la fenêtre : intervalles récents, abscisses relatives à l'intervalle courant
+    mask = (buckets > current - WINDOW_POINTS) & (buckets >= 0)
+    x = np.where(mask, buckets - current, 0).astype(np.float64)
+    points = mask.sum(axis=1)
+    n = np.maximum(points, 1)
+
+    # Moindres carrés centrés (pas de perte de précision sur des tailles en octets)
+    dx = np.where(mask, x - (x.sum(axis=1) / n)[:, None], 0.0)
+    dy = np.where(mask, used - (np.where(mask, used, 0.0).sum(axis=1) / n)[:, None], 0.0)
+    sxx = (dx * dx).sum(axis=1)
+    sxy = (dx * dy).sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+
+    latest = used[np.arange(count), np.where(mask, buckets, -1).argmax(axis=1)]
+
+    return points.tolist(), slope.tolist(), latest.tolist()
+
+
+def fit_python(windows, current):
+    """Régression linéaire de toutes les fenêtres (Python pur, mêmes résultats que fit_numpy)"""
+    points, slopes, latest = [], [], []
+
+    for window in windows:
+        xs, ys = [], []
+        last_bucket, last_value = -1, 0.0
+
+        for bucket, value in zip(window.buckets, window.used):
+            if bucket >= 0 and bucket > current - WINDOW_POINTS:
+                xs.append(bucket - current)
+                ys.append(value)
+                if bucket > last_bucket:
+                    last_bucket, last_value = bucket, value
+
+        n = len(xs)
+        slope = 0.0
+
+        if n:
+            mean_x = math.fsum(xs) / n
+            mean_y = math.fsum(ys) / n
+            sxx = math.fsum((x - mean_x) ** 2 for x in xs)
+            if sxx > 0:
+                slope = math.fsum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sxx
+
+        points.append(n)
+        slopes.append(slope)
+        latest.append(last_value)
+
+    return points, slopes, latest
+
+
+class DiskForecaster:
+    """Prévision du remplissage des partitions (serveur de réception)"""
+
+    def __init__(self, store):
+        """
+        Initialise le calcul des prévisions (fenêtres sauvegardées au dernier arrêt)
+        Args:
+            store (ForecastStore): Base des prévisions
+        """
+        self.store = store
+
+        # Fenêtres par (hôte, point de montage)
+        self.windows = store.load_windows()
+
+        # Réception (thread de stockage) et calcul (thread des prévisions)
+        self.lock = threading.Lock()
+
+    def record(self, hostname, disk, timestamp):
+        """
+        Enregistre l'espace utilisé des partitions d'un hôte
+        Args:
+            hostname (str): Nom d'hôte
+            disk (dict): Informations disque envoyées par le client
+            timestamp (float): Date de réception
+        """
+        if not isinstance(disk, dict):
+            return
+
+        bucket = int(timestamp // RESOLUTION)
+
+        for partition in disk.get('partitions') or []:
+            try:
+                mountpoint = partition['mountpoint']
+                used = float(partition['used'])
+                total = float(partition['total'])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+            if total <= 0:
+                continue
+
+            key = (hostname, mountpoint)
+
+            with self.lock:
+                window = self.windows.get(key)
+                if window is None:
+                    window = self.windows[key] = DiskWindow()
+
+                window.add(bucket, used, total)
+
+    def compute(self, now=None):
+        """
+        Calcule les prévisions de toutes les partitions et les enregistre
+        Args:
+            now (float, optional): Date du calcul (par défaut : maintenant)
+        Returns:
+            int: Nombre de partitions prévues
+        """
+        now = time.time() if now is None else now
+        current = int(now // RESOLUTION)
+
+        # Copie des fenêtres sous verrou : la réception continue pendant le calcul
+        # (autre thread) sans modifier les valeurs ajustées
+        with self.lock:
+            # Fenêtres des hôtes absents oubliées
+            for key in [key for key, window in self.windows.items() if window.last < current - STALE_POINTS]:
+                del self.windows[key]
+
+            items = [(key, window.copy()) for key, window in self.windows.items()]
+
+        keys = [key for key, _ in items]
+        windows = [window for _, window in items]
+
+        fit = fit_numpy if np is not None and windows else fit_python
+        points, slopes, latest = fit(windows, current)
+
+        rows = []
+        for (hostname, mountpoint), window, count, slope, used in zip(keys, windows, points, slopes, latest):
+            if count < MIN_POINTS:
+                continue
+
+            # Vitesse de remplissage en octets par seconde
+            rate = slope / RESOLUTION
+            full_at = None
+            if rate > 0:
+                full_at = now + max(window.total - used, 0.0) / rate
+
+            rows.append((hostname, mountpoint, window.total, used, rate, full_at, count))
+
+        self.store.replace(rows, now)
+        return len(rows)
+
+    def close(self):
+        """Sauvegarde les fenêtres et ferme la base des prévisions"""
+        with self.lock:
+            self.store.save_windows(self.windows)
+        self.store.close()
+
+
+class ForecastStore:
+    """Base des prévisions de remplissage"""
+
+    def __init__(self, metrics_dir):
+        """
+        Initialise la base
+        Args:
+            metrics_dir (str): Répertoire des métriques contenant la base
+        """
+        self.path = os.path.join(metrics_dir, FORECAST_NAME)
+        self._local = threading.local()
+
+    def connect(self):
+        """Retourne la connexion SQLite du thread courant"""
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+
+        return connection
+
+    def close(self):
+        """Ferme la connexion du thread courant"""
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def replace(self, rows, computed_at):
+        """
+        Remplace toutes les prévisions (une transaction : les lecteurs voient
+        l'ancien ou le nouveau lot, jamais un mélange)
+        Args:
+            rows (list): Tuples (voir FORECAST_COLUMNS)
+            computed_at (float): Date du calcul
+        """
+        connection = self.connect()
+
+        with connection:
+            connection.execute("DELETE FROM forecasts")
+            connection.executemany(
+                f"INSERT INTO forecasts ({', '.join(FORECAST_COLUMNS)}) VALUES ({', '.join('?' * len(FORECAST_COLUMNS))})",
+                rows
+            )
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            connection.execute("UPDATE meta SET value = ? WHERE key = 'computed_at'", (computed_at,))
+
+    def save_windows(self, windows):
+        """
+        Sauvegarde les fenêtres glissantes (arrêt du serveur)
+        Args:
+            windows (dict): Fenêtres par (hôte, point de montage)
+        """
+        connection = self.connect()
+
+        with connection:
+            connection.execute("DELETE FROM windows")
+            connection.executemany(
+                "INSERT INTO windows (hostname, mountpoint, total, buckets, used) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (hostname, mountpoint, window.total, window.buckets.tobytes(), window.used.tobytes())
+                    for (hostname, mountpoint), window in windows.items()
+                )
+            )
+
+    def load_windows(self):
+        """
+        Recharge les fenêtres glissantes sauvegardées
+        Returns:
+            dict: Fenêtres par (hôte, point de montage)
+        """
+        windows = {}
+        cursor = self.connect().execute("SELECT hostname, mountpoint, total, buckets, used FROM windows")
+
+        for hostname, mountpoint, total, buckets, used in cursor:
+            window = DiskWindow()
+            window.buckets = array('i', buckets)
+            window.used = array('d', used)
+
+            # Fenêtre d'une autre résolution (version antérieure) : ignorée
+            if len(window.buckets) != WINDOW_POINTS or len(window.used) != WINDOW_POINTS:
+                continue
+
+            window.total = total
+            window.last = max(window.buckets)
+            windows[(hostname, mountpoint)] = window
+
+        return windows
+
+    def version(self):
+        """Retourne la version des prévisions (modifiée à chaque calcul)"""
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def computed_at(self):
+        """Retourne la date du dernier calcul (0 si aucun)"""
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'computed_at'").fetchone()
+        return row[0] if row else 0
+
+    def soonest(self, limit=10):
+        """
+        Retourne les partitions qui seront pleines le plus tôt
+        Args:
+            limit (int): Nombre maximal de partitions
+        Returns:
+            list: Prévisions (dictionnaires), par date de remplissage croissante
+        """
+        rows = self.connect().execute(
+            f"SELECT {', '.join(FORECAST_COLUMNS)} FROM forecasts "
+            f"WHERE full_at IS NOT NULL ORDER BY full_at LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def for_host(self, hostname):
+        """
+        Retourne les prévisions des partitions d'un hôte
+        Args:
+            hostname (str): Nom d'hôte
+        Returns:
+            list: Prévisions (dictionnaires), par point de montage
+        """
+        rows = self.connect().execute(
+            f"SELECT {', '.join(FORECAST_COLUMNS)} FROM forecasts WHERE hostname = ? ORDER BY mountpoint",
+            (hostname,)
+        ).fetchall()
+        return [dict(row) for row in rows]
@@ -6,11 +6,13 @@ Ce module gère les messages reçus des clients.
 import json
 import time
 
+from .pipeline import Sample, METRICS_PATTERN
+
 
 class MessageHandler:
     """Gère les messages reçus des clients"""
     
-    def __init__(self, client_manager, storage_manager, logger, buffer_size=4096):
+    def __init__(self, client_manager, storage_manager, logger, buffer_size=4096, pipeline=None):
         """
         Initialise le gestionnaire de messages
         Args:
@@ -18,11 +20,14 @@ class MessageHandler:
             storage_manager: Gestionnaire de stockage
             logger: Logger pour les messages
             buffer_size (int): Taille du buffer pour l'envoi des données
+            pipeline (Pipeline, optional): Pipeline de traitement des métriques
+                (à défaut, les métriques sont directement journalisées)
         """
         self.client_manager = client_manager
         self.storage_manager = storage_manager
         self.logger = logger
         self.buffer_size = buffer_size
+        self.pipeline = pipeline
     
     def process_data(self, client_id, data):
         """
@@ -73,6 +78,11 @@ class MessageHandler:
             client_id (str): ID du client
             message (str): Message à traiter
         """
+        # Métriques : décodage confié au pipeline, hors de la boucle de réception
+        if self.pipeline is not None and METRICS_PATTERN.match(message):
+            self.submit_metrics(client_id, message=message)
+            return
+        
         try:
             data = json.loads(message)
             message_type = data.get('type')
@@ -90,11 +100,7 @@ class MessageHandler:
                 
             elif message_type == 'metrics':
                 # Réception de métriques
-                metrics_data = data.get('data')
-                client = self.client_manager.get_client(client_id)
-                if client and client['info']:
-                    hostname = client['info'].get('hostname', 'unknown')
-                    self.storage_manager.store_metrics(hostname, metrics_data)
+                self.submit_metrics(client_id, metrics=data.get('data'))
                 
             elif message_type == 'disconnect':
                 # Déconnexion d'un client
@@ -109,6 +115,42 @@ class MessageHandler:
         except Exception as e:
             self.logger.error(f"Error handling message from client {client_id}: {str(e)}")
     
+    def submit_metrics(self, client_id, message=None, metrics=None):
+        """
+        Transmet les métriques d'un client enregistré au pipeline, ou à défaut au stockage
+        Args:
+            client_id (str): ID du client
+            message (str, optional): Message JSON non décodé
+            metrics (dict, optional): Métriques déjà décodées
+        """
+        client = self.client_manager.get_client(client_id)
+        if not client or not client['info']:
+            return
+        
+        hostname = client['info'].get('hostname', 'unknown')
+        
+        if self.pipeline is None:
+            # Journalisation immédiate, stockage différé par lots
+            self.storage_manager.enqueue_metrics(hostname, metrics)
+            return
+        
+        # Journalisation avant la mise en file : un arrêt brutal ne perd pas les échantillons en cours
+        timestamp = float(int(time.time()))
+        peer = client['addr'][0]
+        position, sequence = self.storage_manager.journal(
+            hostname, timestamp, metrics=metrics, message=message, peer=peer
+        )
+        
+        self.pipeline.submit(Sample(
+            hostname,
+            timestamp,
+            message=message,
+            metrics=metrics,
+            peer=peer,
+            position=position,
+            sequence=sequence
+        ))
+    
     def send_message(self, client_id, data):
         """
         Envoie un message à un client
@@ -0,0 +1,324 @@
+"""
+history.py
+
+Ce module gère l'index temporel de l'historique des métriques d'un client.
+
+L'index est un fichier binaire d'enregistrements de taille fixe, triés par
+horodatage croissant (timestamp -> emplacement de l'échantillon). Il est mis à
+jour à chaque stockage et permet de retrouver un échantillon ou une page de
+l'historique par recherche dichotomique, sans lister le répertoire du client.
+"""
+import os
+import struct
+from collections import namedtuple
+from datetime import datetime
+
+from .archive import is_archive, read_index
+
+
+# Format des noms de fichiers historiques : metrics-YYYYMMDD-HHMMSS.json, puis
+# metrics-YYYYMMDD-HHMMSS-N.json pour les échantillons suivants de la même seconde
+HISTORY_PREFIX = 'metrics-'
+HISTORY_SUFFIX = '.json'
+HISTORY_FORMAT = '%Y%m%d-%H%M%S'
+
+# Enregistrement : timestamp, offset, longueur, rang dans la seconde, emplacement (64 octets)
+RECORD = struct.Struct('<dQIH2x40s')
+
+HistoryEntry = namedtuple('HistoryEntry', ['timestamp', 'location', 'offset', 'length', 'sequence'],
+                          defaults=(0,))
+
+
+def history_filename(timestamp, sequence=0):
+    """Retourne le nom de fichier historique d'un timestamp et de son rang dans la seconde"""
+    date_str = datetime.fromtimestamp(timestamp).strftime(HISTORY_FORMAT)
+    if sequence:
+        date_str = f"{date_str}-{sequence}"
+    return f"{HISTORY_PREFIX}{date_str}{HISTORY_SUFFIX}"
+
+
+def parse_history_name(filename):
+    """
+    Extrait le timestamp et le rang dans la seconde d'un nom de fichier historique
+    Args:
+        filename (str): Nom du fichier (metrics-YYYYMMDD-HHMMSS[-N].json)
+    Returns:
+        tuple: (timestamp, rang), ou None si le nom n'est pas au bon format
+    """
+    if not filename.startswith(HISTORY_PREFIX) or not filename.endswith(HISTORY_SUFFIX):
+        return None
+
+    name = filename[len(HISTORY_PREFIX):-len(HISTORY_SUFFIX)]
+
+    # Partie date de longueur fixe (YYYYMMDD-HHMMSS), suivie du rang éventuel
+    date_str, suffix = name[:15], name[15:]
+
+    try:
+        timestamp = datetime.strptime(date_str, HISTORY_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+    if not suffix:
+        return timestamp, 0
+
+    # Un seul nom par entrée : pas de zéro initial ni de rang nul explicite
+    sequence = suffix[1:]
+    if suffix[0] != '-' or not (sequence.isascii() and sequence.isdigit()) or sequence.startswith('0'):
+        return None
+    return timestamp, int(sequence)
+
+
+def parse_history_filename(filename):
+    """
+    Extrait le timestamp d'un nom de fichier historique
+    Args:
+        filename (str): Nom du fichier (metrics-YYYYMMDD-HHMMSS[-N].json)
+    Returns:
+        float: Timestamp, ou None si le nom n'est pas au bon format
+    """
+    parsed = parse_history_name(filename)
+    return parsed[0] if parsed else None
+
+
+class HistoryIndex:
+    """Index temporel de l'historique d'un client"""
+
+    INDEX_NAME = 'history.idx'
+
+    def __init__(self, client_dir):
+        """
+        Initialise l'index d'historique
+        Args:
+            client_dir (str): Répertoire des métriques du client
+        """
+        self.client_dir = client_dir
+        self.path = os.path.join(client_dir, self.INDEX_NAME)
+
+    def exists(self):
+        """Vérifie si le fichier d'index existe"""
+        return os.path.exists(self.path)
+
+    def __len__(self):
+        """Nombre d'entrées complètes dans l'index"""
+        try:
+            return os.path.getsize(self.path) // RECORD.size
+        except OSError:
+            return 0
+
+    def _unpack(self, data):
+        """Décode un enregistrement binaire"""
+        timestamp, offset, length, sequence, location = RECORD.unpack(data)
+        return HistoryEntry(timestamp, location.rstrip(b'\0').decode('utf-8'), offset, length, sequence)
+
+    def _pack(self, entry):
+        """Encode une entrée en enregistrement binaire"""
+        return RECORD.pack(entry.timestamp, entry.offset, entry.length, entry.sequence,
+                           entry.location.encode('utf-8'))
+
+    def read_range(self, start, end):
+        """
+        Lit les entrées d'indices [start, end[
+        Args:
+            start (int): Premier indice
+            end (int): Indice de fin (exclu)
+        Returns:
+            list: Entrées lues, dans l'ordre chronologique
+        """
+        start = max(start, 0)
+        end = min(end, len(self))
+
+        if start >= end:
+            return []
+
+        with open(self.path, 'rb') as f:
+            f.seek(start * RECORD.size)
+            data = f.read((end - start) * RECORD.size)
+
+        return [
+            self._unpack(data[i:i + RECORD.size])
+            for i in range(0, len(data) - RECORD.size + 1, RECORD.size)
+        ]
+
+    def get(self, position):
+        """Retourne l'entrée à l'indice donné"""
+        entries = self.read_range(position, position + 1)
+        return entries[0] if entries else None
+
+    def last(self):
+        """Retourne l'entrée la plus récente"""
+        return self.get(len(self) - 1)
+
+    def bisect_left(self, timestamp):
+        """Indice de la première entrée dont le timestamp est >= timestamp"""
+        low, high = 0, len(self)
+
+        if not high:
+            return 0
+
+        with open(self.path, 'rb') as f:
+            while low < high:
+                middle = (low + high) // 2
+                f.seek(middle * RECORD.size)
+                entry = self._unpack(f.read(RECORD.size))
+
+                if entry.timestamp < timestamp:
+                    low = middle + 1
+                else:
+                    high = middle
+
+        return low
+
+    def find(self, timestamp):
+        """
+        Recherche l'entrée correspondant exactement à un timestamp
+        Args:
+            timestamp (float): Timestamp recherché
+        Returns:
+            HistoryEntry: Entrée trouvée, ou None
+        """
+        entry = self.get(self.bisect_left(timestamp))
+
+        if entry and entry.timestamp == timestamp:
+            return entry
+        return None
+
+    def find_by_name(self, filename):
+        """Recherche l'entrée d'un fichier historique à partir de son nom"""
+        parsed = parse_history_name(filename)
+
+        if parsed is None:
+            return None
+
+        # Les entrées d'une même seconde se suivent, par rang croissant
+        timestamp, sequence = parsed
+        entry = self.get(self.bisect_left(timestamp) + sequence)
+
+        if entry and entry.timestamp == timestamp and entry.sequence == sequence:
+            return entry
+        return None
+
+    def append(self, timestamp, location, offset=0, length=0, sequence=0):
+        """
+        Ajoute une entrée à la fin de l'index
+        Si l'entrée désigne le même emplacement que la dernière (échantillon réécrit),
+        la dernière entrée est remplacée.
+        Args:
+            timestamp (float): Horodatage de l'échantillon
+            location (str): Fichier contenant l'échantillon
+            offset (int): Position de l'échantillon dans le fichier
+            length (int): Taille de l'échantillon en octets
+            sequence (int): Rang de l'échantillon dans la seconde (voir next_key)
+        """
+        entry = HistoryEntry(timestamp, location, offset, length, sequence)
+        last = self.last()
+
+        if last and last.location == location and last.offset == offset:
+            self.replace(len(self) - 1, entry)
+            return
+
+        with open(self.path, 'ab') as f:
+            f.write(self._pack(entry))
+
+    def replace(self, position, entry):
+        """Remplace l'entrée à l'indice donné"""
+        with open(self.path, 'r+b') as f:
+            f.seek(position * RECORD.size)
+            f.write(self._pack(entry))
+
+    def write_range(self, start, entries):
+        """Remplace les entrées consécutives à partir de l'indice donné"""
+        with open(self.path, 'r+b') as f:
+            f.seek(start * RECORD.size)
+            f.write(b''.join(self._pack(entry) for entry in entries))
+
+    def next_key(self, timestamp):
+        """
+        Retourne le timestamp et le rang dans la seconde d'un nouvel échantillon
+        Le timestamp n'est jamais avancé au-delà de l'heure de réception : seul un
+        échantillon en retard est ramené à la dernière entrée pour garder l'ordre
+        croissant de l'index. Les échantillons d'une même seconde sont numérotés
+        (un fichier chacun, voir history_filename).
+        Args:
+            timestamp (float): Date de réception
+        Returns:
+            tuple: (timestamp, rang)
+        """
+        last = self.last()
+
+        if last and timestamp <= last.timestamp:
+            return last.timestamp, last.sequence + 1
+        return timestamp, 0
+
+    def page(self, page, per_page):
+        """
+        Retourne une page d'entrées, de la plus récente à la plus ancienne
+        Args:
+            page (int): Numéro de page (à partir de 1)
+            per_page (int): Nombre d'entrées par page
+        Returns:
+            list: Entrées de la page
+        """
+        end = len(self) - (page - 1) * per_page
+        return list(reversed(self.read_range(end - per_page, end)))
+
+    def before(self, timestamp, limit):
+        """Retourne les `limit` entrées précédant un timestamp (plus récente en premier)"""
+        end = self.bisect_left(timestamp)
+        return list(reversed(self.read_range(end - limit, end)))
+
+    def after(self, timestamp, limit):
+        """Retourne les `limit` entrées suivant un timestamp (plus récente en premier)"""
+        start = self.bisect_left(timestamp)
+
+        # Ignorer l'entrée correspondant exactement au curseur
+        first = self.get(start)
+        if first and first.timestamp == timestamp:
+            start += 1
+
+        return list(reversed(self.read_range(start, start + limit)))
+
+    def rebuild(self):
+        """
+        Reconstruit l'index à partir des fichiers historiques et des archives du répertoire
+        Utilisé pour les répertoires créés avant l'introduction de l'index.
+        Returns:
+            int: Nombre d'entrées indexées
+        """
+        entries = []
+
+        archived = set()
+
+        for filename in os.listdir(self.client_dir):
+            if is_archive(filename):
+                archive_path = os.path.join(self.client_dir, filename)
+
+                # Rang dans la seconde : ordre d'écriture dans l'archive
+                previous, sequence = None, 0
+                for timestamp, offset, length in read_index(archive_path):
+                    sequence = sequence + 1 if timestamp == previous else 0
+                    previous = timestamp
+                    entries.append(HistoryEntry(timestamp, filename, offset, length, sequence))
+                    archived.add((timestamp, sequence))
+
+        for filename in os.listdir(self.client_dir):
+            key = parse_history_name(filename)
+
+            # Les fichiers déjà présents dans une archive sont ignorés
+            if key is not None and key not in archived:
+                entries.append(HistoryEntry(key[0], filename, 0, 0, key[1]))
+
+        entries.sort(key=lambda entry: (entry.timestamp, entry.sequence))
+
+        # Écriture atomique pour ne jamais exposer un index partiel
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for entry in entries:
+                f.write(self._pack(entry))
+        os.replace(tmp_path, self.path)
+
+        return len(entries)
+
+    def ensure(self):
+        """Crée l'index s'il n'existe pas encore"""
+        if not self.exists():
+            self.rebuild()
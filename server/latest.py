@@ -0,0 +1,439 @@
+"""
+latest.py
+
+Ce module publie la synthèse des dernières métriques de chaque hôte en mémoire
+partagée (multiprocessing.shared_memory).
+
+Le serveur de réception est le seul écrivain : à chaque mise à jour du catalogue
+des hôtes, l'enregistrement de l'hôte (taille fixe) est réécrit dans sa case.
+Les processus web lisent la table sans appel système ni décodage JSON.
+
+Organisation de la zone partagée :
+    - en-tête : signature, capacité, nombre de cases utilisées, génération
+      (version du catalogue publiée), processus écrivain, état ;
+    - compteurs de séquence (un par case) ;
+    - enregistrements (nom d'hôte, plateforme, dernière réception, synthèse).
+
+Chaque case est protégée par un verrou de séquence (seqlock) : l'écrivain rend
+le compteur impair pendant l'écriture puis pair, et un lecteur recommence sa
+lecture si le compteur était impair ou a changé, au plus MAX_READ_RETRIES
+fois (écrivain arrêté au milieu d'une écriture : TableUnavailable, les
+lecteurs se replient sur le catalogue). Les lecteurs ne prennent
+aucun verrou et ne bloquent jamais l'écrivain. Les cases sont attribuées dans
+l'ordre d'arrivée des hôtes et ne sont jamais réutilisées : chaque lecteur
+complète son propre index nom d'hôte -> case à partir des nouvelles cases.
+Un nom d'hôte plus long que HOSTNAME_SIZE n'est jamais tronqué (deux hôtes
+partageraient une clé) : la table est marquée pleine, comme lorsque sa capacité
+est atteinte, et les lecteurs utilisent le catalogue.
+"""
+import os
+import time
+import struct
+import hashlib
+from multiprocessing import shared_memory, resource_tracker
+
+# Signature de la zone partagée
+MAGIC = b'NML2'
+
+# Nombre de cases par défaut (environ 14 Mo)
+DEFAULT_CAPACITY = 65536
+
+# En-tête : signature, capacité, cases utilisées, état, génération, processus écrivain
+HEADER = struct.Struct('<4sIIIqI4x')
+
+# Compteur de séquence d'une case
+SEQ = struct.Struct('<I')
+
+# Enregistrement : nom d'hôte, plateforme, dernière réception, synthèse, version
+RECORD = struct.Struct('<128s16s8dq')
+
+# Taille des champs texte (nom d'hôte plus long : table pleine ; plateforme tronquée)
+HOSTNAME_SIZE = 128
+PLATFORM_SIZE = 16
+
+# Champs de l'enregistrement (dans l'ordre de RECORD)
+RECORD_FIELDS = (
+    'hostname',
+    'platform',
+    'last_seen',
+    'cpu_percent',
+    'memory_percent',
+    'disk_percent',
+    'disk_max_percent',
+    'net_error_rate',
+    'net_drop_rate',
+    'net_bytes_rate',
+    'version',
+)
+
+# États de la table
+STATE_OPEN = 0
+STATE_FULL = 1
+STATE_CLOSED = 2
+
+# Intervalle (en secondes) de vérification de l'écrivain par les lecteurs
+CHECK_INTERVAL = 1.0
+
+# Nombre maximal de lectures d'une case avant d'abandonner (écriture jamais terminée)
+MAX_READ_RETRIES = 1000
+
+NAN = float('nan')
+
+
+def table_name(metrics_dir):
+    """Nom de la zone partagée d'un répertoire de métriques"""
+    digest = hashlib.sha1(os.path.abspath(metrics_dir).encode('utf-8')).hexdigest()[:12]
+    return f"netmonitor-{digest}"
+
+
+def table_size(capacity):
+    """Taille de la zone partagée pour une capacité donnée"""
+    return HEADER.size + capacity * (SEQ.size + RECORD.size)
+
+
+def encode_text(value, size):
+    """Encode une chaîne dans un champ de taille fixe (tronquée sans couper un caractère)"""
+    data = (value or '').encode('utf-8')[:size]
+    return data.decode('utf-8', 'ignore').encode('utf-8')
+
+
+def decode_record(values):
+    """Convertit un enregistrement brut en tuple (textes décodés, None pour les valeurs absentes)"""
+    return (
+        values[0].rstrip(b'\0').decode('utf-8'),
+        values[1].rstrip(b'\0').decode('utf-8') or None,
+    ) + tuple(None if value != value else value for value in values[2:])
+
+
+def process_alive(pid):
+    """Vérifie si un processus existe (éventuellement d'un autre utilisateur)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TableUnavailable(Exception):
+    """Case illisible : table fermée ou écrivain arrêté pendant une écriture"""
+
+
+class LatestTable:
+    """Table des dernières métriques des hôtes en mémoire partagée"""
+
+    def __init__(self, shm, writer=False):
+        self.shm = shm
+        self.buf = shm.buf
+        self.writer = writer
+        self.capacity = HEADER.unpack_from(self.buf, 0)[1]
+        self.seq_offset = HEADER.size
+        self.record_offset = HEADER.size + self.capacity * SEQ.size
+
+        # Index nom d'hôte -> case (complété à partir des nouvelles cases)
+        self.slots = {}
+        self.known = 0
+        self.checked = time.monotonic()
+
+    @classmethod
+    def create(cls, metrics_dir, capacity=DEFAULT_CAPACITY):
+        """
+        Crée la table (serveur de réception) ; une table laissée par un
+        serveur arrêté est marquée fermée puis remplacée
+        Args:
+            metrics_dir (str): Répertoire des métriques
+            capacity (int): Nombre maximal d'hôtes
+        Returns:
+            LatestTable: Table ouverte en écriture
+        Raises:
+            FileExistsError: Si un autre serveur actif publie déjà la table
+        """
+        name = table_name(metrics_dir)
+
+        try:
+            previous = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            pass
+        else:
+            pid = HEADER.unpack_from(previous.buf, 0)[5] if len(previous.buf) >= HEADER.size else 0
+
+            # Table d'un serveur toujours actif (même répertoire de données) : conservée
+            if pid and pid != os.getpid() and process_alive(pid):
+                previous.close()
+                raise FileExistsError(f"Latest metrics table {name} is published by running process {pid}")
+
+            # Les lecteurs encore attachés détectent la fermeture et se rattachent
+            HEADER.pack_into(previous.buf, 0, MAGIC, 0, 0, STATE_CLOSED, 0, 0)
+            previous.close()
+            previous.unlink()
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=table_size(capacity))
+        HEADER.pack_into(shm.buf, 0, MAGIC, capacity, 0, STATE_OPEN, 0, os.getpid())
+
+        return cls(shm, writer=True)
+
+    @classmethod
+    def attach(cls, metrics_dir):
+        """
+        Ouvre la table en lecture (processus web)
+        Args:
+            metrics_dir (str): Répertoire des métriques
+        Returns:
+            LatestTable: Table, ou None si aucun serveur ne la publie
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=table_name(metrics_dir))
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # Le lecteur ne doit pas supprimer la zone à sa sortie (suivi réservé à l'écrivain)
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+        # Table fermée ou pleine (hôtes manquants) : les lecteurs utilisent le catalogue
+        if bytes(shm.buf[:4]) != MAGIC or HEADER.unpack_from(shm.buf, 0)[3] != STATE_OPEN:
+            shm.close()
+            return None
+
+        return cls(shm)
+
+    def count(self):
+        """Retourne le nombre d'hôtes publiés"""
+        return self.header()[2]
+
+    def header(self):
+        """Retourne l'en-tête (signature, capacité, cases, état, génération, écrivain)"""
+        return HEADER.unpack_from(self.buf, 0)
+
+    def generation(self):
+        """Retourne la version du catalogue publiée en dernier"""
+        return self.header()[4]
+
+    def is_valid(self):
+        """
+        Vérifie que la table est toujours publiée : non fermée, complète, et
+        (au plus une fois par CHECK_INTERVAL) écrivain toujours actif
+        """
+        _, _, _, state, _, pid = self.header()
+
+        if state != STATE_OPEN:
+            return False
+
+        now = time.monotonic()
+        if not self.writer and now - self.checked >= CHECK_INTERVAL:
+            self.checked = now
+            if not process_alive(pid):
+                return False
+
+        return True
+
+    # Écriture (serveur de réception uniquement)
+
+    def publish(self, host):
+        """
+        Publie l'enregistrement d'un hôte
+        Args:
+            host (dict): Enregistrement du catalogue (voir HostCatalog)
+        Returns:
+            bool: False si la table est pleine (ou le nom d'hôte trop long)
+        """
+        hostname = host['hostname']
+        name = hostname.encode('utf-8')
+        slot = self.slots.get(hostname)
+        magic, capacity, count, state, generation, pid = self.header()
+
+        if slot is None:
+            # Hôte absent de la table : les lecteurs doivent utiliser le catalogue
+            if count >= capacity or len(name) > HOSTNAME_SIZE:
+                HEADER.pack_into(self.buf, 0, magic, capacity, count, STATE_FULL, generation, pid)
+                return False
+            slot = count
+
+        values = (
+            name,
+            encode_text(host.get('platform'), PLATFORM_SIZE),
+        ) + tuple(
+            NAN if host.get(field) is None else float(host[field])
+            for field in RECORD_FIELDS[2:-1]
+        ) + (host.get('version') or 0,)
+
+        seq_offset = self.seq_offset + slot * SEQ.size
+        seq = SEQ.unpack_from(self.buf, seq_offset)[0]
+
+        # Compteur impair pendant l'écriture : les lecteurs recommencent
+        SEQ.pack_into(self.buf, seq_offset, (seq + 1) & 0xFFFFFFFF)
+        RECORD.pack_into(self.buf, self.record_offset + slot * RECORD.size, *values)
+        SEQ.pack_into(self.buf, seq_offset, (seq + 2) & 0xFFFFFFFF)
+
+        # Nouvelle case visible des lecteurs une fois entièrement écrite
+        if slot == count:
+            self.slots[hostname] = slot
+            count += 1
+
+        HEADER.pack_into(self.buf, 0, magic, capacity, count, state, max(generation, values[-1]), pid)
+        return True
+
+    def load(self, hosts):
+        """Publie les enregistrements existants (démarrage du serveur)"""
+        for host in hosts:
+            if not self.publish(host):
+                return False
+        return True
+
+    def close(self):
+        """Ferme la table ; l'écrivain la marque fermée et la supprime"""
+        if self.writer:
+            magic, capacity, count, _, generation, pid = self.header()
+            HEADER.pack_into(self.buf, 0, magic, capacity, count, STATE_CLOSED, generation, pid)
+
+        self.buf = None
+        self.shm.close()
+
+        if self.writer:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    # Lecture (processus web)
+
+    def read_raw(self, slot):
+        """
+        Lit un enregistrement brut de façon cohérente (verrou de séquence)
+        Args:
+            slot (int): Case
+        Returns:
+            bytes: Enregistrement (format RECORD)
+        Raises:
+            TableUnavailable: Si la case reste en cours d'écriture ou si la table n'est plus publiée
+        """
+        seq_offset = self.seq_offset + slot * SEQ.size
+        record_offset = self.record_offset + slot * RECORD.size
+
+        for _ in range(MAX_READ_RETRIES):
+            before = SEQ.unpack_from(self.buf, seq_offset)[0]
+
+            if before & 1:
+                # Écriture en cours : laisse l'écrivain terminer, s'il est toujours actif
+                if not self.is_valid():
+                    break
+                time.sleep(0)
+                continue
+
+            data = self.buf[record_offset:record_offset + RECORD.size].tobytes()
+
+            if SEQ.unpack_from(self.buf, seq_offset)[0] == before:
+                return data
+
+        raise TableUnavailable(f"Slot {slot} of the latest metrics table cannot be read")
+
+    def read(self, slot):
+        """
+        Lit un enregistrement de façon cohérente
+        Args:
+            slot (int): Case
+        Returns:
+            tuple: Enregistrement décodé (voir RECORD_FIELDS)
+        """
+        return decode_record(RECORD.unpack(self.read_raw(slot)))
+
+    def refresh_index(self):
+        """Ajoute à l'index local les cases attribuées depuis la dernière lecture"""
+        count = self.header()[2]
+
+        for slot in range(self.known, count):
+            # Le nom d'hôte d'une case ne change jamais
+            hostname = RECORD.unpack_from(self.buf, self.record_offset + slot * RECORD.size)[0]
+            self.slots[hostname.rstrip(b'\0').decode('utf-8')] = slot
+
+        self.known = count
+        return count
+
+    def get(self, hostname):
+        """
+        Retourne l'enregistrement d'un hôte
+        Args:
+            hostname (str): Nom d'hôte
+        Returns:
+            dict: Enregistrement (voir RECORD_FIELDS), ou None si l'hôte est inconnu
+        """
+        slot = self.slots.get(hostname)
+
+        if slot is None:
+            self.refresh_index()
+            slot = self.slots.get(hostname)
+            if slot is None:
+                return None
+
+        return dict(zip(RECORD_FIELDS, self.read(slot)))
+
+    def copy(self):
+        """
+        Copie de façon cohérente les enregistrements de toutes les cases
+        La zone est copiée en une fois ; seules les cases modifiées pendant la
+        copie (compteur différent avant et après, ou impair) sont relues.
+        Returns:
+            bytearray: Enregistrements bruts (format RECORD), par case
+        """
+        count = self.header()[2]
+        seq_end = self.seq_offset + count * SEQ.size
+
+        seqs_before = self.buf[self.seq_offset:seq_end].tobytes()
+        data = bytearray(self.buf[self.record_offset:self.record_offset + count * RECORD.size])
+        seqs_after = self.buf[self.seq_offset:seq_end].tobytes()
+
+        # Cases en cours d'écriture pendant la copie
+        before = memoryview(seqs_before).cast('I')
+        if seqs_before == seqs_after:
+            dirty = [slot for slot, seq in enumerate(before) if seq & 1]
+        else:
+            after = memoryview(seqs_after).cast('I')
+            dirty = [slot for slot in range(count) if before[slot] != after[slot] or before[slot] & 1]
+
+        for slot in dirty:
+            data[slot * RECORD.size:(slot + 1) * RECORD.size] = self.read_raw(slot)
+
+        return data
+
+    def snapshot(self):
+        """
+        Retourne une image cohérente de toute la table
+        Returns:
+            list: Enregistrements décodés (voir RECORD_FIELDS), par case
+        """
+        return [decode_record(values) for values in RECORD.iter_unpack(self.copy())]
+
+    def summary_rows(self):
+        """
+        Retourne les champs de synthèse de tous les hôtes (même format que
+        HostCatalog.summary_rows), sans décoder les enregistrements entiers
+        Returns:
+            list: Tuples (plateforme, cpu, mémoire, disque)
+        """
+        data = self.copy()
+        size = RECORD.size
+
+        # Valeurs lues en colonnes : un enregistrement occupe un multiple de 8 octets
+        values = memoryview(data).cast('d')
+        stride = size // 8
+        first = (HOSTNAME_SIZE + PLATFORM_SIZE) // 8 + 1
+
+        columns = [
+            [None if value != value else value for value in values[first + index::stride].tolist()]
+            for index in range(3)
+        ]
+
+        # Quelques plateformes distinctes : décodage une fois par valeur
+        names = {}
+        platforms = []
+        for offset in range(HOSTNAME_SIZE, len(data), size):
+            raw = bytes(data[offset:offset + PLATFORM_SIZE])
+            name = names.get(raw)
+            if name is None:
+                name = names[raw] = raw.rstrip(b'\0').decode('utf-8') or None
+            platforms.append(name)
+
+        return list(zip(platforms, *columns))
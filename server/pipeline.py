@@ -0,0 +1,804 @@
+"""
+pipeline.py
+
+Ce module traite les métriques reçues par un pipeline d'étapes configurables.
+
+Chaque message de métriques devient un échantillon (Sample) qui traverse les
+étapes suivantes, puis est distribué à chaque destination (sink) :
+    - decode : analyse du message JSON (valeurs NaN et Infinity refusées) ;
+    - validate : vérification du type des sections du document ;
+    - filter : suppression des champs inutiles avant tout stockage
+      (ex. interface de bouclage, points de montage snap) ;
+    - enrich : étiquettes fixes et adresse IP de la connexion si absente ;
+    - rates : aplatissement des champs numériques (voir series.flatten_metrics)
+      et débits par seconde des compteurs cumulés ("<chemin>_rate") ;
+    - rollup : minimum, maximum et moyenne par intervalle de champs choisis,
+      écrits dans les séries du sous-répertoire rollup du client (optionnel) ;
+    - sinks : stockage (journal, historique, séries, catalogue, alertes) et
+      éventuellement envoi à un serveur Graphite (protocole texte).
+
+Chaque étape dispose d'un groupe de threads alimentés chacun par une file
+bornée. Les échantillons d'un hôte sont toujours confiés au même thread :
+l'ordre de réception et l'état par hôte (débits, agrégats) sont préservés.
+Une file pleine bloque l'étape précédente, et en dernier lieu la boucle de
+réception du serveur (contre-pression vers les clients), sauf celle d'une
+destination externe : l'échantillon lui est alors retiré et compté (dropped),
+un serveur Graphite lent ne ralentit pas la réception. Le temps passé dans
+chaque étape est mesuré (voir Pipeline.stats, publié dans l'état du serveur).
+Le stockage n'a qu'un thread, seul à utiliser le StorageManager.
+
+Chaque message est journalisé par la boucle de réception avant d'entrer dans
+le pipeline (voir StorageManager.journal) : le point de reprise du journal
+n'avance qu'une fois l'échantillon appliqué au stockage ou écarté par une
+étape, et un arrêt brutal ne perd pas les échantillons en file.
+
+La configuration est lue dans le fichier pipeline.json du répertoire de
+données ; les réglages absents prennent la valeur de DEFAULT_CONFIG :
+    {
+        "workers": {"decode": 2, "rates": 2},
+        "queue_size": 256,
+        "drop": ["network.lo", "disk.partitions[mountpoint=/snap/*]"],
+        "tags": {"site": "paris"},
+        "rates": ["network.*.bytes_sent", "network.*.bytes_recv"],
+        "rollup": {"interval": 300, "fields": ["cpu.cpu_percent_avg"]},
+        "sinks": [{"type": "graphite", "host": "graphite.local", "port": 2003}]
+    }
+"""
+import os
+import re
+import json
+import time
+import queue
+import socket
+import threading
+from fnmatch import fnmatchcase
+
+from .alerts import compile_pattern
+from .series import flatten_metrics
+
+
+PIPELINE_NAME = 'pipeline.json'
+
+# Début des messages de métriques dont la clé "type" vient en premier (client
+# NetMonitor), quels que soient les espaces : ils sont décodés par le pipeline et
+# non par la boucle de réception. Les autres sont analysés par la boucle, puis
+# transmis au pipeline déjà décodés (voir MessageHandler.handle_message).
+METRICS_PATTERN = re.compile(r'\s*\{\s*"type"\s*:\s*"metrics"\s*[,}]')
+
+# Étapes dont le nombre de threads est configurable
+STAGE_NAMES = ('decode', 'validate', 'filter', 'enrich', 'rates', 'rollup')
+
+# Configuration appliquée en l'absence de fichier pipeline.json
+DEFAULT_CONFIG = {
+    'workers': {},
+    'queue_size': 256,
+    'drop': [],
+    'tags': {},
+    'rates': ['network.*.bytes_sent', 'network.*.bytes_recv'],
+    'rollup': {'interval': 300, 'fields': []},
+    'sinks': [],
+}
+
+# Type attendu des sections du document (validate)
+SECTION_TYPES = {
+    'cpu': dict,
+    'memory': dict,
+    'disk': dict,
+    'disk.partitions': list,
+    'network': dict,
+}
+
+# Nombre maximal de chemins dont la sélection est mémorisée (rates, rollup)
+MAX_CACHED_PATHS = 65536
+
+# Marqueur d'arrêt des threads d'une étape
+STOP = object()
+
+
+class Sample:
+    """Métriques d'un hôte en cours de traitement"""
+
+    __slots__ = ('hostname', 'timestamp', 'message', 'metrics', 'peer', 'position', 'sequence', 'values',
+                 'rollups')
+
+    def __init__(self, hostname, timestamp, message=None, metrics=None, peer=None, position=None,
+                 sequence=None):
+        """
+        Initialise un échantillon
+        Args:
+            hostname (str): Nom d'hôte du client
+            timestamp (float): Date de réception (secondes)
+            message (str, optional): Message JSON à décoder
+            metrics (dict, optional): Métriques déjà décodées
+            peer (str, optional): Adresse IP de la connexion du client
+            position (tuple, optional): Position du message dans le journal du stockage
+            sequence (int, optional): Numéro du message dans le journal du stockage
+        """
+        self.hostname = hostname
+        self.timestamp = timestamp
+        self.message = message
+        self.metrics = metrics
+        self.peer = peer
+        self.position = position
+        self.sequence = sequence
+        self.values = None
+        self.rollups = []
+
+
+class Stage:
+    """Étape du pipeline (process est appelé par les threads de l'étape)"""
+
+    name = None
+
+    # Délai (secondes) sans échantillon après lequel un thread appelle idle()
+    idle_interval = 1.0
+
+    def process(self, sample):
+        """
+        Traite un échantillon
+        Args:
+            sample (Sample): Échantillon
+        Returns:
+            Sample: Échantillon transmis à l'étape suivante, ou None pour l'écarter
+        Raises:
+            Exception: Échantillon invalide (compté comme erreur et écarté)
+        """
+        raise NotImplementedError
+
+    def idle(self):
+        """Appelée par un thread de l'étape sans échantillon à traiter"""
+
+    def close(self):
+        """Libère les ressources de l'étape (après l'arrêt de ses threads)"""
+
+
+def reject_constant(name):
+    """Refuse les valeurs non finies (NaN, Infinity) lors du décodage JSON"""
+    raise ValueError(f"Non-finite value {name} in metrics")
+
+
+class DecodeStage(Stage):
+    """Analyse du message JSON des métriques"""
+
+    name = 'decode'
+
+    def process(self, sample):
+        if sample.metrics is None:
+            data = json.loads(sample.message, parse_constant=reject_constant)
+            sample.metrics = data.get('data')
+            sample.message = None
+        return sample
+
+
+class ValidateStage(Stage):
+    """Vérification de la structure du document de métriques"""
+
+    name = 'validate'
+
+    def process(self, sample):
+        metrics = sample.metrics
+
+        if not isinstance(metrics, dict):
+            raise ValueError("Metrics must be a JSON object")
+
+        for path, expected in SECTION_TYPES.items():
+            node = metrics
+            for key in path.split('.'):
+                node = node.get(key) if isinstance(node, dict) else None
+
+            if node is not None and not isinstance(node, expected):
+                raise ValueError(f"Invalid metrics section {path}")
+
+        return sample
+
+
+class DropRule:
+    """
+    Champ à supprimer des documents : chemin avec jokers (ex. "network.lo*"),
+    éventuellement restreint aux éléments d'une liste dont un champ correspond
+    à un motif (ex. "disk.partitions[mountpoint=/snap/*]")
+    """
+
+    def __init__(self, spec):
+        """
+        Compile une règle de suppression
+        Args:
+            spec (str): Règle
+        Raises:
+            ValueError: Si la règle est invalide
+        """
+        if not isinstance(spec, str):
+            raise ValueError(f"Invalid drop rule: {spec!r}")
+
+        path, bracket, selector = spec.partition('[')
+        self.keys = path.split('.')
+        self.field = self.pattern = None
+
+        if not all(self.keys):
+            raise ValueError(f"Invalid drop rule: {spec!r}")
+
+        if bracket:
+            field, equal, pattern = selector[:-1].partition('=')
+            if not selector.endswith(']') or not equal or not field:
+                raise ValueError(f"Invalid drop rule: {spec!r}")
+            self.field, self.pattern = field, pattern
+
+        # Éléments du chemin avec joker (les autres sont cherchés directement)
+        self.globs = [any(char in key for char in '*?[') for key in self.keys]
+
+    def apply(self, node, depth=0):
+        """
+        Supprime les champs correspondants d'un document
+        Args:
+            node (dict): Document (ou sous-document au niveau depth)
+            depth (int): Position dans le chemin de la règle
+        Returns:
+            int: Nombre de champs ou d'éléments supprimés
+        """
+        if not isinstance(node, dict):
+            return 0
+
+        key = self.keys[depth]
+        if self.globs[depth]:
+            names = [name for name in node if fnmatchcase(name, key)]
+        else:
+            names = [key] if key in node else []
+
+        last = depth == len(self.keys) - 1
+        count = 0
+
+        for name in names:
+            if not last:
+                count += self.apply(node[name], depth + 1)
+            elif self.field is None:
+                del node[name]
+                count += 1
+            elif isinstance(node[name], list):
+                items = node[name]
+                node[name] = [
+                    item for item in items
+                    if not (isinstance(item, dict) and fnmatchcase(str(item.get(self.field)), self.pattern))
+                ]
+                count += len(items) - len(node[name])
+
+        return count
+
+
+class FilterStage(Stage):
+    """Suppression des champs inutiles avant le stockage"""
+
+    name = 'filter'
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (list): Règles de suppression (DropRule)
+        """
+        self.rules = rules
+
+    def process(self, sample):
+        for rule in self.rules:
+            rule.apply(sample.metrics)
+        return sample
+
+
+class EnrichStage(Stage):
+    """Ajout d'étiquettes fixes et de l'adresse IP de la connexion"""
+
+    name = 'enrich'
+
+    def __init__(self, tags):
+        """
+        Args:
+            tags (dict): Étiquettes ajoutées à chaque document ("tags")
+        """
+        self.tags = tags
+
+    def process(self, sample):
+        metrics = sample.metrics
+
+        if self.tags:
+            tags = dict(self.tags)
+            if isinstance(metrics.get('tags'), dict):
+                tags.update(metrics['tags'])
+            metrics['tags'] = tags
+
+        if not metrics.get('ip_address') and sample.peer:
+            metrics['ip_address'] = sample.peer
+
+        return sample
+
+
+class PathMatcher:
+    """Sélection de chemins aplatis : noms exacts ou avec jokers (voir alerts.compile_pattern)"""
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (list): Chemins sélectionnés
+        Raises:
+            ValueError: Si un chemin est invalide
+        """
+        if not isinstance(patterns, list) or not all(isinstance(pattern, str) and pattern for pattern in patterns):
+            raise ValueError("Metric paths must be a list of non-empty strings")
+
+        self.exact = {pattern for pattern in patterns if '*' not in pattern}
+        self.patterns = [compile_pattern(pattern) for pattern in patterns if '*' in pattern]
+
+        # Résultat de la sélection par chemin (les chemins se répètent d'un échantillon à l'autre)
+        self.cache = {}
+
+    def select(self, values):
+        """
+        Retourne les chemins sélectionnés
+        Args:
+            values (dict): {chemin: valeur}
+        Returns:
+            list: Chemins sélectionnés
+        """
+        cache = self.cache
+        selected = []
+
+        for path in values:
+            match = cache.get(path)
+
+            if match is None:
+                match = path in self.exact or any(pattern.match(path) for pattern in self.patterns)
+                if len(cache) < MAX_CACHED_PATHS:
+                    cache[path] = match
+
+            if match:
+                selected.append(path)
+
+        return selected
+
+
+class RateStage(Stage):
+    """Aplatissement des champs numériques et débits des compteurs cumulés"""
+
+    name = 'rates'
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (list): Chemins des compteurs cumulés (ex. "network.*.bytes_recv")
+        """
+        self.matcher = PathMatcher(patterns)
+
+        # Dernières valeurs des compteurs par hôte : (timestamp, {chemin: valeur})
+        self.previous = {}
+
+    def process(self, sample):
+        values = sample.values = flatten_metrics(sample.metrics)
+        counters = {path: values[path] for path in self.matcher.select(values)}
+
+        previous = self.previous.get(sample.hostname)
+        self.previous[sample.hostname] = (sample.timestamp, counters)
+
+        if previous is None:
+            return sample
+
+        last_timestamp, last_counters = previous
+        elapsed = sample.timestamp - last_timestamp
+
+        if elapsed > 0:
+            for path, value in counters.items():
+                last = last_counters.get(path)
+                # Compteur remis à zéro (redémarrage de l'hôte) : pas de débit
+                if last is not None and value >= last:
+                    values[f"{path}_rate"] = (value - last) / elapsed
+
+        return sample
+
+
+class RollupStage(Stage):
+    """Minimum, maximum et moyenne de champs choisis par intervalle"""
+
+    name = 'rollup'
+
+    def __init__(self, interval, patterns):
+        """
+        Args:
+            interval (int): Durée d'un intervalle (secondes)
+            patterns (list): Chemins agrégés (ex. "cpu.cpu_percent_avg")
+        """
+        self.interval = interval
+        self.matcher = PathMatcher(patterns)
+
+        # Intervalle en cours par hôte : [début, {chemin: [min, max, somme, nombre]}]
+        self.windows = {}
+
+    def process(self, sample):
+        start = int(sample.timestamp) - int(sample.timestamp) % self.interval
+        window = self.windows.get(sample.hostname)
+
+        # Nouvel intervalle : les agrégats du précédent sont transmis au stockage
+        if window is None or window[0] != start:
+            if window is not None and window[1]:
+                sample.rollups.append((window[0], {
+                    f"{path}.{name}": value
+                    for path, (low, high, total, count) in window[1].items()
+                    for name, value in (('min', low), ('max', high), ('avg', total / count))
+                }))
+            window = self.windows[sample.hostname] = [start, {}]
+
+        aggregates = window[1]
+        values = sample.values
+
+        for path in self.matcher.select(values):
+            value = values[path]
+            aggregate = aggregates.get(path)
+
+            if aggregate is None:
+                aggregates[path] = [value, value, value, 1]
+            else:
+                if value < aggregate[0]:
+                    aggregate[0] = value
+                if value > aggregate[1]:
+                    aggregate[1] = value
+                aggregate[2] += value
+                aggregate[3] += 1
+
+        return sample
+
+
+class StorageSink(Stage):
+    """Stockage des échantillons (journal puis application par lots, voir StorageManager)"""
+
+    name = 'storage'
+
+    def __init__(self, storage_manager):
+        """
+        Args:
+            storage_manager (StorageManager): Gestionnaire de stockage
+        """
+        self.storage_manager = storage_manager
+        self.idle_interval = storage_manager.flush_interval
+
+    def process(self, sample):
+        self.storage_manager.enqueue_metrics(
+            sample.hostname, sample.metrics, timestamp=sample.timestamp, values=sample.values,
+            position=sample.position, sequence=sample.sequence
+        )
+
+        for timestamp, values in sample.rollups:
+            self.storage_manager.store_rollup(sample.hostname, timestamp, values)
+
+        self.storage_manager.flush_pending()
+        return sample
+
+    def idle(self):
+        # Lot incomplet appliqué après le délai maximal
+        self.storage_manager.flush_pending()
+
+    def release(self, sample):
+        """Libère la position dans le journal d'un échantillon écarté avant le stockage"""
+        if sample.position is not None:
+            self.storage_manager.resolve((sample.position,))
+
+
+class GraphiteSink(Stage):
+    """Envoi des champs numériques à un serveur Graphite (protocole texte)"""
+
+    # Délai (secondes) avant une nouvelle tentative de connexion
+    retry_interval = 30
+
+    # Délai maximal (secondes) de connexion et d'envoi
+    timeout = 5
+
+    def __init__(self, host, port=2003, prefix='netmonitor'):
+        """
+        Args:
+            host (str): Adresse du serveur Graphite
+            port (int): Port du serveur (protocole texte)
+            prefix (str): Préfixe des chemins envoyés
+        """
+        if not isinstance(host, str) or not host or not isinstance(port, int):
+            raise ValueError("Graphite sink requires a host and an integer port")
+
+        self.name = f"graphite {host}:{port}"
+        self.address = (host, port)
+        self.prefix = prefix
+        self.sock = None
+        self.retry_at = 0
+
+    def process(self, sample):
+        # Serveur injoignable : échantillons écartés jusqu'à la prochaine tentative
+        if self.sock is None:
+            if time.time() < self.retry_at:
+                return None
+
+            try:
+                self.sock = socket.create_connection(self.address, timeout=self.timeout)
+            except OSError:
+                self.retry_at = time.time() + self.retry_interval
+                raise
+
+        node = f"{self.prefix}.{sample.hostname.replace('.', '_')}"
+        timestamp = int(sample.timestamp)
+        lines = ''.join(
+            f"{node}.{path.replace(' ', '_')} {value} {timestamp}\n"
+            for path, value in sample.values.items()
+        )
+
+        try:
+            self.sock.sendall(lines.encode('utf-8'))
+        except OSError:
+            self.close()
+            self.retry_at = time.time() + self.retry_interval
+            raise
+
+        return sample
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class StageStats:
+    """Compteurs d'un thread d'une étape"""
+
+    __slots__ = ('processed', 'dropped', 'errors', 'busy', 'slowest')
+
+    def __init__(self):
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.slowest = 0.0
+
+
+class StageRunner:
+    """Groupe de threads d'une étape, chacun alimenté par une file bornée"""
+
+    def __init__(self, stage, workers, queue_size, logger):
+        """
+        Args:
+            stage (Stage): Étape exécutée
+            workers (int): Nombre de threads
+            queue_size (int): Taille de la file de chaque thread
+            logger: Logger pour les messages
+        """
+        self.stage = stage
+        self.logger = logger
+        self.queues = [queue.Queue(queue_size) for _ in range(workers)]
+        self.stats = [StageStats() for _ in range(workers)]
+        self.threads = []
+
+        # Étapes suivantes (plusieurs pour la distribution aux destinations)
+        self.outputs = []
+
+        # File pleine : attente (contre-pression) ou échantillon écarté et compté
+        self.blocking = True
+        self.lock = threading.Lock()
+
+        # Appelée pour chaque échantillon écarté ou en erreur (voir StorageSink.release)
+        self.discard = None
+
+    def put(self, sample):
+        """Confie un échantillon au thread de son hôte (file pleine : voir blocking)"""
+        index = hash(sample.hostname) % len(self.queues)
+
+        try:
+            self.queues[index].put(sample, self.blocking)
+        except queue.Full:
+            with self.lock:
+                self.stats[index].dropped += 1
+
+    def start(self):
+        """Démarre les threads de l'étape"""
+        for index in range(len(self.queues)):
+            thread = threading.Thread(
+                target=self.run, args=(index,), name=f"pipeline-{self.stage.name}-{index}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """Arrête les threads après le traitement des échantillons en file"""
+        for source in self.queues:
+            source.put(STOP)
+
+        for thread in self.threads:
+            thread.join()
+
+        self.threads = []
+        self.stage.close()
+
+    def run(self, index):
+        """Boucle d'un thread de l'étape"""
+        source = self.queues[index]
+        stats = self.stats[index]
+        stage = self.stage
+
+        while True:
+            try:
+                sample = source.get(timeout=stage.idle_interval)
+            except queue.Empty:
+                try:
+                    stage.idle()
+                except Exception as e:
+                    self.logger.error(f"Pipeline stage {stage.name} failed while idle: {str(e)}")
+                continue
+
+            if sample is STOP:
+                break
+
+            started = time.perf_counter()
+
+            try:
+                result = stage.process(sample)
+            except Exception as e:
+                result = None
+                stats.errors += 1
+                self.logger.error(f"Pipeline stage {stage.name} failed for client {sample.hostname}: {str(e)}")
+            else:
+                if result is None:
+                    with self.lock:
+                        stats.dropped += 1
+
+            elapsed = time.perf_counter() - started
+            stats.processed += 1
+            stats.busy += elapsed
+            if elapsed > stats.slowest:
+                stats.slowest = elapsed
+
+            if result is not None:
+                for output in self.outputs:
+                    output.put(result)
+            elif self.discard is not None:
+                self.discard(sample)
+
+    def snapshot(self):
+        """Retourne les compteurs cumulés et la durée moyenne de l'étape"""
+        processed = sum(stats.processed for stats in self.stats)
+        busy = sum(stats.busy for stats in self.stats)
+
+        return {
+            'workers': len(self.queues),
+            'queued': sum(source.qsize() for source in self.queues),
+            'processed': processed,
+            'dropped': sum(stats.dropped for stats in self.stats),
+            'errors': sum(stats.errors for stats in self.stats),
+            'avg_ms': round(busy / processed * 1000, 3) if processed else None,
+            'max_ms': round(max(stats.slowest for stats in self.stats) * 1000, 3),
+        }
+
+
+class Pipeline:
+    """Étapes chaînées puis distribution des échantillons à chaque destination"""
+
+    def __init__(self, stages, sinks, logger, workers=None, queue_size=256, discard=None):
+        """
+        Args:
+            stages (list): Étapes, dans l'ordre de traitement
+            sinks (list): Destinations (un thread chacune), le stockage en premier
+            logger: Logger pour les messages
+            workers (dict, optional): Nombre de threads par nom d'étape (1 par défaut)
+            queue_size (int): Taille des files de chaque thread
+            discard (callable, optional): Appelée pour chaque échantillon qui n'atteint pas le stockage
+        """
+        workers = workers or {}
+
+        self.stages = [StageRunner(stage, workers.get(stage.name, 1), queue_size, logger) for stage in stages]
+        self.sinks = [StageRunner(sink, 1, queue_size, logger) for sink in sinks]
+
+        for runner, following in zip(self.stages, self.stages[1:]):
+            runner.outputs = [following]
+        self.stages[-1].outputs = self.sinks
+
+        for runner in self.stages + self.sinks[:1]:
+            runner.discard = discard
+
+        # Destinations externes : jamais de contre-pression sur le stockage et la réception
+        for runner in self.sinks[1:]:
+            runner.blocking = False
+
+    def start(self):
+        """Démarre les threads de toutes les étapes"""
+        for runner in self.stages + self.sinks:
+            runner.start()
+
+    def submit(self, sample):
+        """Ajoute un échantillon au pipeline (bloquant si la première file est pleine)"""
+        self.stages[0].put(sample)
+
+    def stop(self):
+        """Arrête le pipeline étape par étape : chaque étape vide sa file avant l'arrêt de la suivante"""
+        for runner in self.stages + self.sinks:
+            runner.stop()
+
+    def stats(self):
+        """Retourne les compteurs et durées de traitement de chaque étape"""
+        return {runner.stage.name: runner.snapshot() for runner in self.stages + self.sinks}
+
+
+def load_config(path):
+    """
+    Lit la configuration du pipeline
+    Args:
+        path (str): Fichier de configuration (JSON), DEFAULT_CONFIG s'il n'existe pas
+    Returns:
+        dict: Configuration complétée par les valeurs par défaut
+    Raises:
+        ValueError: Si le fichier est illisible ou contient un réglage inconnu
+    """
+    config = dict(DEFAULT_CONFIG)
+
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                spec = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Cannot read pipeline configuration {path}: {str(e)}")
+
+        if not isinstance(spec, dict):
+            raise ValueError(f"Pipeline configuration {path} must be a JSON object")
+
+        unknown = sorted(set(spec) - set(DEFAULT_CONFIG))
+        if unknown:
+            raise ValueError(f"Unknown pipeline settings: {', '.join(unknown)}")
+
+        config.update(spec)
+
+    return config
+
+
+def build_pipeline(config, storage_manager, logger):
+    """
+    Construit le pipeline décrit par une configuration
+    Args:
+        config (dict): Configuration (voir load_config)
+        storage_manager (StorageManager): Gestionnaire de stockage (destination principale)
+        logger: Logger pour les messages
+    Returns:
+        Pipeline: Pipeline prêt à démarrer
+    Raises:
+        ValueError: Si la configuration est invalide
+    """
+    workers = config['workers']
+    if not isinstance(workers, dict) or any(
+        name not in STAGE_NAMES or not isinstance(count, int) or count < 1
+        for name, count in workers.items()
+    ):
+        raise ValueError(f"Pipeline workers must map stage names ({', '.join(STAGE_NAMES)}) to positive integers")
+
+    queue_size = config['queue_size']
+    if not isinstance(queue_size, int) or queue_size < 1:
+        raise ValueError("Pipeline queue_size must be a positive integer")
+
+    if not isinstance(config['drop'], list):
+        raise ValueError("Pipeline drop rules must be a list")
+
+    if not isinstance(config['tags'], dict):
+        raise ValueError("Pipeline tags must be a JSON object")
+
+    rollup = config['rollup']
+    if not isinstance(rollup, dict) or not isinstance(rollup.get('interval', 300), int) \
+            or rollup.get('interval', 300) < 1:
+        raise ValueError("Pipeline rollup must define a positive interval (seconds)")
+
+    stages = [
+        DecodeStage(),
+        ValidateStage(),
+        FilterStage([DropRule(spec) for spec in config['drop']]),
+        EnrichStage(config['tags']),
+        RateStage(config['rates']),
+    ]
+
+    if rollup.get('fields'):
+        stages.append(RollupStage(rollup.get('interval', 300), rollup['fields']))
+
+    storage = StorageSink(storage_manager)
+    sinks = [storage]
+
+    for spec in config['sinks']:
+        if not isinstance(spec, dict) or spec.get('type') != 'graphite':
+            raise ValueError(f"Unknown pipeline sink: {spec!r}")
+        sinks.append(GraphiteSink(spec.get('host'), spec.get('port', 2003), spec.get('prefix', 'netmonitor')))
+
+    return Pipeline(stages, sinks, logger, workers, queue_size, discard=storage.release)
@@ -0,0 +1,650 @@
+"""
+series.py
+
+Ce module gère le stockage compressé des séries numériques des métriques.
+
+Les champs numériques des documents envoyés par SystemMonitor (CPU, mémoire,
+disques, compteurs réseau) sont aplatis en chemins (ex. "cpu.cpu_percent_avg")
+puis encodés par blocs avec la compression de Gorilla :
+    - horodatages : delta de delta, la plupart du temps 1 bit par point
+      lorsque l'intervalle d'envoi est régulier ;
+    - valeurs : XOR avec la valeur précédente, seuls les bits significatifs
+      sont écrits.
+
+Un bloc est en colonnes (une colonne d'horodatages partagée, une colonne par
+champ) : la lecture d'un champ ne décode que sa colonne. Les blocs complets
+sont ajoutés à series.gor. Les points du bloc en cours sont ajoutés un à un à
+la fin de series.open (journal non compressé, remis à zéro à chaque bloc
+complet) : l'encodeur du bloc reste en mémoire et n'est sérialisé qu'une fois,
+à la fermeture du bloc. NumPy est utilisé lorsqu'il est disponible pour
+renvoyer des tableaux.
+"""
+import os
+import math
+import struct
+import itertools
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel
+    np = None
+
+
+SERIES_NAME = 'series.gor'
+OPEN_NAME = 'series.open'
+
+# Sous-répertoire des séries agrégées par intervalle (voir pipeline.RollupStage)
+ROLLUP_DIR = 'rollup'
+
+# Nombre de points par bloc (10 minutes à 5 secondes d'intervalle)
+BLOCK_SIZE = 120
+
+MASK64 = (1 << 64) - 1
+NAN = float('nan')
+
+FLOAT = struct.Struct('>d')
+UINT64 = struct.Struct('>Q')
+
+# En-tête de bloc : nombre de points, nombre de champs
+BLOCK_HEADER = struct.Struct('<IH')
+# Longueur d'une colonne en bits
+STREAM_HEADER = struct.Struct('<I')
+# Longueur d'un nom de champ
+NAME_HEADER = struct.Struct('<H')
+# Trame de bloc dans series.gor : taille, premier et dernier timestamp, nombre de points
+FRAME = struct.Struct('<IqqI')
+
+# Journal du bloc en cours (series.open) : signature, puis enregistrements
+#   - champ : 'F', longueur du nom, nom (numéroté dans l'ordre d'apparition) ;
+#   - point : 'P', horodatage, nombre de valeurs, puis (numéro de champ, valeur).
+OPEN_MAGIC = b'GOL1'
+OPEN_FIELD = struct.Struct('<cH')
+OPEN_POINT = struct.Struct('<cqH')
+OPEN_VALUE = struct.Struct('<Hd')
+
+
+def flatten_metrics(metrics, prefix=''):
+    """
+    Aplatit les champs numériques d'un document de métriques
+    Les listes de nombres sont indexées (cpu.cpu_percent.0), les listes de
+    partitions sont indexées par point de montage (disk.partitions./.percent).
+    Args:
+        metrics (dict): Document de métriques
+        prefix (str): Préfixe des chemins (usage interne)
+    Returns:
+        dict: {chemin: valeur}
+    """
+    values = {}
+
+    if isinstance(metrics, dict):
+        items = metrics.items()
+    elif isinstance(metrics, list):
+        items = (
+            (item.get('mountpoint', index) if isinstance(item, dict) else index, item)
+            for index, item in enumerate(metrics)
+        )
+    else:
+        return values
+
+    for key, value in items:
+        path = f"{prefix}{key}"
+
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            values[path] = float(value)
+        elif isinstance(value, (dict, list)):
+            values.update(flatten_metrics(value, f"{path}."))
+
+    return values
+
+
+def to_array(values, dtype='float64'):
+    """Convertit une liste en tableau NumPy si NumPy est disponible"""
+    if np is None:
+        return values
+    return np.asarray(values, dtype=dtype)
+
+
+class BitWriter:
+    """Écriture de bits dans un tampon d'octets (bit de poids fort en premier)"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        """Écrit les `nbits` bits de poids faible de `value`"""
+        while nbits > 0:
+            offset = self.nbits & 7
+            if offset == 0:
+                self.buffer.append(0)
+
+            free = 8 - offset
+            take = free if free < nbits else nbits
+            chunk = (value >> (nbits - take)) & ((1 << take) - 1)
+            self.buffer[-1] |= chunk << (free - take)
+
+            self.nbits += take
+            nbits -= take
+
+    def getvalue(self):
+        """Retourne les octets écrits"""
+        return bytes(self.buffer)
+
+
+class BitReader:
+    """Lecture de bits dans un tampon d'octets"""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read(self, nbits):
+        """Lit `nbits` bits et retourne l'entier correspondant"""
+        if nbits == 0:
+            return 0
+
+        start = self.position >> 3
+        end = (self.position + nbits + 7) >> 3
+        chunk = int.from_bytes(self.data[start:end], 'big')
+        shift = (end << 3) - self.position - nbits
+
+        self.position += nbits
+        return (chunk >> shift) & ((1 << nbits) - 1)
+
+
+def _zigzag(value):
+    """Encode un entier signé en entier positif"""
+    return (value << 1) if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value):
+    """Décode un entier encodé par _zigzag"""
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+# Classes de delta de delta : (préfixe, longueur du préfixe, bits de valeur)
+DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+)
+
+
+class TimestampEncoder:
+    """Encodage des horodatages (entiers) par delta de delta"""
+
+    def __init__(self):
+        self.writer = BitWriter()
+        self.count = 0
+        self.last = 0
+        self.last_delta = 0
+
+    def append(self, timestamp):
+        """Ajoute un horodatage (entier, croissant)"""
+        if self.count == 0:
+            self.writer.write(timestamp & MASK64, 64)
+        else:
+            delta = timestamp - self.last
+            dod = _zigzag(delta - self.last_delta)
+
+            if dod == 0:
+                self.writer.write(0, 1)
+            else:
+                for prefix, prefix_bits, value_bits in DOD_BUCKETS:
+                    if dod < (1 << value_bits):
+                        self.writer.write(prefix, prefix_bits)
+                        self.writer.write(dod, value_bits)
+                        break
+                else:
+                    self.writer.write(0b1111, 4)
+                    self.writer.write(dod & MASK64, 64)
+
+            self.last_delta = delta
+
+        self.last = timestamp
+        self.count += 1
+
+
+def decode_timestamps(data, count):
+    """Décode `count` horodatages encodés par TimestampEncoder"""
+    reader = BitReader(data)
+    timestamps = []
+    last = last_delta = 0
+
+    for index in range(count):
+        if index == 0:
+            last = reader.read(64)
+            if last >> 63:
+                last -= 1 << 64
+            timestamps.append(last)
+            continue
+
+        if not reader.read(1):
+            dod = 0
+        else:
+            for _, prefix_bits, value_bits in DOD_BUCKETS:
+                if not reader.read(1):
+                    dod = reader.read(value_bits)
+                    break
+            else:
+                dod = reader.read(64)
+
+        last_delta += _unzigzag(dod)
+        last += last_delta
+        timestamps.append(last)
+
+    return timestamps
+
+
+class ValueEncoder:
+    """Encodage des valeurs flottantes par XOR (Gorilla)"""
+
+    def __init__(self):
+        self.writer = BitWriter()
+        self.count = 0
+        self.last_bits = 0
+        self.leading = None
+        self.trailing = None
+
+    def append(self, value):
+        """Ajoute une valeur flottante (NaN pour une valeur absente)"""
+        bits = UINT64.unpack(FLOAT.pack(value))[0]
+
+        if self.count == 0:
+            self.writer.write(bits, 64)
+        else:
+            xor = bits ^ self.last_bits
+
+            if xor == 0:
+                self.writer.write(0, 1)
+            else:
+                leading = min(64 - xor.bit_length(), 31)
+                trailing = (xor & -xor).bit_length() - 1
+
+                if self.leading is not None and leading >= self.leading and trailing >= self.trailing:
+                    # Les bits significatifs tiennent dans la fenêtre précédente
+                    self.writer.write(0b10, 2)
+                    self.writer.write(xor >> self.trailing, 64 - self.leading - self.trailing)
+                else:
+                    meaningful = 64 - leading - trailing
+                    self.writer.write(0b11, 2)
+                    self.writer.write(leading, 5)
+                    self.writer.write(meaningful - 1, 6)
+                    self.writer.write(xor >> trailing, meaningful)
+                    self.leading, self.trailing = leading, trailing
+
+        self.last_bits = bits
+        self.count += 1
+
+
+def decode_values(data, count):
+    """Décode `count` valeurs encodées par ValueEncoder"""
+    reader = BitReader(data)
+    values = []
+    bits = 0
+    leading = trailing = 0
+
+    for index in range(count):
+        if index == 0:
+            bits = reader.read(64)
+        elif reader.read(1):
+            if reader.read(1):
+                leading = reader.read(5)
+                meaningful = reader.read(6) + 1
+                trailing = 64 - leading - meaningful
+            bits ^= reader.read(64 - leading - trailing) << trailing
+
+        values.append(FLOAT.unpack(UINT64.pack(bits))[0])
+
+    return values
+
+
+class BlockEncoder:
+    """Bloc de points en colonnes, alimenté point par point"""
+
+    def __init__(self):
+        self.timestamps = TimestampEncoder()
+        self.fields = {}
+        self.count = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+    def append(self, timestamp, values):
+        """
+        Ajoute un point au bloc
+        Args:
+            timestamp (int): Horodatage du point (secondes)
+            values (dict): {champ: valeur}
+        """
+        # Un nouveau champ est complété par des valeurs absentes
+        for name in values:
+            if name not in self.fields:
+                encoder = ValueEncoder()
+                for _ in range(self.count):
+                    encoder.append(NAN)
+                self.fields[name] = encoder
+
+        for name, encoder in self.fields.items():
+            encoder.append(values.get(name, NAN))
+
+        self.timestamps.append(timestamp)
+        self.count += 1
+
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+
+    def to_bytes(self):
+        """Sérialise le bloc"""
+        parts = [
+            BLOCK_HEADER.pack(self.count, len(self.fields)),
+            STREAM_HEADER.pack(self.timestamps.writer.nbits),
+            self.timestamps.writer.getvalue(),
+        ]
+
+        for name, encoder in self.fields.items():
+            encoded_name = name.encode('utf-8')
+            parts.append(NAME_HEADER.pack(len(encoded_name)))
+            parts.append(encoded_name)
+            parts.append(STREAM_HEADER.pack(encoder.writer.nbits))
+            parts.append(encoder.writer.getvalue())
+
+        return b''.join(parts)
+
+
+def decode_block(data, fields=None):
+    """
+    Décode un bloc
+    Args:
+        data (bytes): Bloc sérialisé par BlockEncoder.to_bytes
+        fields (iterable, optional): Champs à décoder (par défaut : tous)
+    Returns:
+        tuple: (horodatages, {champ: valeurs})
+    """
+    count, nfields = BLOCK_HEADER.unpack_from(data, 0)
+    position = BLOCK_HEADER.size
+    wanted = set(fields) if fields is not None else None
+
+    def read_stream(position):
+        nbits, = STREAM_HEADER.unpack_from(data, position)
+        start = position + STREAM_HEADER.size
+        end = start + (nbits + 7) // 8
+        return data[start:end], end
+
+    stream, position = read_stream(position)
+    timestamps = decode_timestamps(stream, count)
+    columns = {}
+
+    for _ in range(nfields):
+        name_length, = NAME_HEADER.unpack_from(data, position)
+        position += NAME_HEADER.size
+        name = data[position:position + name_length].decode('utf-8')
+        position += name_length
+
+        stream, position = read_stream(position)
+
+        # Les colonnes non demandées ne sont pas décodées
+        if wanted is None or name in wanted:
+            columns[name] = decode_values(stream, count)
+
+    return timestamps, columns
+
+
+def read_open_log(data):
+    """
+    Décode le journal du bloc en cours (series.open)
+    Un enregistrement incomplet en fin de journal (écriture interrompue) est ignoré.
+    Args:
+        data (bytes): Contenu du journal, signature comprise
+    Returns:
+        tuple: (points [(horodatage, {champ: valeur})], longueur des enregistrements complets)
+    """
+    points = []
+    names = []
+    position = len(OPEN_MAGIC)
+    size = len(data)
+
+    while position < size:
+        tag = data[position:position + 1]
+
+        if tag == b'F' and position + OPEN_FIELD.size <= size:
+            _, length = OPEN_FIELD.unpack_from(data, position)
+            end = position + OPEN_FIELD.size + length
+            if end > size:
+                break
+            names.append(data[position + OPEN_FIELD.size:end].decode('utf-8'))
+
+        elif tag == b'P' and position + OPEN_POINT.size <= size:
+            _, timestamp, count = OPEN_POINT.unpack_from(data, position)
+            end = position + OPEN_POINT.size + count * OPEN_VALUE.size
+            if end > size:
+                break
+            points.append((timestamp, {
+                names[index]: value
+                for index, value in OPEN_VALUE.iter_unpack(data[position + OPEN_POINT.size:end])
+            }))
+
+        else:
+            break
+
+        position = end
+
+    return points, position
+
+
+class SeriesStore:
+    """Séries compressées d'un client (blocs complets + bloc en cours)"""
+
+    def __init__(self, client_dir, block_size=BLOCK_SIZE):
+        """
+        Initialise le stockage des séries
+        Args:
+            client_dir (str): Répertoire des métriques du client
+            block_size (int): Nombre de points par bloc
+        """
+        self.client_dir = client_dir
+        self.block_size = block_size
+        self.path = os.path.join(client_dir, SERIES_NAME)
+        self.open_path = os.path.join(client_dir, OPEN_NAME)
+        self.block = None
+
+        # Numéros des champs déjà définis dans series.open
+        self.open_fields = {}
+
+    def _read_open(self):
+        """Lit series.open (b'' s'il n'existe pas)"""
+        try:
+            with open(self.open_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return b''
+
+    def _reset_open(self, points=()):
+        """Réécrit series.open (journal vide, ou points du bloc en cours)"""
+        self.open_fields = {}
+        data = OPEN_MAGIC + b''.join(self._encode_point(timestamp, values) for timestamp, values in points)
+
+        tmp_path = f"{self.open_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.open_path)
+
+    def _encode_point(self, timestamp, values):
+        """Encode un point du journal, précédé de la définition de ses nouveaux champs"""
+        parts = []
+        pairs = []
+
+        for name, value in values.items():
+            index = self.open_fields.get(name)
+            if index is None:
+                index = self.open_fields[name] = len(self.open_fields)
+                encoded_name = name.encode('utf-8')
+                parts.append(OPEN_FIELD.pack(b'F', len(encoded_name)) + encoded_name)
+            pairs.append(OPEN_VALUE.pack(index, value))
+
+        parts.append(OPEN_POINT.pack(b'P', timestamp, len(pairs)))
+        parts.extend(pairs)
+        return b''.join(parts)
+
+    def _load_open_block(self):
+        """Reconstruit l'encodeur du bloc en cours à partir de series.open"""
+        block = BlockEncoder()
+        data = self._read_open()
+
+        if not data:
+            self._reset_open()
+            return block
+
+        if data.startswith(OPEN_MAGIC):
+            points, length = read_open_log(data)
+
+            # Numérotation des champs reprise telle quelle pour les prochains points
+            self.open_fields = {}
+            for _, values in points:
+                for name in values:
+                    self.open_fields.setdefault(name, len(self.open_fields))
+
+            # Enregistrement incomplet (arrêt pendant une écriture) supprimé
+            if length < len(data):
+                with open(self.open_path, 'r+b') as f:
+                    f.truncate(length)
+        else:
+            # Bloc sérialisé des versions précédentes : converti en journal
+            timestamps, columns = decode_block(data)
+            points = [
+                (timestamp, {
+                    name: values[index]
+                    for name, values in columns.items()
+                    if not math.isnan(values[index])
+                })
+                for index, timestamp in enumerate(timestamps)
+            ]
+            self._reset_open(points)
+
+        for timestamp, values in points:
+            block.append(timestamp, values)
+
+        return block
+
+    def append(self, timestamp, values):
+        """
+        Ajoute un point aux séries
+        Args:
+            timestamp (int): Horodatage du point (secondes)
+            values (dict): {champ: valeur}, voir flatten_metrics
+        """
+        if self.block is None:
+            self.block = self._load_open_block()
+
+        timestamp = int(timestamp)
+        if self.block.last_timestamp is not None and timestamp <= self.block.last_timestamp:
+            return
+
+        self.block.append(timestamp, values)
+
+        if self.block.count >= self.block_size:
+            # Bloc complet : sérialisé une seule fois, ajouté à series.gor, puis nouveau bloc
+            data = self.block.to_bytes()
+            with open(self.path, 'ab') as f:
+                f.write(FRAME.pack(len(data), self.block.first_timestamp, self.block.last_timestamp, self.block.count))
+                f.write(data)
+            self.block = BlockEncoder()
+            self._reset_open()
+            return
+
+        # Seul le nouveau point est écrit à la fin du journal du bloc en cours
+        with open(self.open_path, 'ab') as f:
+            f.write(self._encode_point(timestamp, values))
+
+    def iter_blocks(self, start=None, end=None):
+        """
+        Parcourt les blocs complets qui recoupent l'intervalle
+        Args:
+            start (int, optional): Début de l'intervalle (inclus)
+            end (int, optional): Fin de l'intervalle (incluse)
+        Yields:
+            bytes: Bloc sérialisé
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                while True:
+                    header = f.read(FRAME.size)
+                    if len(header) < FRAME.size:
+                        break
+
+                    length, first, last, _ = FRAME.unpack(header)
+
+                    # Les blocs hors de l'intervalle ne sont pas lus
+                    if (start is not None and last < start) or (end is not None and first > end):
+                        f.seek(length, os.SEEK_CUR)
+                        continue
+
+                    data = f.read(length)
+                    if len(data) < length:
+                        break
+                    yield data
+        except FileNotFoundError:
+            pass
+
+    def read_open_block(self, fields=None):
+        """
+        Lit les points du bloc en cours (même résultat que decode_block)
+        Args:
+            fields (iterable, optional): Champs à lire (par défaut : tous)
+        Returns:
+            tuple: (horodatages, {champ: valeurs})
+        """
+        data = self._read_open()
+
+        if data.startswith(OPEN_MAGIC):
+            points, _ = read_open_log(data)
+        elif data:
+            return decode_block(data, fields)
+        else:
+            points = []
+
+        if fields is None:
+            fields = {name for _, values in points for name in values}
+
+        timestamps = [timestamp for timestamp, _ in points]
+        columns = {name: [values.get(name, NAN) for _, values in points] for name in fields}
+        return timestamps, columns
+
+    def query(self, fields, start=None, end=None):
+        """
+        Lit des séries sur un intervalle de temps
+        Args:
+            fields (list): Champs à lire (ex. ["cpu.cpu_percent_avg"])
+            start (int, optional): Début de l'intervalle (inclus)
+            end (int, optional): Fin de l'intervalle (incluse)
+        Returns:
+            tuple: (horodatages, {champ: valeurs}), en tableaux NumPy si disponible
+        """
+        timestamps = []
+        columns = {name: [] for name in fields}
+        last = None
+
+        # Bloc en cours lu avant les blocs complets : s'il est fermé entre les deux
+        # lectures, ses points sont lus deux fois (ignorés ci-dessous) mais jamais perdus
+        blocks = itertools.chain(
+            (decode_block(data, fields) for data in self.iter_blocks(start, end)),
+            (self.read_open_block(fields),)
+        )
+
+        for block_timestamps, block_columns in blocks:
+            for index, timestamp in enumerate(block_timestamps):
+                if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                    continue
+                # Ignorer un point déjà lu (bloc fermé pendant la lecture)
+                if last is not None and timestamp <= last:
+                    continue
+
+                last = timestamp
+                timestamps.append(timestamp)
+                for name in fields:
+                    column = block_columns.get(name)
+                    columns[name].append(column[index] if column else NAN)
+
+        return to_array(timestamps, 'int64'), {name: to_array(values) for name, values in columns.items()}
@@ -6,17 +6,33 @@ Il utilise des sockets pour la communication réseau et gère plusieurs clients
 Il utilise le module select pour gérer les connexions non-bloquantes.
 Il utilise également des gestionnaires pour les clients, le stockage et le traitement des messages.
 """
+import os
+import time
 import socket
 import select
+import threading
 
-from .utils import setup_logger
+from .utils import setup_logger, ensure_dir, write_heartbeat, clear_heartbeat
 from .client import ClientManager
 from .storage import StorageManager
+from .latest import LatestTable
+from .alerts import AlertEngine, AlertStore, load_rules, RULES_NAME, SWEEP_INTERVAL
+from .forecast import DiskForecaster, ForecastStore
+from .pipeline import build_pipeline, load_config, PIPELINE_NAME
 from .handlers import MessageHandler
 
 
 class NetMonitorServer:
     """Serveur pour la réception et le stockage des métriques système"""
+
+    # Intervalle (en secondes) d'enregistrement de l'état du serveur (santé)
+    heartbeat_interval = 5
+    
+    # Intervalle (en secondes) de recalcul des prévisions de remplissage des partitions
+    forecast_interval = 300
+    
+    # Intervalle (en secondes) de résolution des alertes dont la métrique n'est plus reçue
+    sweep_interval = SWEEP_INTERVAL
     
     def __init__(self, host='0.0.0.0', port=9000, data_dir='./data', debug=False):
         """
@@ -37,16 +53,60 @@ class NetMonitorServer:
         
         # Initialisation des composants
         self.client_manager = ClientManager(self.logger)
-        self.storage_manager = StorageManager(data_dir, self.logger)
+        
+        metrics_dir = os.path.join(data_dir, 'metrics')
+        ensure_dir(metrics_dir)
+        
+        # Dernières métriques des hôtes en mémoire partagée (lues par les processus web)
+        try:
+            latest_table = LatestTable.create(metrics_dir)
+        except OSError as e:
+            self.logger.warning(f"Shared memory unavailable, latest metrics table disabled: {str(e)}")
+            latest_table = None
+        
+        # Règles d'alerte (alerts.json du répertoire de données, sinon règles par défaut)
+        try:
+            rules = load_rules(os.path.join(data_dir, RULES_NAME))
+        except ValueError as e:
+            self.logger.error(f"Invalid alert rules, alerting disabled: {str(e)}")
+            alert_engine = None
+        else:
+            alert_engine = AlertEngine(rules, AlertStore(metrics_dir), self.logger)
+            self.logger.info(f"{len(rules)} alert rules loaded")
+        
+        # Prévision du remplissage des partitions (calcul périodique de toute la flotte)
+        self.forecaster = DiskForecaster(ForecastStore(metrics_dir))
+        
+        self.storage_manager = StorageManager(
+            data_dir, self.logger, latest_table=latest_table, alert_engine=alert_engine,
+            forecaster=self.forecaster
+        )
+        
+        # Pipeline de traitement des métriques (pipeline.json du répertoire de données) ;
+        # configuration invalide : métriques stockées directement par la boucle de réception
+        try:
+            self.pipeline = build_pipeline(
+                load_config(os.path.join(data_dir, PIPELINE_NAME)), self.storage_manager, self.logger
+            )
+        except ValueError as e:
+            self.logger.error(f"Invalid pipeline configuration, processing stages disabled: {str(e)}")
+            self.pipeline = None
+        
         self.message_handler = MessageHandler(
             self.client_manager, 
             self.storage_manager,
-            self.logger
+            self.logger,
+            pipeline=self.pipeline
         )
         
         self.server_socket = None
         self.running = False
         self.buffer_size = 4096
+        self.started = None
+        self.last_heartbeat = 0
+        self.last_forecast = 0
+        self.last_sweep = 0
+        self.forecast_thread = None
         
         self.logger.info(f"Server initialized - will listen on {host}:{port}")
     
@@ -71,6 +131,14 @@ class NetMonitorServer:
             return
         
         self.running = True
+        self.started = time.time()
+        
+        if self.pipeline is not None:
+            self.pipeline.start()
+        
+        # Relecture des métriques journalisées non appliquées (arrêt brutal précédent)
+        self.storage_manager.recover(self.pipeline)
+        self.storage_manager.compactor.start()
         self.logger.info("Server started")
         
         try:
@@ -113,6 +181,24 @@ class NetMonitorServer:
                         self.logger.warning(f"Socket exception for client {client_id}")
                         self.client_manager.remove_client(client_id)
                 
+                # Application par lots des métriques journalisées (faite par le pipeline s'il est actif)
+                if self.pipeline is None:
+                    self.storage_manager.flush_pending()
+                else:
+                    self.storage_manager.sync_journal()
+
+                # État du serveur lu par le point de santé de l'application web
+                if time.time() - self.last_heartbeat >= self.heartbeat_interval:
+                    self.heartbeat()
+                
+                # Prévisions de remplissage lues par l'application web
+                if time.time() - self.last_forecast >= self.forecast_interval:
+                    self.forecast()
+                
+                # Alertes périmées résolues même sans nouvelle réception (hôte arrêté)
+                if time.time() - self.last_sweep >= self.sweep_interval:
+                    self.sweep_alerts()
+                
         except KeyboardInterrupt:
             self.logger.info("Server stopped by user")
         except Exception as e:
@@ -120,6 +206,59 @@ class NetMonitorServer:
         finally:
             self.stop()
     
+    def heartbeat(self):
+        """Enregistre l'état du serveur dans le répertoire de données"""
+        self.last_heartbeat = time.time()
+
+        try:
+            write_heartbeat(self.data_dir, {
+                'pid': os.getpid(),
+                'host': self.host,
+                'port': self.port,
+                'started': self.started,
+                'clients': len(self.client_manager.clients),
+                'pipeline': self.pipeline.stats() if self.pipeline is not None else None,
+            })
+        except OSError as e:
+            self.logger.error(f"Error writing heartbeat: {str(e)}")
+
+    def sweep_alerts(self):
+        """Résout les alertes dont la métrique n'est plus reçue (voir AlertEngine.sweep)"""
+        self.last_sweep = time.time()
+        alert_engine = self.storage_manager.alert_engine
+
+        if alert_engine is None:
+            return
+
+        try:
+            alert_engine.sweep(self.last_sweep)
+        except Exception as e:
+            self.logger.error(f"Error sweeping stale alerts: {str(e)}")
+
+    def forecast(self):
+        """
+        Lance le recalcul des prévisions de remplissage dans un thread (la
+        réception des métriques n'attend pas la fin du calcul)
+        """
+        self.last_forecast = time.time()
+
+        if self.forecast_thread is not None and self.forecast_thread.is_alive():
+            return
+
+        self.forecast_thread = threading.Thread(target=self.compute_forecast, name='forecast', daemon=True)
+        self.forecast_thread.start()
+    
+    def compute_forecast(self):
+        """Recalcule les prévisions de remplissage de toutes les partitions"""
+        try:
+            started = time.perf_counter()
+            count = self.forecaster.compute()
+            self.logger.debug(
+                f"Disk forecasts computed for {count} partitions in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+        except Exception as e:
+            self.logger.error(f"Error computing disk forecasts: {str(e)}")
+    
     def stop(self):
         """Arrête le serveur"""
         self.running = False
@@ -137,4 +276,23 @@ class NetMonitorServer:
             except:
                 pass
         
+        # Traitement des métriques déjà reçues, puis arrêt des threads du pipeline
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        
+        # Journée en cours d'archivage terminée avant la fermeture du stockage
+        self.storage_manager.compactor.stop()
+        
+        # Calcul des prévisions en cours terminé avant la sauvegarde des fenêtres
+        if self.forecast_thread is not None:
+            self.forecast_thread.join()
+        
+        # Application des métriques en attente et fermeture du journal
+        try:
+            self.storage_manager.close()
+        except Exception as e:
+            self.logger.error(f"Error closing storage: {str(e)}")
+
+        clear_heartbeat(self.data_dir)
+        
         self.logger.info("Server stopped")
\ No newline at end of file
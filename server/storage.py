@@ -5,53 +5,484 @@ Ce module gère le stockage des métriques sur le serveur.
 """
 import os
 import json
+import time
+import threading
+from collections import OrderedDict, deque
 
-from .utils import ensure_dir, format_timestamp
+from .utils import atomic_write, ensure_dir, host_dir
+from .history import HistoryIndex, history_filename
+from .archive import day_of
+from .compaction import HistoryCompactor
+from .series import SeriesStore, flatten_metrics, ROLLUP_DIR
+from .catalog import HostCatalog
+from .wal import WriteAheadLog
+from .pipeline import Sample
+
+
+def read_record(payload):
+    """
+    Décode un enregistrement du journal (voir StorageManager.journal)
+    Args:
+        payload (bytes): Données de l'enregistrement
+    Returns:
+        tuple: (en-tête : hostname, timestamp, seq, metrics ou peer, message non décodé ou None)
+    """
+    header, _, message = payload.partition(b'\n')
+    return json.loads(header), (message.decode('utf-8') if message else None)
 
 
 class StorageManager:
     """Gère le stockage des métriques"""
     
-    def __init__(self, data_dir, logger):
+    # Nombre maximal de séries compressées gardées ouvertes en mémoire
+    max_open_series = 1024
+    
+    # Application différée des métriques journalisées : taille de lot et délai maximal (secondes)
+    batch_size = 256
+    flush_interval = 1.0
+    
+    def __init__(self, data_dir, logger, use_wal=True, latest_table=None, alert_engine=None,
+                 forecaster=None):
         """
         Initialise le gestionnaire de stockage
         Args:
             data_dir (str): Répertoire de base pour le stockage
             logger: Logger pour les messages
+            use_wal (bool): Si True, les métriques reçues passent par le journal d'écriture anticipée
+            latest_table (LatestTable, optional): Table des dernières métriques en mémoire partagée
+            alert_engine (AlertEngine, optional): Règles d'alerte évaluées à chaque réception
+            forecaster (DiskForecaster, optional): Prévision du remplissage des partitions
         """
         self.data_dir = data_dir
         self.files_dir = os.path.join(data_dir, 'files')
         self.metrics_dir = os.path.join(data_dir, 'metrics')
         self.logger = logger
         
+        # Index d'historique déjà vérifiés (un par client)
+        self.history_indexes = {}
+        
+        # Dernière journée pour laquelle l'archivage a été demandé, par client
+        self.archived_days = {}
+        
+        # Séries compressées ouvertes (les moins récemment utilisées sont fermées)
+        self.series_stores = OrderedDict()
+        
         # Création des répertoires de base
         ensure_dir(self.data_dir)
         ensure_dir(self.files_dir)  # Conservé pour l'interface web
         ensure_dir(self.metrics_dir)
+        
+        # Archivage des journées terminées (thread démarré par le serveur)
+        self.compactor = HistoryCompactor(self.metrics_dir, logger)
+        
+        # Catalogue des hôtes (dernière réception et synthèse des métriques)
+        self.catalog = HostCatalog(self.metrics_dir)
+        self.migrate_layout()
+        
+        # Synthèse des hôtes publiée en mémoire partagée pour les processus web
+        self.latest_table = latest_table
+        if latest_table is not None and not latest_table.load(self.catalog.changed_since(-1, limit=-1)):
+            self.logger.warning("Latest metrics table is full or a hostname is too long: web workers will read the catalog")
+        
+        self.alert_engine = alert_engine
+        self.forecaster = forecaster
+        
+        # Journal d'écriture anticipée et métriques journalisées en attente d'application
+        self.wal = WriteAheadLog(os.path.join(data_dir, 'wal'), logger) if use_wal else None
+        self.pending = []
+        self.pending_since = None
+        
+        # Positions des messages journalisés, dans l'ordre du journal : le point de
+        # reprise n'avance que jusqu'au premier message encore en cours de traitement
+        # (les échantillons du pipeline peuvent être appliqués dans le désordre)
+        self.journaled = deque()
+        self.resolved = set()
+        self.wal_lock = threading.Lock()
+        self.synced_at = time.time()
+        
+        # Numéro du dernier message journalisé : le catalogue conserve celui du dernier
+        # message appliqué de chaque hôte (voir is_applied)
+        self.sequence = self.catalog.max_sequence()
+    
+    def recover(self, pipeline=None):
+        """
+        Rejoue les métriques journalisées qui n'ont pas été appliquées au stockage
+        (arrêt brutal du serveur avant l'application du dernier lot)
+        Args:
+            pipeline (Pipeline, optional): Pipeline démarré, par lequel les messages sont rejoués
+        Returns:
+            int: Nombre de messages rejoués
+        """
+        if not self.wal:
+            return 0
+        
+        count = 0
+        position = None
+        
+        for position, payload in self.wal.replay():
+            try:
+                record, message = read_record(payload)
+                hostname, timestamp = record['hostname'], record['timestamp']
+                sequence = record.get('seq')
+                
+                # Les nouveaux messages sont numérotés après ceux du journal
+                if sequence is not None:
+                    self.sequence = max(self.sequence, sequence)
+                
+                # Message déjà appliqué avant l'arrêt (point de reprise non encore avancé)
+                applied = self.is_applied(hostname, timestamp, sequence)
+                
+                if pipeline is not None:
+                    # Mêmes étapes qu'à la réception ; point de reprise avancé à l'application
+                    with self.wal_lock:
+                        self.journaled.append(position)
+                        if applied:
+                            self.resolved.add(position)
+                    
+                    if not applied:
+                        pipeline.submit(Sample(
+                            hostname, timestamp, message=message, metrics=record.get('metrics'),
+                            peer=record.get('peer'), position=position, sequence=sequence
+                        ))
+                        count += 1
+                    continue
+                
+                if applied:
+                    continue
+                
+                metrics = record['metrics'] if message is None else json.loads(message).get('data')
+                self.store_metrics(hostname, metrics, timestamp=timestamp, sequence=sequence)
+                count += 1
+            except Exception as e:
+                self.logger.error(f"Error replaying WAL record at {position}: {str(e)}")
+        
+        if pipeline is not None:
+            self.resolve(())
+        elif position is not None:
+            self.wal.checkpoint(position)
+        
+        if count:
+            self.logger.info(f"WAL recovery: {count} messages replayed")
+        return count
+    
+    def is_applied(self, hostname, timestamp, sequence=None):
+        """
+        Vérifie si un message journalisé a déjà été appliqué au stockage
+        Les messages d'un hôte sont appliqués dans l'ordre du journal : un message l'est
+        si son numéro ne dépasse pas celui du dernier message appliqué (catalogue).
+        Args:
+            hostname (str): Nom d'hôte du client
+            timestamp (float): Date de réception du message
+            sequence (int, optional): Numéro du message (absent des journaux antérieurs)
+        Returns:
+            bool: True si le message a déjà été appliqué au stockage
+        """
+        if sequence is not None:
+            applied = self.catalog.applied_sequence(hostname)
+            return applied is not None and sequence <= applied
+        
+        # Journal antérieur à la numérotation : comparaison avec le dernier échantillon
+        client_dir = host_dir(self.metrics_dir, hostname)
+        
+        if not os.path.isdir(client_dir):
+            return False
+        
+        last = self.get_history_index(hostname, client_dir).last()
+        return last is not None and timestamp < last.timestamp
+    
+    def journal(self, hostname, timestamp, metrics=None, message=None, peer=None):
+        """
+        Ajoute un message de métriques au journal, avant tout traitement
+        Un message non décodé (pipeline) est journalisé tel quel derrière une ligne
+        d'en-tête JSON, sans être réencodé par la boucle de réception.
+        Args:
+            hostname (str): Nom d'hôte du client
+            timestamp (float): Date de réception
+            metrics (dict, optional): Métriques décodées
+            message (str, optional): Message JSON non décodé
+            peer (str, optional): Adresse IP de la connexion du client
+        Returns:
+            tuple: (position du message dans le journal, numéro du message), (None, None) sans journal
+        """
+        if not self.wal:
+            return None, None
+        
+        with self.wal_lock:
+            self.sequence += 1
+            sequence = self.sequence
+        
+        record = {'hostname': hostname, 'timestamp': timestamp, 'seq': sequence}
+        if peer is not None:
+            record['peer'] = peer
+        
+        if message is None:
+            record['metrics'] = metrics
+            payload = json.dumps(record).encode('utf-8')
+        else:
+            payload = f"{json.dumps(record)}\n{message}".encode('utf-8')
+        
+        with self.wal_lock:
+            position = self.wal.append(payload)
+            self.journaled.append(position)
+        return position, sequence
+    
+    def sync_journal(self):
+        """
+        Force sur disque le journal au plus tard après flush_interval, même si
+        l'application des lots est en retard (pipeline encombré)
+        """
+        if self.wal and time.time() - self.synced_at >= self.flush_interval:
+            with self.wal_lock:
+                self.wal.sync()
+            self.synced_at = time.time()
+    
+    def resolve(self, positions):
+        """
+        Marque des messages journalisés comme traités (appliqués ou écartés) et avance
+        le point de reprise jusqu'au premier message encore en cours de traitement
+        Args:
+            positions (iterable): Positions des messages dans le journal
+        """
+        with self.wal_lock:
+            self.resolved.update(positions)
+            checkpoint = None
+            
+            while self.journaled and self.journaled[0] in self.resolved:
+                checkpoint = self.journaled.popleft()
+                self.resolved.discard(checkpoint)
+            
+            if checkpoint is not None:
+                self.wal.checkpoint(checkpoint)
+    
+    def enqueue_metrics(self, hostname, metrics, timestamp=None, values=None, position=None,
+                        sequence=None):
+        """
+        Journalise les métriques d'un client et diffère leur stockage
+        Le message est ajouté au journal avant toute écriture dans data/metrics ;
+        le stockage proprement dit est effectué par lots (voir flush_pending).
+        Args:
+            hostname (str): Nom d'hôte du client
+            metrics (dict): Métriques reçues
+            timestamp (float, optional): Date de réception (par défaut : maintenant)
+            values (dict, optional): Champs numériques aplatis, dérivés compris (voir pipeline)
+            position (tuple, optional): Position du message s'il est déjà journalisé (voir journal)
+            sequence (int, optional): Numéro du message s'il est déjà journalisé
+        """
+        if not self.wal:
+            self.store_metrics(hostname, metrics, timestamp=timestamp, values=values)
+            return
+        
+        # Horodatage de réception, conservé lors d'une éventuelle relecture du journal
+        if timestamp is None:
+            timestamp = float(int(time.time()))
+        
+        if position is None:
+            position, sequence = self.journal(hostname, timestamp, metrics=metrics)
+        
+        if not self.pending:
+            self.pending_since = time.time()
+        self.pending.append((position, hostname, metrics, timestamp, values, sequence))
+    
+    def flush_pending(self, force=False):
+        """
+        Applique au stockage le lot de métriques journalisées en attente
+        Le journal est d'abord forcé sur disque (une seule synchronisation pour
+        tout le lot), puis les métriques sont stockées et le point de reprise avancé.
+        Args:
+            force (bool): Si True, applique le lot quelle que soit sa taille
+        Returns:
+            int: Nombre de messages appliqués
+        """
+        if not self.pending:
+            return 0
+        
+        if not force and len(self.pending) < self.batch_size \
+                and time.time() - self.pending_since < self.flush_interval:
+            return 0
+        
+        with self.wal_lock:
+            self.wal.sync()
+        self.synced_at = time.time()
+        
+        batch, self.pending = self.pending, []
+        
+        for _, hostname, metrics, timestamp, values, sequence in batch:
+            try:
+                self.store_metrics(hostname, metrics, timestamp=timestamp, values=values, sequence=sequence)
+            except Exception as e:
+                self.logger.error(f"Error storing metrics for client {hostname}: {str(e)}")
+        
+        self.resolve(entry[0] for entry in batch)
+        return len(batch)
+    
+    def close(self):
+        """Applique les métriques en attente et ferme le journal"""
+        if self.wal:
+            self.flush_pending(force=True)
+            self.wal.close()
+        
+        if self.latest_table is not None:
+            self.latest_table.close()
+            self.latest_table = None
+        
+        if self.alert_engine is not None:
+            self.alert_engine.close()
+        
+        if self.forecaster is not None:
+            self.forecaster.close()
+    
+    def migrate_layout(self):
+        """
+        Déplace les répertoires clients de l'ancienne organisation (data/metrics/<hostname>)
+        vers les sous-répertoires de partitionnement (data/metrics/<shard>/<hostname>)
+        et les enregistre dans le catalogue des hôtes.
+        """
+        for hostname in os.listdir(self.metrics_dir):
+            legacy_dir = os.path.join(self.metrics_dir, hostname)
+            latest_path = os.path.join(legacy_dir, 'latest.json')
+            
+            # Seuls les répertoires clients contiennent latest.json
+            if not os.path.isfile(latest_path):
+                continue
+            
+            client_dir = host_dir(self.metrics_dir, hostname)
+            if os.path.exists(client_dir):
+                self.logger.warning(f"Cannot migrate {legacy_dir}: {client_dir} already exists")
+                continue
+            
+            ensure_dir(os.path.dirname(client_dir))
+            os.rename(legacy_dir, client_dir)
+            
+            try:
+                with open(os.path.join(client_dir, 'latest.json'), 'r') as f:
+                    metrics = json.load(f)
+                last_seen = os.path.getmtime(os.path.join(client_dir, 'latest.json'))
+                self.catalog.update(hostname, metrics, last_seen)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Error cataloguing migrated client {hostname}: {str(e)}")
+            
+            self.logger.info(f"Client directory migrated: {hostname}")
+    
+    def get_history_index(self, hostname, client_dir):
+        """
+        Retourne l'index d'historique d'un client, en le construisant si besoin
+        Args:
+            hostname (str): Nom d'hôte du client
+            client_dir (str): Répertoire des métriques du client
+        Returns:
+            HistoryIndex: Index d'historique du client
+        """
+        index = self.history_indexes.get(hostname)
+        
+        if index is None:
+            index = HistoryIndex(client_dir)
+            
+            if not index.exists():
+                count = index.rebuild()
+                self.logger.info(f"History index built for client {hostname} ({count} entries)")
+            
+            self.history_indexes[hostname] = index
+        
+        return index
+    
+    def get_series_store(self, hostname, client_dir):
+        """
+        Retourne les séries compressées d'un client
+        Args:
+            hostname (str): Nom d'hôte du client
+            client_dir (str): Répertoire des métriques du client
+        Returns:
+            SeriesStore: Séries du client
+        """
+        store = self.series_stores.pop(hostname, None)
+        
+        if store is None:
+            store = SeriesStore(client_dir)
+            
+            if len(self.series_stores) >= self.max_open_series:
+                self.series_stores.popitem(last=False)
+        
+        self.series_stores[hostname] = store
+        return store
     
-    def store_metrics(self, hostname, metrics, store_history=True):
+    def store_rollup(self, hostname, timestamp, values):
+        """
+        Ajoute les agrégats d'un intervalle aux séries agrégées d'un client
+        (sous-répertoire rollup, même format que les séries complètes)
+        Args:
+            hostname (str): Nom d'hôte du client
+            timestamp (int): Début de l'intervalle
+            values (dict): {chemin.min|max|avg: valeur}
+        """
+        rollup_dir = os.path.join(host_dir(self.metrics_dir, hostname), ROLLUP_DIR)
+        ensure_dir(rollup_dir)
+        SeriesStore(rollup_dir).append(timestamp, values)
+    
+    def store_metrics(self, hostname, metrics, store_history=True, timestamp=None, values=None,
+                      sequence=None):
         """
         Stocke les métriques d'un client
         Args:
             hostname (str): Nom d'hôte du client
             metrics (dict): Métriques à stocker
             store_history (bool): Si True, stocke aussi les métriques dans l'historique
+            timestamp (float, optional): Date de réception (par défaut : maintenant)
+            values (dict, optional): Champs numériques aplatis (par défaut : calculés ici)
+            sequence (int, optional): Numéro du message dans le journal (voir is_applied)
         """
         # Répertoire pour ce client
-        client_dir = os.path.join(self.metrics_dir, hostname)
+        client_dir = host_dir(self.metrics_dir, hostname)
         ensure_dir(client_dir)
         
+        data = json.dumps(metrics, indent=2)
+        
+        # Champs numériques aplatis (séries compressées et alertes)
+        if values is None:
+            values = flatten_metrics(metrics)
+        
         # Stockage des dernières métriques
         latest_path = os.path.join(client_dir, "latest.json")
-        with open(latest_path, 'w') as f:
-            json.dump(metrics, f, indent=2)
+        atomic_write(latest_path, data)
         
         # Stockage dans l'historique si demandé
         if store_history:
-            timestamp = format_timestamp()
-            history_path = os.path.join(client_dir, f"metrics-{timestamp}.json")
+            index = self.get_history_index(hostname, client_dir)
+            
+            # Horodatage à la seconde, cohérent avec le nom du fichier
+            if timestamp is None:
+                timestamp = float(int(time.time()))
+            timestamp, rank = index.next_key(timestamp)
             
-            with open(history_path, 'w') as f:
-                json.dump(metrics, f, indent=2)
+            # Archivage des journées terminées au changement de jour (en arrière-plan)
+            day = day_of(timestamp)
+            if self.archived_days.get(hostname) != day:
+                self.compactor.schedule(hostname)
+                self.archived_days[hostname] = day
+            filename = history_filename(timestamp, rank)
+            history_path = os.path.join(client_dir, filename)
+            
+            atomic_write(history_path, data)
+            
+            # Mise à jour de l'index temporel
+            index.append(timestamp, filename, 0, len(data), rank)
+            
+            # Ajout des champs numériques aux séries compressées
+            self.get_series_store(hostname, client_dir).append(timestamp, values)
+        
+        # Mise à jour du catalogue des hôtes, puis de sa copie en mémoire partagée
+        host = self.catalog.update(hostname, metrics, timestamp, sequence)
+        if self.latest_table is not None:
+            self.latest_table.publish(host)
+        
+        # Évaluation des règles d'alerte (une transition n'empêche pas le stockage)
+        if self.alert_engine is not None:
+            try:
+                self.alert_engine.evaluate(hostname, values, host['last_seen'])
+            except Exception as e:
+                self.logger.error(f"Error evaluating alerts for client {hostname}: {str(e)}")
+        
+        # Espace utilisé des partitions (prévision du remplissage)
+        if self.forecaster is not None:
+            self.forecaster.record(hostname, metrics.get('disk'), host['last_seen'])
             
-        self.logger.debug(f"Metrics stored for client {hostname}")
\ No newline at end of file
+        self.logger.debug(f"Metrics stored for client {hostname}")
@@ -4,10 +4,19 @@ utils.py
 Ce module contient des fonctions utilitaires pour le serveur NetMonitor.
 """
 import os
+import json
+import time
 import uuid
+import hashlib
 import logging
+import threading
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
 
 def setup_logger(name, debug=False):
     """Configure et retourne un logger"""
@@ -62,4 +71,131 @@ def ensure_dir(directory):
 
 def sanitize_path(path):
     """Sécurise un chemin de fichier en extrayant juste le nom de base"""
-    return os.path.basename(path)
\ No newline at end of file
+    return os.path.basename(path)
+
+
+def shard_name(hostname):
+    """Retourne le sous-répertoire de partitionnement (2 caractères hexadécimaux) d'un hôte"""
+    return hashlib.sha1(hostname.encode('utf-8')).hexdigest()[:2]
+
+
+def host_dir(metrics_dir, hostname):
+    """Retourne le répertoire des métriques d'un hôte (data/metrics/<shard>/<hostname>)"""
+    return os.path.join(metrics_dir, shard_name(hostname), hostname)
+
+
+def atomic_write(path, data):
+    """
+    Écrit un fichier de manière atomique (fichier temporaire puis renommage)
+    Un lecteur ne voit jamais un fichier partiellement écrit, même en cas d'arrêt brutal.
+    Args:
+        path (str): Chemin du fichier
+        data (str|bytes): Contenu à écrire
+    """
+    tmp_path = f"{path}.tmp"
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# Fichier de présence du serveur de réception (dans le répertoire de données)
+HEARTBEAT_NAME = 'server.json'
+
+
+def write_heartbeat(data_dir, info):
+    """
+    Enregistre l'état du serveur de réception, lu par l'application web
+    (processus distincts : l'état est partagé par le répertoire de données)
+    Args:
+        data_dir (str): Répertoire de données
+        info (dict): État du serveur (pid, adresse, clients...)
+    """
+    atomic_write(os.path.join(data_dir, HEARTBEAT_NAME), json.dumps(dict(info, updated=time.time())))
+
+
+def read_heartbeat(data_dir):
+    """
+    Lit l'état du serveur de réception
+    Args:
+        data_dir (str): Répertoire de données
+    Returns:
+        dict: État enregistré (avec la date de mise à jour), ou None si absent
+    """
+    try:
+        with open(os.path.join(data_dir, HEARTBEAT_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def clear_heartbeat(data_dir):
+    """Supprime l'état du serveur de réception (arrêt)"""
+    try:
+        os.remove(os.path.join(data_dir, HEARTBEAT_NAME))
+    except FileNotFoundError:
+        pass
+
+
+class FileLock:
+    """
+    Verrou partagé entre les threads et les processus (flock sur un fichier)
+    Réentrant pour un même thread ; sans fcntl, il ne protège que le processus courant.
+    """
+
+    def __init__(self, path):
+        """
+        Initialise le verrou
+        Args:
+            path (str): Fichier de verrouillage (créé si besoin)
+        """
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def acquire(self, blocking=True):
+        """
+        Prend le verrou
+        Args:
+            blocking (bool): Si False, échoue immédiatement si le verrou est pris
+        Returns:
+            bool: True si le verrou est pris
+        """
+        if not self.lock.acquire(blocking):
+            return False
+
+        if self.depth == 0 and fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            f = open(self.path, 'a')
+
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                self.lock.release()
+                return False
+
+            self.file = f
+
+        self.depth += 1
+        return True
+
+    def release(self):
+        """Libère le verrou"""
+        self.depth -= 1
+
+        if self.depth == 0 and self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,167 @@
+"""
+wal.py
+
+Ce module gère le journal d'écriture anticipée (write-ahead log) du serveur.
+
+Chaque message de métriques accepté est ajouté séquentiellement au journal
+avant d'être appliqué au stockage. Les écritures dans data/metrics peuvent
+ainsi être regroupées et différées : en cas d'arrêt brutal, les messages non
+encore appliqués sont rejoués au démarrage à partir du dernier point de
+reprise (checkpoint). Les segments entièrement appliqués sont supprimés.
+
+Format d'un enregistrement : longueur (uint32), CRC32 (uint32), données.
+"""
+import os
+import struct
+import zlib
+
+
+SEGMENT_PREFIX = 'wal-'
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_NAME = 'checkpoint'
+
+RECORD_HEADER = struct.Struct('<II')
+CHECKPOINT = struct.Struct('<QQ')
+
+
+class WriteAheadLog:
+    """Journal d'écriture anticipée découpé en segments"""
+
+    def __init__(self, wal_dir, logger, segment_size=16 * 1024 * 1024):
+        """
+        Initialise le journal
+        Args:
+            wal_dir (str): Répertoire des segments du journal
+            logger: Logger pour les messages
+            segment_size (int): Taille au-delà de laquelle un nouveau segment est ouvert
+        """
+        self.wal_dir = wal_dir
+        self.logger = logger
+        self.segment_size = segment_size
+        self.checkpoint_path = os.path.join(wal_dir, CHECKPOINT_NAME)
+
+        os.makedirs(wal_dir, exist_ok=True)
+
+        self.file = None
+        self.segment = None
+        self.dirty = False
+
+    def segment_path(self, segment):
+        """Retourne le chemin d'un segment"""
+        return os.path.join(self.wal_dir, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+    def list_segments(self):
+        """Retourne les numéros des segments présents, triés"""
+        segments = []
+
+        for filename in os.listdir(self.wal_dir):
+            if filename.startswith(SEGMENT_PREFIX) and filename.endswith(SEGMENT_SUFFIX):
+                try:
+                    segments.append(int(filename[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+
+        return sorted(segments)
+
+    def read_checkpoint(self):
+        """Retourne la position (segment, offset) du dernier message appliqué"""
+        try:
+            with open(self.checkpoint_path, 'rb') as f:
+                return CHECKPOINT.unpack(f.read(CHECKPOINT.size))
+        except (FileNotFoundError, struct.error):
+            return (0, 0)
+
+    def _open_segment(self, segment):
+        """Ouvre un nouveau segment en écriture"""
+        if self.file:
+            self.file.close()
+
+        self.segment = segment
+        self.file = open(self.segment_path(segment), 'ab')
+
+    def append(self, payload):
+        """
+        Ajoute un enregistrement au journal
+        Args:
+            payload (bytes): Données de l'enregistrement
+        Returns:
+            tuple: Position (segment, offset) à la fin de l'enregistrement
+        """
+        if self.file is None:
+            segments = self.list_segments()
+            # Toujours repartir sur un segment neuf après un redémarrage
+            self._open_segment(segments[-1] + 1 if segments else 1)
+        elif self.file.tell() >= self.segment_size:
+            self.sync()
+            self._open_segment(self.segment + 1)
+
+        self.file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self.file.write(payload)
+        self.dirty = True
+
+        return (self.segment, self.file.tell())
+
+    def sync(self):
+        """Force l'écriture sur disque des enregistrements ajoutés (validation groupée)"""
+        if self.file and self.dirty:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.dirty = False
+
+    def replay(self):
+        """
+        Parcourt les enregistrements postérieurs au point de reprise
+        Un enregistrement incomplet ou corrompu (fin de segment interrompue)
+        termine la lecture du segment.
+        Yields:
+            tuple: (position, données)
+        """
+        checkpoint_segment, checkpoint_offset = self.read_checkpoint()
+
+        for segment in self.list_segments():
+            if segment < checkpoint_segment:
+                continue
+
+            offset = checkpoint_offset if segment == checkpoint_segment else 0
+
+            with open(self.segment_path(segment), 'rb') as f:
+                f.seek(offset)
+
+                while True:
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+
+                    length, crc = RECORD_HEADER.unpack(header)
+                    payload = f.read(length)
+
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        self.logger.warning(f"Truncated WAL record in segment {segment} at offset {offset}")
+                        break
+
+                    offset = f.tell()
+                    yield (segment, offset), payload
+
+    def checkpoint(self, position):
+        """
+        Enregistre le point de reprise et supprime les segments entièrement appliqués
+        Args:
+            position (tuple): Position (segment, offset) du dernier message appliqué
+        """
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(CHECKPOINT.pack(*position))
+        os.replace(tmp_path, self.checkpoint_path)
+
+        for segment in self.list_segments():
+            if segment >= position[0]:
+                break
+            os.remove(self.segment_path(segment))
+            self.logger.debug(f"WAL segment {segment} recycled")
+
+    def close(self):
+        """Ferme le segment en cours"""
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,68 @@
+"""
+Tests de la résolution des alertes périmées (python -m unittest discover -s tests)
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+import unittest
+
+from server.alerts import AlertEngine, AlertStore, AlertRule, RULES_NAME
+from server.server import NetMonitorServer
+
+
+RULE = {
+    'name': 'cpu_high',
+    'metric': 'cpu.cpu_percent_avg',
+    'type': 'threshold',
+    'op': '>',
+    'value': 90,
+    'for': 0,
+}
+
+
+class StaleAlertTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_sweep_resolves_after_missed_intervals(self):
+        store = AlertStore(self.data_dir)
+        engine = AlertEngine([AlertRule(0, RULE)], store, logging.getLogger('test'))
+        self.addCleanup(engine.close)
+
+        engine.evaluate('host1', {'cpu.cpu_percent_avg': 99}, 1000)
+        engine.evaluate('host1', {'cpu.cpu_percent_avg': 99}, 1010)
+        self.assertEqual(len(store.active()), 1)
+
+        # Intervalle de réception de 10 s : périmée après 3 intervalles manqués
+        self.assertEqual(engine.sweep(1030), 0)
+        self.assertEqual(engine.sweep(1041), 1)
+        self.assertEqual(store.active(), [])
+
+    def test_server_resolves_without_ingest(self):
+        with open(os.path.join(self.data_dir, RULES_NAME), 'w') as f:
+            json.dump([RULE], f)
+
+        server = NetMonitorServer(port=0, data_dir=self.data_dir)
+        self.addCleanup(server.storage_manager.close)
+
+        # Dernier échantillon reçu il y a longtemps, aucun autre n'arrive ensuite
+        server.storage_manager.store_metrics(
+            'host1', {'cpu': {'cpu_percent_avg': 99}}, timestamp=float(int(time.time())) - 3600
+        )
+        store = server.storage_manager.alert_engine.store
+        self.assertEqual(len(store.active()), 1)
+
+        # Tâche périodique de la boucle du serveur
+        server.sweep_alerts()
+        self.assertEqual(store.active(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
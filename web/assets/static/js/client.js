@@ -1,7 +1,13 @@
 // client.js
 
 // Variables globales pour les graphiques
-let cpuChart, memoryChart, diskChart, networkChart;
+let cpuChart, memoryChart, diskChart, networkChart, trendChart;
+
+// Nombre maximal de points demandés pour la courbe de tendance
+const TREND_MAX_POINTS = 400;
+
+// Tableaux typés des séries compactes (types annoncés par l'en-tête du serveur)
+const SERIES_ARRAY_TYPES = { uint32: Uint32Array, float32: Float32Array };
 
 // Fonction pour initialiser tous les graphiques et le bouton
 document.addEventListener('DOMContentLoaded', function () {
@@ -9,16 +15,24 @@ document.addEventListener('DOMContentLoaded', function () {
     Chart.defaults.font.family = "'Inter', 'Helvetica', 'Arial', sans-serif";
     Chart.defaults.color = '#64748b';
     
-    // Initialiser le bouton flottant de rafraîchissement, mais ne pas l'afficher immédiatement
-    initFloatingRefreshButton(fetchLatestMetrics, 5000, 'bottom-right', 'sky', false);
-    
-    // Vérifier si nous avons des données pour afficher le bouton
-    if (chartData && (chartData.cpu || chartData.memory || chartData.disk || chartData.network)) {
-        showFloatingButton();
+    if (window.EventSource) {
+        // Mises à jour poussées par le serveur à chaque réception de métriques du client
+        connectClientStream();
     } else {
-        hideFloatingButton();
+        // Navigateur sans Server-Sent Events : rafraîchissement périodique
+        initFloatingRefreshButton(fetchLatestMetrics, 5000, 'bottom-right', 'sky', false);
+        
+        // Vérifier si nous avons des données pour afficher le bouton
+        if (chartData && (chartData.cpu || chartData.memory || chartData.disk || chartData.network)) {
+            showFloatingButton();
+        } else {
+            hideFloatingButton();
+        }
     }
     
+    // Courbe de tendance (API des séries temporelles)
+    initTrendChart();
+
     // Création du graphique CPU
     if (chartData.cpu) {
         const cpuCtx = document.getElementById('cpuChart').getContext('2d');
@@ -191,6 +205,161 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 });
 
+// Fonction pour s'abonner aux mises à jour du client affiché
+function connectClientStream() {
+    const params = new URLSearchParams({ host: window.clientHostname });
+    const source = new EventSource('/api/stream/?' + params.toString());
+
+    // Nouvelles métriques stockées pour ce client, ou rechargement demandé par le serveur
+    source.addEventListener('hosts', fetchLatestMetrics);
+    source.addEventListener('resync', fetchLatestMetrics);
+}
+
+// Fonction pour initialiser la courbe de tendance et ses sélecteurs
+function initTrendChart() {
+    const canvas = document.getElementById('trendChart');
+    if (!canvas) return;
+
+    trendChart = new Chart(canvas.getContext('2d'), {
+        type: 'line',
+        data: {
+            datasets: [{
+                label: '',
+                data: [],
+                borderColor: 'rgb(54, 162, 235)',
+                backgroundColor: 'rgba(54, 162, 235, 0.2)',
+                borderWidth: 1.5,
+                pointRadius: 0,
+                fill: true,
+                tension: 0.2
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            parsing: false,
+            normalized: true,
+            plugins: {
+                legend: {
+                    display: false
+                },
+                tooltip: {
+                    callbacks: {
+                        title: function (items) {
+                            return items.length ? new Date(items[0].parsed.x * 1000).toLocaleString('fr-FR') : '';
+                        },
+                        label: function (context) {
+                            return context.parsed.y.toFixed(1) + '%';
+                        }
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    type: 'linear',
+                    ticks: {
+                        maxTicksLimit: 8,
+                        callback: function (value) {
+                            return new Date(value * 1000).toLocaleString('fr-FR', {
+                                day: '2-digit', month: '2-digit', hour: '2-digit', minute: '2-digit'
+                            });
+                        }
+                    }
+                },
+                y: {
+                    beginAtZero: true,
+                    max: 100
+                }
+            },
+            animation: false
+        }
+    });
+
+    document.getElementById('trendMetric').addEventListener('change', fetchTrend);
+    document.getElementById('trendRange').addEventListener('change', fetchTrend);
+
+    fetchTrend();
+}
+
+// Fonction pour charger la série temporelle sélectionnée
+function fetchTrend() {
+    if (!trendChart) return;
+
+    const metric = document.getElementById('trendMetric').value;
+    const range = parseInt(document.getElementById('trendRange').value, 10);
+    const status = document.getElementById('trendStatus');
+    const now = Math.floor(Date.now() / 1000);
+
+    const params = new URLSearchParams({
+        host: window.clientHostname,
+        metric: metric,
+        from: now - range,
+        to: now,
+        max_points: TREND_MAX_POINTS,
+        encoding: 'binary'
+    });
+
+    fetch('/api/series/?' + params.toString())
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Erreur réseau: ' + response.status);
+            }
+            return response.arrayBuffer();
+        })
+        .then(buffer => {
+            const data = decodeSeriesBinary(buffer);
+            const series = data.series[0] || { timestamps: [], values: [], points: 0 };
+            const dataset = trendChart.data.datasets[0];
+
+            dataset.label = document.getElementById('trendMetric').selectedOptions[0].textContent;
+            dataset.data = seriesPoints(series, data.from);
+
+            trendChart.options.scales.x.min = data.from;
+            trendChart.options.scales.x.max = data.to;
+            trendChart.update();
+
+            if (status) {
+                status.textContent = series.points
+                    ? series.timestamps.length + ' points affichés sur ' + series.points
+                    : 'Aucune donnée sur cette période';
+            }
+        })
+        .catch(error => {
+            console.error('Erreur lors du chargement de la tendance:', error);
+            if (status) status.textContent = 'Erreur lors du chargement de la tendance';
+        });
+}
+
+// Fonction pour décoder une réponse binaire de l'API des séries (encoding=binary) :
+// longueur de l'en-tête, en-tête JSON, puis tableaux typés alignés sur 8 octets
+// (horodatages en secondes depuis data.from)
+function decodeSeriesBinary(buffer) {
+    const headerLength = new DataView(buffer).getUint32(0, true);
+    const data = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    let offset = 4 + headerLength;
+
+    data.series.forEach(series => {
+        Object.keys(data.arrays).forEach(field => {
+            const ArrayType = SERIES_ARRAY_TYPES[data.arrays[field]];
+            series[field] = new ArrayType(buffer, offset, series.count);
+            offset += Math.ceil(series.count * ArrayType.BYTES_PER_ELEMENT / 8) * 8;
+        });
+    });
+
+    return data;
+}
+
+// Fonction pour convertir une série compacte en points Chart.js ({x, y}, sans analyse)
+function seriesPoints(series, start) {
+    const points = new Array(series.timestamps.length);
+
+    for (let i = 0; i < points.length; i++) {
+        points[i] = { x: start + series.timestamps[i], y: series.values[i] };
+    }
+
+    return points;
+}
+
 // Fonction pour télécharger un fichier de métriques
 function downloadMetricsFile(hostname, filename) {
     // Approche 1: Rediriger vers la même URL mais avec un paramètre de téléchargement
@@ -268,9 +437,9 @@ function fetchLatestMetrics() {
     // Construire une nouvelle URL basée sur l'URL actuelle
     const url = new URL(window.location.href);
     
-    // Conserver le paramètre page existant s'il existe
+    // Conserver le paramètre page (ou le curseur) existant s'il existe
     // Si page n'existe pas encore, utiliser 1 comme valeur par défaut
-    if (!url.searchParams.has('page')) {
+    if (!url.searchParams.has('page') && !url.searchParams.has('before') && !url.searchParams.has('after')) {
         url.searchParams.set('page', '1');
     }
     
@@ -310,6 +479,7 @@ function fetchLatestMetrics() {
             
             // Mettre à jour les données et les graphiques
             updateCharts(data.chart_data);
+            fetchTrend();
             
             // Mettre à jour les infos système
             updateSystemInfo(data.metrics);
@@ -582,9 +752,11 @@ function updatePagination(pagination) {
                 prevButton.className = 'pagination-prev px-4 py-2 border border-gray-300 rounded-md text-sm font-medium text-gray-700 bg-white hover:bg-gray-50';
                 prevButton.innerHTML = `<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="none" stroke="currentColor" stroke-linecap="round" stroke-linejoin="round" stroke-width="2" class="lucide lucide-arrow-left-icon lucide-arrow-left" viewBox="0 0 24 24"><path d="m12 19-7-7 7-7M19 12H5"/></svg>`;
                 
-                // Créer l'URL avec la page précédente
+                // Créer l'URL avec le curseur de la page précédente
                 const url = new URL(window.location.href);
-                url.searchParams.set('page', pagination.prev_page);
+                url.searchParams.delete('page');
+                url.searchParams.delete('before');
+                url.searchParams.set('after', pagination.prev_cursor);
                 prevButton.href = url.toString();
                 
                 paginationButtons.appendChild(prevButton);
@@ -608,6 +780,8 @@ function updatePagination(pagination) {
                     
                     // Créer l'URL avec le numéro de page
                     const url = new URL(window.location.href);
+                    url.searchParams.delete('before');
+                    url.searchParams.delete('after');
                     url.searchParams.set('page', p);
                     pageButton.href = url.toString();
                     
@@ -630,6 +804,8 @@ function updatePagination(pagination) {
                     
                     // Créer l'URL avec le numéro de page
                     const url = new URL(window.location.href);
+                    url.searchParams.delete('before');
+                    url.searchParams.delete('after');
                     url.searchParams.set('page', p);
                     pageButton.href = url.toString();
                     
@@ -643,9 +819,11 @@ function updatePagination(pagination) {
                 nextButton.className = 'pagination-next px-4 py-2 border border-gray-300 rounded-md text-sm font-medium text-gray-700 bg-white hover:bg-gray-50';
                 nextButton.innerHTML = `<svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="none" stroke="currentColor" stroke-linecap="round" stroke-linejoin="round" stroke-width="2" class="lucide lucide-arrow-right-icon lucide-arrow-right" viewBox="0 0 24 24"><path d="M5 12h14M12 5l7 7-7 7"/></svg>`;
                 
-                // Créer l'URL avec la page suivante
+                // Créer l'URL avec le curseur de la page suivante
                 const url = new URL(window.location.href);
-                url.searchParams.set('page', pagination.next_page);
+                url.searchParams.delete('page');
+                url.searchParams.delete('after');
+                url.searchParams.set('before', pagination.next_cursor);
                 nextButton.href = url.toString();
                 
                 paginationButtons.appendChild(nextButton);
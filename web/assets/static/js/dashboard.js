@@ -1,14 +1,224 @@
 // dashboard.js
 
+// Clients affichés (page courante) et nombre total de machines
+let dashboardClients = [];
+let dashboardTotal = 0;
+
+// Délai (en secondes) au-delà duquel une machine est hors ligne, transmis par le flux
+let onlineTimeout = 300;
+
+// Nombre de machines du classement et délai minimal (en ms) entre deux rechargements
+const TOP_COUNT = 10;
+const TOP_REFRESH_DELAY = 2000;
+let topRefreshTimer = null;
+
+// Nombre de partitions de la prévision et intervalle (en ms) de rechargement
+// (prévisions recalculées toutes les 5 minutes par le serveur)
+const FORECAST_COUNT = 10;
+const FORECAST_REFRESH_INTERVAL = 300000;
+
 // Fonction pour initialiser le tableau de bord
 document.addEventListener('DOMContentLoaded', function () {
-    // Initialiser le bouton flottant de rafraîchissement, mais ne pas l'afficher immédiatement
-    initFloatingRefreshButton(fetchDashboardData, 5000, 'bottom-right', 'sky', false);
+    if (window.EventSource) {
+        // Mises à jour poussées par le serveur
+        connectDashboardStream();
+
+        // Passage hors ligne calculé localement, sans requête
+        setInterval(refreshStatuses, 10000);
+    } else {
+        // Navigateur sans Server-Sent Events : rafraîchissement périodique
+        initFloatingRefreshButton(fetchDashboardData, 5000, 'bottom-right', 'sky', false);
+    }
     
     // Récupérer les données initiales
     fetchDashboardData();
+
+    // Classement des machines les plus chargées
+    const topMetric = document.getElementById('top-metric');
+    if (topMetric) {
+        topMetric.addEventListener('change', fetchTopHosts);
+        fetchTopHosts();
+    }
+
+    // Prévision du remplissage des partitions
+    if (document.getElementById('forecast-list')) {
+        fetchForecast();
+        setInterval(fetchForecast, FORECAST_REFRESH_INTERVAL);
+    }
 });
 
+// Fonction pour récupérer les partitions qui seront pleines le plus tôt
+function fetchForecast() {
+    fetch(`/api/forecast/?n=${FORECAST_COUNT}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Erreur HTTP: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => updateForecastUI(data.partitions))
+        .catch(error => console.error('Erreur lors de la récupération des prévisions:', error));
+}
+
+// Fonction pour formater une durée restante (minutes, heures ou jours)
+function formatTimeLeft(seconds) {
+    if (seconds < 3600) return `${Math.max(Math.round(seconds / 60), 1)} min`;
+    if (seconds < 2 * 86400) return `${Math.round(seconds / 3600)} h`;
+    return `${Math.round(seconds / 86400)} j`;
+}
+
+// Fonction pour afficher la prévision du remplissage des partitions
+function updateForecastUI(partitions) {
+    const forecastList = document.getElementById('forecast-list');
+    if (!forecastList) return;
+
+    if (partitions.length === 0) {
+        forecastList.innerHTML = '<li class="py-2 text-gray-500">Aucune partition en cours de remplissage</li>';
+        return;
+    }
+
+    forecastList.innerHTML = partitions.map(partition => `
+        <li class="py-2 flex justify-between items-center">
+            <a href="/dashboard/${partition.hostname}" class="text-gray-900 hover:text-sky-700">
+                ${partition.hostname} <span class="text-gray-500">${partition.mountpoint}</span>
+            </a>
+            <span class="${partition.seconds_left < 86400 ? 'text-red-600' : 'text-gray-600'}">
+                ${partition.percent}% - pleine dans ${formatTimeLeft(partition.seconds_left)}
+            </span>
+        </li>
+    `).join('');
+}
+
+// Fonction pour récupérer le classement des machines les plus chargées
+function fetchTopHosts() {
+    const topMetric = document.getElementById('top-metric');
+    if (!topMetric) return;
+
+    const metric = topMetric.value;
+
+    fetch(`/api/top/?metric=${encodeURIComponent(metric)}&n=${TOP_COUNT}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Erreur HTTP: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => updateTopUI(data.hosts, metric))
+        .catch(error => console.error('Erreur lors de la récupération du classement:', error));
+}
+
+// Fonction pour recharger le classement, au plus une fois par TOP_REFRESH_DELAY
+function scheduleTopRefresh() {
+    if (topRefreshTimer) return;
+
+    topRefreshTimer = setTimeout(function () {
+        topRefreshTimer = null;
+        fetchTopHosts();
+    }, TOP_REFRESH_DELAY);
+}
+
+// Fonction pour afficher le classement
+function updateTopUI(hosts, metric) {
+    const topList = document.getElementById('top-list');
+    if (!topList) return;
+
+    if (hosts.length === 0) {
+        topList.innerHTML = '<li class="py-2 text-gray-500">Aucune donnée</li>';
+        return;
+    }
+
+    const isRate = metric === 'net_errors' || metric === 'net_drops';
+
+    topList.innerHTML = hosts.map((host, index) => `
+        <li class="py-2 flex justify-between items-center">
+            <a href="/dashboard/${host.hostname}" class="flex items-center text-gray-900 hover:text-sky-700">
+                <span class="w-6 text-gray-400">${index + 1}.</span>
+                <span class="w-2 h-2 rounded-full mr-2 ${host.status === 'Online' ? 'bg-green-500' : 'bg-gray-400'}"></span>
+                ${host.hostname}
+            </a>
+            <span class="text-gray-600">${isRate ? `${host.value.toFixed(2)} /s` : `${host.value}%`}</span>
+        </li>
+    `).join('');
+}
+
+// Fonction pour s'abonner au flux des mises à jour
+function connectDashboardStream() {
+    const source = new EventSource('/api/stream/');
+
+    source.addEventListener('hello', function (event) {
+        const data = JSON.parse(event.data);
+        onlineTimeout = data.online_timeout || onlineTimeout;
+    });
+
+    source.addEventListener('hosts', function (event) {
+        const data = JSON.parse(event.data);
+        applyHostUpdates(data.hosts, data.total);
+        scheduleTopRefresh();
+    });
+
+    // Le serveur n'a pas pu transmettre toutes les mises à jour : rechargement complet
+    source.addEventListener('resync', function () {
+        fetchDashboardData();
+        fetchTopHosts();
+    });
+}
+
+// Fonction pour appliquer les mises à jour reçues aux clients affichés
+function applyHostUpdates(hosts, total) {
+    let changed = total !== dashboardTotal;
+    let newHost = false;
+
+    hosts.forEach(host => {
+        const client = dashboardClients.find(c => c.hostname === host.hostname);
+
+        if (!client) {
+            newHost = true;
+            return;
+        }
+
+        client.cpu_percent = host.cpu_percent;
+        client.memory_percent = host.memory_percent;
+        client.disk_percent = host.disk_percent;
+        client.last_seen = host.last_seen;
+        client.last_update = formatTimestamp(host.last_seen);
+        client.status = host.status;
+        changed = true;
+    });
+
+    // Nouvelle machine : la page courante peut changer, rechargement complet
+    if (newHost) {
+        fetchDashboardData();
+    } else if (changed) {
+        dashboardTotal = total;
+        updateDashboardUI(dashboardClients, dashboardTotal);
+    }
+}
+
+// Fonction pour marquer hors ligne les machines sans mise à jour récente
+function refreshStatuses() {
+    const now = Date.now() / 1000;
+    let changed = false;
+
+    dashboardClients.forEach(client => {
+        if (client.status === 'Online' && client.last_seen && now - client.last_seen >= onlineTimeout) {
+            client.status = 'Offline';
+            changed = true;
+        }
+    });
+
+    if (changed) {
+        updateDashboardUI(dashboardClients, dashboardTotal);
+    }
+}
+
+// Fonction pour formater un timestamp comme le serveur (jj/mm/aaaa hh:mm:ss)
+function formatTimestamp(timestamp) {
+    const date = new Date(timestamp * 1000);
+    const pad = value => String(value).padStart(2, '0');
+    return `${pad(date.getDate())}/${pad(date.getMonth() + 1)}/${date.getFullYear()} ` +
+        `${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}`;
+}
+
 // Fonction pour récupérer les données du tableau de bord via AJAX
 function fetchDashboardData() {
     // Afficher un indicateur de chargement si nécessaire
@@ -20,6 +230,8 @@ function fetchDashboardData() {
     // Construire l'URL pour la requête AJAX
     const url = new URL(window.location.href);
     url.searchParams.set('format', 'json');
+    // Synthèse calculée à la réception : pas de document de métriques complet
+    url.searchParams.set('view', 'summary');
 
     // Faire une requête AJAX
     fetch(url.toString())
@@ -49,13 +261,13 @@ function fetchDashboardData() {
             }
 
             // Mettre à jour les clients dans l'interface
-            updateDashboardUI(data.clients);
-            
-            // Afficher ou cacher le bouton flottant selon qu'il y a des clients ou non
-            if (data.clients && data.clients.length > 0) {
-                showFloatingButton();
-            } else {
-                hideFloatingButton();
+            dashboardClients = data.clients;
+            dashboardTotal = data.total;
+            updateDashboardUI(data.clients, data.total);
+
+            // Rafraîchissement périodique (navigateur sans Server-Sent Events)
+            if (!window.EventSource) {
+                fetchTopHosts();
             }
 
             // Restaurer l'opacité
@@ -66,8 +278,10 @@ function fetchDashboardData() {
         .catch(error => {
             console.error('Erreur lors de la récupération des données:', error);
 
-            // Cacher le bouton flottant en cas d'erreur
-            hideFloatingButton();
+            // Cacher le bouton flottant en cas d'erreur (rafraîchissement périodique)
+            if (!window.EventSource) {
+                hideFloatingButton();
+            }
             
             // Restaurer l'opacité en cas d'erreur
             if (dashboardContainer) {
@@ -77,7 +291,7 @@ function fetchDashboardData() {
 }
 
 // Fonction pour mettre à jour l'interface du tableau de bord
-function updateDashboardUI(clients) {
+function updateDashboardUI(clients, total) {
     // Trouver le conteneur des clients
     const clientsContainer = document.querySelector('.grid.grid-cols-1.md\\:grid-cols-2.lg\\:grid-cols-3.gap-4');
     if (!clientsContainer) return;
@@ -85,7 +299,7 @@ function updateDashboardUI(clients) {
     // Mettre à jour le nombre de machines surveillées
     const clientsCountElem = document.querySelector('h2.text-xl.font-semibold.text-sky-800.mb-4');
     if (clientsCountElem) {
-        clientsCountElem.textContent = `Machines surveillées (${clients.length})`;
+        clientsCountElem.textContent = `Machines surveillées (${total !== undefined ? total : clients.length})`;
     }
 
     // Si aucun client, afficher un message
@@ -122,8 +336,8 @@ function updateDashboardUI(clients) {
         }
 
         return;
-    } else {
-        // Afficher le bouton flottant s'il y a des clients
+    } else if (!window.EventSource) {
+        // Afficher le bouton flottant s'il y a des clients (rafraîchissement périodique)
         showFloatingButton();
     }
 
@@ -151,19 +365,9 @@ function updateDashboardUI(clients) {
         clientCard.href = `/dashboard/${client.hostname}`;
         clientCard.className = `bg-white rounded-lg shadow-md p-4 border-l-4 ${client.status === 'Online' ? 'border-green-500' : 'border-gray-400'} hover:shadow-lg transition-all duration-300`;
 
-        // Déterminer le pourcentage d'utilisation du disque
-        let diskPercent = 0;
-        let diskDisplay = 'N/A';
-        if (client.metrics.disk && client.metrics.disk.partitions) {
-            let rootPartition = client.metrics.disk.partitions.find(p => p.mountpoint === '/');
-            if (rootPartition) {
-                diskPercent = rootPartition.percent;
-                diskDisplay = `${rootPartition.percent}%`;
-            } else if (client.metrics.disk.partitions.length > 0) {
-                diskPercent = client.metrics.disk.partitions[0].percent;
-                diskDisplay = `${client.metrics.disk.partitions[0].percent}%`;
-            }
-        }
+        // Pourcentages de la synthèse (null si la métrique est absente)
+        const percentDisplay = value => value !== null && value !== undefined ? `${value}%` : 'N/A';
+        const diskPercent = client.disk_percent || 0;
 
         // Déterminer la couleur de la barre de disque en fonction du pourcentage
         let diskBarColor = 'bg-sky-600';
@@ -190,11 +394,11 @@ function updateDashboardUI(clients) {
                 <div class="flex justify-between items-center text-sm mb-1">
                     <span class="font-medium text-gray-700">CPU</span>
                     <span class="text-gray-600">
-                        ${client.metrics.cpu && client.metrics.cpu.cpu_percent_avg !== undefined ? `${client.metrics.cpu.cpu_percent_avg}%` : 'N/A'}
+                        ${percentDisplay(client.cpu_percent)}
                     </span>
                 </div>
                 <div class="w-full bg-gray-200 rounded-full h-2">
-                    <div class="bg-sky-600 h-2 rounded-full" style="width: ${client.metrics.cpu && client.metrics.cpu.cpu_percent_avg !== undefined ? client.metrics.cpu.cpu_percent_avg : 0}%"></div>
+                    <div class="bg-sky-600 h-2 rounded-full" style="width: ${client.cpu_percent || 0}%"></div>
                 </div>
             </div>
             
@@ -203,11 +407,11 @@ function updateDashboardUI(clients) {
                 <div class="flex justify-between items-center text-sm mb-1">
                     <span class="font-medium text-gray-700">Mémoire</span>
                     <span class="text-gray-600">
-                        ${client.metrics.memory && client.metrics.memory.virtual_memory && client.metrics.memory.virtual_memory.percent !== undefined ? `${client.metrics.memory.virtual_memory.percent}%` : 'N/A'}
+                        ${percentDisplay(client.memory_percent)}
                     </span>
                 </div>
                 <div class="w-full bg-gray-200 rounded-full h-2">
-                    <div class="bg-sky-600 h-2 rounded-full" style="width: ${client.metrics.memory && client.metrics.memory.virtual_memory && client.metrics.memory.virtual_memory.percent !== undefined ? client.metrics.memory.virtual_memory.percent : 0}%"></div>
+                    <div class="bg-sky-600 h-2 rounded-full" style="width: ${client.memory_percent || 0}%"></div>
                 </div>
             </div>
 
@@ -215,7 +419,7 @@ function updateDashboardUI(clients) {
             <div class="mt-3">
                 <div class="flex justify-between items-center text-sm mb-1">
                     <span class="font-medium text-gray-700">Disque</span>
-                    <span class="text-gray-600">${diskDisplay}</span>
+                    <span class="text-gray-600">${percentDisplay(client.disk_percent)}</span>
                 </div>
                 <div class="w-full bg-gray-200 rounded-full h-2">
                     <div class="${diskBarColor} h-2 rounded-full" style="width: ${diskPercent}%"></div>
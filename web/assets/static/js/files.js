@@ -19,17 +19,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
         // Obtenir le token CSRF
         const csrfToken = document.querySelector('input[name="csrf_token"]').value;
-
-        // Créer un objet FormData pour envoyer les données
-        const formData = new FormData();
-        formData.append('csrf_token', csrfToken);
-        formData.append('file', fileInput.files[0]);
-
-        // Créer une requête AJAX
-        const xhr = new XMLHttpRequest();
-
-        // Configurer la requête
-        xhr.open('POST', form.action || window.location.href, true);
+        const file = fileInput.files[0];
 
         // Masquer le formulaire
         formContainer.style.display = 'none';
@@ -37,18 +27,13 @@ document.addEventListener('DOMContentLoaded', function () {
         // Afficher la barre de progression
         progressContainer.classList.remove('hidden');
 
-        // Écouter l'événement de progression
-        xhr.upload.addEventListener('progress', function (e) {
-            if (e.lengthComputable) {
-                const percentComplete = Math.round((e.loaded / e.total) * 100);
-                progressBar.style.width = percentComplete + '%';
-                progressText.textContent = percentComplete + '% - ' + (percentComplete < 100 ? 'Téléchargement en cours...' : 'Finalisation...');
-            }
-        });
-
-        // Écouter l'événement de fin de téléchargement
-        xhr.addEventListener('load', function () {
-            if (xhr.status >= 200 && xhr.status < 300) {
+        // Téléversement par morceaux : reprise possible après une interruption
+        uploadFile(file, csrfToken, function (loaded, total) {
+            const percentComplete = total > 0 ? Math.round((loaded / total) * 100) : 100;
+            progressBar.style.width = percentComplete + '%';
+            progressText.textContent = percentComplete + '% - ' + (percentComplete < 100 ? 'Téléchargement en cours...' : 'Finalisation...');
+        })
+            .then(function () {
                 // Téléchargement réussi
                 progressBar.style.width = '100%';
                 progressText.textContent = 'Téléchargement terminé avec succès !';
@@ -64,54 +49,176 @@ document.addEventListener('DOMContentLoaded', function () {
                     // Recharger la page pour afficher le nouveau fichier et les messages flash de Flask
                     window.location.reload();
                 }, 1500);
-            } else {
+            })
+            .catch(function (error) {
                 // Erreur lors du téléchargement
                 progressContainer.classList.add('bg-red-100');
                 progressBar.classList.remove('bg-sky-600');
                 progressBar.classList.add('bg-red-600');
-                progressText.textContent = 'Erreur lors du téléchargement';
+                progressText.textContent = error.message || 'Erreur lors du téléchargement';
 
                 // Réafficher le formulaire après un court délai
                 setTimeout(function () {
                     formContainer.style.display = 'block';
                     progressContainer.classList.add('hidden');
+                    progressContainer.classList.remove('bg-red-100');
                     progressBar.style.width = '0%';
                     progressBar.classList.remove('bg-red-600');
                     progressBar.classList.add('bg-sky-600');
                 }, 2000);
+            });
+    });
+});
+
+// Nombre maximal de tentatives pour un morceau (coupure réseau)
+const UPLOAD_RETRIES = 5;
+
+// Taille maximale d'un fichier dont l'empreinte est calculée avant l'envoi
+// (crypto.subtle lit le fichier entier en mémoire)
+const HASH_MAX_SIZE = 256 * 1024 * 1024;
+
+// Fonction pour calculer l'empreinte SHA-256 d'un fichier (null si indisponible)
+async function fileSha256(file) {
+    if (!window.crypto || !window.crypto.subtle || file.size > HASH_MAX_SIZE) {
+        return null;
+    }
+
+    try {
+        const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    } catch (e) {
+        return null;
+    }
+}
+
+// Clé de reprise d'un fichier (même nom, taille et date de modification)
+function uploadKey(file) {
+    return `upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+// Fonction pour appeler l'API de téléversement (réponse JSON)
+async function uploadRequest(url, method, csrfToken, body) {
+    const response = await fetch(url, {
+        method: method,
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrfToken
+        },
+        body: body !== undefined ? JSON.stringify(body) : undefined
+    });
+    const data = await response.json().catch(() => ({}));
+
+    if (!response.ok) {
+        const error = new Error(data.error || `Erreur HTTP: ${response.status}`);
+        error.status = response.status;
+        error.offset = data.offset;
+        throw error;
+    }
+    return data;
+}
+
+// Fonction pour envoyer un morceau (XMLHttpRequest pour suivre la progression)
+function sendChunk(uploadId, offset, chunk, csrfToken, onProgress) {
+    return new Promise(function (resolve, reject) {
+        const xhr = new XMLHttpRequest();
+        xhr.open('PUT', `/files/uploads/${uploadId}/?offset=${offset}`, true);
+        xhr.setRequestHeader('X-CSRFToken', csrfToken);
+        xhr.setRequestHeader('Content-Type', 'application/octet-stream');
+
+        xhr.upload.addEventListener('progress', function (e) {
+            if (e.lengthComputable) {
+                onProgress(e.loaded);
             }
         });
 
-        // Écouter l'événement d'erreur
-        xhr.addEventListener('error', function () {
-            progressContainer.classList.add('bg-red-100');
-            progressBar.classList.remove('bg-sky-600');
-            progressBar.classList.add('bg-red-600');
-            progressText.textContent = 'Erreur de connexion';
+        xhr.addEventListener('load', function () {
+            let data = {};
+            try {
+                data = JSON.parse(xhr.responseText);
+            } catch (e) {
+                // Réponse non JSON (proxy, erreur serveur)
+            }
+
+            if (xhr.status >= 200 && xhr.status < 300) {
+                resolve(data.offset);
+            } else {
+                const error = new Error(data.error || `Erreur HTTP: ${xhr.status}`);
+                error.status = xhr.status;
+                error.offset = data.offset;
+                reject(error);
+            }
+        });
+        xhr.addEventListener('error', () => reject(new Error('Erreur de connexion')));
+        xhr.addEventListener('abort', () => reject(new Error('Téléchargement annulé')));
 
-            // Réafficher le formulaire après un court délai
-            setTimeout(function () {
-                formContainer.style.display = 'block';
-                progressContainer.classList.add('hidden');
-                progressBar.style.width = '0%';
-                progressBar.classList.remove('bg-red-600');
-                progressBar.classList.add('bg-sky-600');
-            }, 2000);
+        xhr.send(chunk);
+    });
+}
+
+// Fonction pour téléverser un fichier par morceaux, en reprenant un envoi interrompu
+async function uploadFile(file, csrfToken, onProgress) {
+    const key = uploadKey(file);
+    let state = null;
+
+    // Reprise d'un téléversement précédent du même fichier
+    const savedId = localStorage.getItem(key);
+    if (savedId) {
+        state = await uploadRequest(`/files/uploads/${savedId}/`, 'GET', csrfToken).catch(() => null);
+    }
+
+    if (!state) {
+        // Empreinte transmise : fichier déjà présent dans le partage créé sans transfert
+        const sha256 = await fileSha256(file);
+
+        state = await uploadRequest('/files/uploads/', 'POST', csrfToken, {
+            filename: file.name,
+            size: file.size,
+            sha256: sha256 || undefined
         });
 
-        // Écouter l'événement d'abandon
-        xhr.addEventListener('abort', function () {
-            progressText.textContent = 'Téléchargement annulé';
+        if (state.complete) {
+            onProgress(file.size, file.size);
+            return;
+        }
+        localStorage.setItem(key, state.id);
+    }
+
+    let offset = state.offset;
+    let retries = 0;
+    onProgress(offset, file.size);
+
+    while (offset < file.size) {
+        const chunk = file.slice(offset, offset + state.chunk_size);
+
+        try {
+            offset = await sendChunk(state.id, offset, chunk, csrfToken, loaded => onProgress(offset + loaded, file.size));
+            retries = 0;
+        } catch (error) {
+            // Position différente côté serveur : reprise à la position indiquée
+            if (error.status === 409 && error.offset !== undefined) {
+                offset = error.offset;
+                continue;
+            }
 
-            // Réafficher le formulaire après un court délai
-            setTimeout(function () {
-                formContainer.style.display = 'block';
-                progressContainer.classList.add('hidden');
-                progressBar.style.width = '0%';
-            }, 2000);
-        });
+            // Requête refusée : inutile de réessayer
+            if (error.status && error.status !== 400 && error.status < 500) {
+                localStorage.removeItem(key);
+                throw error;
+            }
 
-        // Envoyer la requête
-        xhr.send(formData);
-    });
-});
\ No newline at end of file
+            if (++retries > UPLOAD_RETRIES) {
+                throw error;
+            }
+
+            // Nouvelle tentative après un délai croissant, à la position enregistrée par le serveur
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+            const current = await uploadRequest(`/files/uploads/${state.id}/`, 'GET', csrfToken).catch(() => null);
+            if (current) {
+                offset = current.offset;
+            }
+        }
+    }
+
+    await uploadRequest(`/files/uploads/${state.id}/complete/`, 'POST', csrfToken);
+    localStorage.removeItem(key);
+}
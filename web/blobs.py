@@ -0,0 +1,196 @@
+"""
+    blobs.py
+
+    Ce module gère le stockage des fichiers partagés par contenu (déduplication).
+
+    Chaque contenu distinct est enregistré une seule fois dans le dossier
+    .blobs du dossier de téléchargement, sous le nom de son empreinte SHA-256
+    (.blobs/ab/abcdef...). Les fichiers visibles du partage sont des liens
+    physiques vers ces contenus : plusieurs noms pour un même contenu n'occupent
+    la place qu'une fois. Le nombre de liens du contenu (st_nlink) sert de
+    compteur de références : un contenu qui n'est plus lié à aucun nom est supprimé.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+
+from server.utils import FileLock
+
+# Sous-répertoire (dans le dossier de téléchargement) des contenus
+BLOBS_DIR = '.blobs'
+
+# Sous-répertoire (dans BLOBS_DIR) des fichiers en cours d'écriture
+TMP_DIR = 'tmp'
+
+# Fichier de verrouillage (dans BLOBS_DIR)
+LOCK_NAME = '.lock'
+
+# Taille des blocs lus lors de l'écriture d'un contenu
+IO_BLOCK_SIZE = 1024 * 1024
+
+# Délai (en secondes) au-delà duquel un fichier temporaire abandonné est supprimé
+TMP_EXPIRY = 24 * 3600
+
+
+class BlobStore:
+    """Contenus du partage de fichiers, indexés par empreinte SHA-256"""
+
+    def __init__(self, upload_folder):
+        """
+        Initialise le stockage
+        Args:
+            upload_folder (str): Dossier de téléchargement
+        """
+        self.upload_folder = upload_folder
+        self.root = os.path.join(upload_folder, BLOBS_DIR)
+        self.tmp_dir = os.path.join(self.root, TMP_DIR)
+
+        # Création, liaison et libération sérialisées (entre threads et processus) :
+        # un contenu n'est pas supprimé pendant qu'un nouveau nom y est lié
+        self.lock = FileLock(os.path.join(self.root, LOCK_NAME))
+
+    def path(self, digest):
+        """Chemin du contenu d'empreinte donnée"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def temp_path(self):
+        """Chemin d'un fichier temporaire (même système de fichiers que les contenus)"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex)
+
+    def write(self, stream):
+        """
+        Écrit un flux dans un fichier temporaire en calculant son empreinte
+        Args:
+            stream: Flux à lire (méthode read)
+        Returns:
+            tuple: (chemin du fichier temporaire, empreinte SHA-256, taille)
+        """
+        path = self.temp_path()
+        hasher = hashlib.sha256()
+        size = 0
+
+        try:
+            with open(path, 'wb') as f:
+                while True:
+                    block = stream.read(IO_BLOCK_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+                    hasher.update(block)
+                    size += len(block)
+        except BaseException:
+            os.remove(path)
+            raise
+
+        return path, hasher.hexdigest(), size
+
+    def put(self, source, digest):
+        """
+        Enregistre un fichier comme contenu d'empreinte donnée
+        Si le contenu existe déjà, le fichier est supprimé (doublon).
+        Args:
+            source (str): Fichier à enregistrer (déplacé)
+            digest (str): Empreinte SHA-256 du fichier
+        """
+        target = self.path(digest)
+
+        with self.lock:
+            if os.path.exists(target):
+                os.remove(source)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+
+    def link(self, digest, name):
+        """
+        Lie un nom du partage à un contenu (remplace le fichier existant)
+        Args:
+            digest (str): Empreinte du contenu
+            name (str): Nom du fichier dans le dossier de téléchargement
+        """
+        temp = self.temp_path()
+
+        with self.lock:
+            # Lien créé à côté puis renommé : le nom n'est jamais absent ni incomplet
+            os.link(self.path(digest), temp)
+            try:
+                os.replace(temp, os.path.join(self.upload_folder, name))
+            except BaseException:
+                os.remove(temp)
+                raise
+
+    def adopt(self, path, digest):
+        """
+        Rattache un fichier déposé hors de l'application à son contenu : lié au
+        contenu existant (la copie est libérée) ou enregistré comme nouveau contenu
+        Args:
+            path (str): Fichier du partage
+            digest (str): Empreinte SHA-256 du fichier
+        """
+        target = self.path(digest)
+
+        with self.lock:
+            try:
+                if os.path.samefile(path, target):
+                    return
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.link(path, target)
+                return
+
+            self.link(digest, os.path.basename(path))
+
+    def release(self, digest):
+        """
+        Supprime un contenu qui n'est plus lié à aucun nom du partage
+        Args:
+            digest (str): Empreinte du contenu
+        Returns:
+            bool: True si le contenu a été supprimé
+        """
+        target = self.path(digest)
+
+        with self.lock:
+            try:
+                if os.stat(target).st_nlink > 1:
+                    return False
+                os.remove(target)
+            except FileNotFoundError:
+                return False
+
+        return True
+
+    def sweep(self, max_age=TMP_EXPIRY):
+        """
+        Supprime les contenus orphelins (interruption entre l'enregistrement et
+        la liaison d'un nom) et les fichiers temporaires abandonnés
+        Args:
+            max_age (int): Âge (en secondes) au-delà duquel un fichier temporaire est supprimé
+        Returns:
+            int: Nombre de fichiers supprimés
+        """
+        removed = 0
+        now = time.time()
+
+        if not os.path.isdir(self.root):
+            return removed
+
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+
+            for entry in os.scandir(directory.path):
+                try:
+                    if directory.name == TMP_DIR:
+                        if now - entry.stat().st_mtime > max_age:
+                            os.remove(entry.path)
+                            removed += 1
+                    elif entry.stat().st_nlink == 1 and self.release(entry.name):
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+
+        return removed
@@ -0,0 +1,233 @@
+"""
+    bundles.py
+
+    Ce module prépare les fichiers statiques (CSS, JS, polices) et compresse les réponses.
+
+    Les fichiers sont traités une seule fois au démarrage : minification des
+    CSS/JS, nom de fichier contenant une empreinte du contenu et variante .gz
+    précompressée. Les fichiers ainsi produits ne changent jamais et sont servis
+    avec une durée de cache d'un an. Les réponses dynamiques (HTML, JSON) sont
+    compressées en gzip lorsque le navigateur l'accepte.
+"""
+
+import os
+import gzip
+import hashlib
+import mimetypes
+
+from flask import current_app, request, send_file, url_for, abort
+from flask.views import MethodView
+from jsmin import jsmin
+from rcssmin import cssmin
+
+from .utils import SERIES_MIMETYPE
+
+# Sous-répertoires des fichiers statiques traités au démarrage
+BUNDLE_DIRS = ('css', 'js', 'fonts')
+
+# Extensions des fichiers traités
+BUNDLE_EXTENSIONS = ('.css', '.js', '.ttf', '.otf', '.woff', '.woff2')
+
+# Répertoire (dans le dossier static) des fichiers produits
+DIST_DIR = 'dist'
+
+# Types de contenu compressés à la volée
+COMPRESSIBLE_TYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'application/json',
+    'application/javascript',
+    'application/x-ndjson',
+    SERIES_MIMETYPE,
+}
+
+# Taille minimale (en octets) d'une réponse compressée
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Correspondance chemin d'origine -> chemin produit (ex. js/client.js -> dist/js/client.1a2b3c4d5e.js)
+_manifest = {}
+
+
+def minify(filename, data):
+    """
+    Minifie le contenu d'un fichier CSS ou JS (les fichiers .min.* sont laissés tels quels)
+    Args:
+        filename (str): Nom du fichier
+        data (bytes): Contenu du fichier
+    Returns:
+        bytes: Contenu minifié
+    """
+    if '.min.' in filename:
+        return data
+
+    if filename.endswith('.css'):
+        return cssmin(data.decode('utf-8')).encode('utf-8')
+    if filename.endswith('.js'):
+        return jsmin(data.decode('utf-8')).encode('utf-8')
+    return data
+
+
+def build_assets(static_folder):
+    """
+    Produit les fichiers statiques minifiés, nommés par empreinte et précompressés
+    Un fichier déjà produit pour le même contenu n'est pas retraité ; les anciennes
+    versions sont supprimées.
+    Args:
+        static_folder (str): Dossier static de l'application
+    Returns:
+        dict: Correspondance chemin d'origine -> chemin produit
+    """
+    manifest = {}
+    dist_root = os.path.join(static_folder, DIST_DIR)
+
+    for directory in BUNDLE_DIRS:
+        source_dir = os.path.join(static_folder, directory)
+
+        if not os.path.isdir(source_dir):
+            continue
+
+        for filename in sorted(os.listdir(source_dir)):
+            source_path = os.path.join(source_dir, filename)
+
+            if not filename.endswith(BUNDLE_EXTENSIONS) or not os.path.isfile(source_path):
+                continue
+
+            with open(source_path, 'rb') as f:
+                data = f.read()
+
+            digest = hashlib.sha1(data).hexdigest()[:10]
+            name, ext = os.path.splitext(filename)
+            target = f"{DIST_DIR}/{directory}/{name}.{digest}{ext}"
+            target_path = os.path.join(static_folder, target)
+
+            if not os.path.exists(target_path):
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                data = minify(filename, data)
+
+                # Variante précompressée écrite en premier : le fichier principal
+                # n'existe qu'une fois les deux variantes complètes
+                with open(f"{target_path}.gz.tmp", 'wb') as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                os.replace(f"{target_path}.gz.tmp", f"{target_path}.gz")
+
+                with open(f"{target_path}.tmp", 'wb') as f:
+                    f.write(data)
+                os.replace(f"{target_path}.tmp", target_path)
+
+            manifest[f"{directory}/{filename}"] = target
+
+    # Suppression des versions qui ne correspondent plus à aucun fichier source
+    current = set(manifest.values())
+    for root, _, filenames in os.walk(dist_root):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            relative = os.path.relpath(path, static_folder).replace(os.sep, '/')
+
+            if relative.removesuffix('.gz') not in current:
+                os.remove(path)
+
+    return manifest
+
+
+def init_assets(app):
+    """
+    Prépare les fichiers statiques et enregistre la fonction asset_url dans Jinja
+    Args:
+        app: Application Flask
+    """
+    _manifest.update(build_assets(app.static_folder))
+    app.jinja_env.globals['asset_url'] = asset_url
+
+
+def asset_url(filename):
+    """
+    Retourne l'URL de la version produite d'un fichier statique
+    Args:
+        filename (str): Chemin dans le dossier static (ex. "js/client.js")
+    Returns:
+        str: URL du fichier nommé par empreinte, ou du fichier d'origine à défaut
+    """
+    target = _manifest.get(filename)
+
+    if target is None:
+        return url_for('static', filename=filename)
+    return url_for('assets', filename=target[len(DIST_DIR) + 1:])
+
+
+def accepts_gzip():
+    """Vérifie si le navigateur accepte les réponses compressées en gzip"""
+    return 'gzip' in request.accept_encodings
+
+
+class AssetView(MethodView):
+    """
+    Sert les fichiers statiques produits au démarrage : variante .gz si le
+    navigateur l'accepte, cache d'un an (le nom change avec le contenu).
+    """
+
+    def get(self, filename):
+        dist_root = os.path.join(current_app.static_folder, DIST_DIR)
+        path = os.path.normpath(os.path.join(dist_root, filename))
+
+        # Sécurisation du chemin pour éviter les attaques de traversée de répertoire
+        if not path.startswith(dist_root + os.sep) or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        compressed = accepts_gzip() and os.path.isfile(f"{path}.gz")
+
+        response = send_file(
+            f"{path}.gz" if compressed else path,
+            mimetype=mimetype,
+            max_age=31536000,
+            conditional=True
+        )
+
+        if compressed:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE
+
+        return response
+
+
+def compress_response(response):
+    """
+    Compresse en gzip les réponses dynamiques (HTML, JSON...) lorsque c'est possible
+    Les réponses en flux, partielles ou déjà compressées ne sont pas modifiées.
+    Args:
+        response: Réponse Flask
+    Returns:
+        Response: Réponse, compressée si possible
+    """
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if not accepts_gzip():
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+
+    # L'ETag désigne désormais une représentation compressée : validateur faible
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
@@ -0,0 +1,210 @@
+"""
+    downloads.py
+
+    Ce module sert les fichiers partagés avec prise en charge des requêtes partielles.
+
+    Les en-têtes Range (une ou plusieurs plages) et If-Range sont traités : un
+    téléchargement interrompu reprend où il s'est arrêté et un client peut
+    récupérer plusieurs segments du même fichier en parallèle. Une plage unique
+    (ou le fichier entier) est transmise au serveur WSGI via wsgi.file_wrapper,
+    qui peut l'envoyer avec os.sendfile sans copie dans l'espace utilisateur ;
+    sinon le fichier est lu par blocs.
+"""
+
+import os
+import uuid
+import mimetypes
+import unicodedata
+from urllib.parse import quote
+
+from flask import current_app, request
+from werkzeug.http import http_date
+from werkzeug.wsgi import wrap_file
+
+# Taille des blocs lus lorsque le serveur n'utilise pas sendfile
+BLOCK_SIZE = 1024 * 1024
+
+# Nombre maximal de plages d'une requête (au-delà, le fichier entier est envoyé)
+MAX_RANGES = 32
+
+
+class RangeFile:
+    """
+    Fichier limité à une plage, transmis à wsgi.file_wrapper
+    fileno() et la position courante permettent au serveur d'utiliser sendfile ;
+    read() ne renvoie jamais d'octets au-delà de la plage.
+    """
+
+    def __init__(self, path, start, length):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def iter_ranges(path, ranges, size, mimetype, boundary):
+    """
+    Génère le corps multipart/byteranges d'une requête à plusieurs plages
+    Args:
+        path (str): Chemin du fichier
+        ranges (list): Plages (début, fin exclue)
+        size (int): Taille du fichier
+        mimetype (str): Type du fichier
+        boundary (str): Séparateur des parties
+    Yields:
+        bytes: Morceaux du corps de la réponse
+    """
+    with open(path, 'rb') as f:
+        for start, stop in ranges:
+            yield part_header(start, stop, size, mimetype, boundary)
+            f.seek(start)
+            remaining = stop - start
+
+            while remaining > 0:
+                data = f.read(min(BLOCK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    yield f"\r\n--{boundary}--\r\n".encode('ascii')
+
+
+def part_header(start, stop, size, mimetype, boundary):
+    """En-tête d'une partie de la réponse multipart/byteranges"""
+    return (
+        f"\r\n--{boundary}\r\n"
+        f"Content-Type: {mimetype}\r\n"
+        f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n"
+    ).encode('ascii')
+
+
+def resolve_ranges(size, etag, last_modified):
+    """
+    Détermine les plages demandées par la requête courante
+    Args:
+        size (int): Taille du fichier
+        etag (str): ETag du fichier (validateur fort)
+        last_modified (int): Date de modification du fichier (secondes)
+    Returns:
+        list: Plages (début, fin exclue) triées et fusionnées, [] si aucune plage
+        n'est satisfaisable, ou None pour envoyer le fichier entier
+    """
+    requested = request.range
+
+    if requested is None or requested.units != 'bytes':
+        return None
+
+    # If-Range : plages ignorées si le fichier a changé depuis le premier téléchargement
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and int(if_range.date.timestamp()) != last_modified:
+        return None
+
+    if len(requested.ranges) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for start, stop in requested.ranges:
+        if start < 0:
+            # Suffixe : les derniers octets du fichier
+            start, stop = max(size + start, 0), size
+        else:
+            stop = size if stop is None else min(stop, size)
+
+        if start < stop:
+            ranges.append((start, stop))
+
+    # Fusion des plages qui se chevauchent ou se touchent
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+
+    return merged
+
+
+def disposition_names(download_name):
+    """Paramètres filename (et filename* si le nom n'est pas ASCII) de Content-Disposition"""
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+^`|~')}"}
+
+    return {'filename': download_name}
+
+
+def send_file_ranges(path, download_name, etag):
+    """
+    Envoie un fichier en entier ou par plages (Range, If-Range, multipart/byteranges)
+    Args:
+        path (str): Chemin du fichier
+        download_name (str): Nom proposé au navigateur
+        etag (str): ETag du fichier
+    Returns:
+        Response: Réponse 200, 206 ou 416
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    ranges = resolve_ranges(size, etag, last_modified)
+
+    if ranges == []:
+        response = current_app.response_class(status=416)
+        response.headers['Content-Range'] = f"bytes */{size}"
+    elif ranges is not None and len(ranges) > 1:
+        boundary = uuid.uuid4().hex
+        content_type = f"multipart/byteranges; boundary={boundary}"
+
+        length = sum(
+            len(part_header(start, stop, size, mimetype, boundary)) + stop - start
+            for start, stop in ranges
+        ) + len(f"\r\n--{boundary}--\r\n")
+
+        response = current_app.response_class(
+            iter_ranges(path, ranges, size, mimetype, boundary),
+            status=206,
+            content_type=content_type
+        )
+        response.content_length = length
+    else:
+        start, stop = ranges[0] if ranges else (0, size)
+
+        file = RangeFile(path, start, stop - start)
+        response = current_app.response_class(
+            wrap_file(request.environ, file, BLOCK_SIZE),
+            status=206 if ranges else 200,
+            mimetype=mimetype,
+            direct_passthrough=True
+        )
+        response.content_length = stop - start
+
+        if ranges:
+            response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers.set('Content-Disposition', 'attachment', **disposition_names(download_name))
+    response.set_etag(etag)
+
+    return response
+
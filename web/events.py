@@ -0,0 +1,260 @@
+"""
+    events.py
+
+    Ce module diffuse les mises à jour des métriques aux pages du tableau de bord
+    (Server-Sent Events).
+
+    Un seul publieur par répertoire de données surveille la version du catalogue
+    des hôtes et transmet les enregistrements modifiés à tous les abonnés. Les pages
+    reçoivent ainsi les mises à jour dès leur stockage, sans interroger le serveur
+    à intervalle régulier. Les modifications sont lues par lots jusqu'à rattraper
+    le catalogue ; un retard trop important est remplacé par un seul événement
+    resync (la page recharge ses données).
+"""
+
+import json
+import queue
+import threading
+import time
+
+from server.catalog import ONLINE_TIMEOUT
+
+from .utils import get_host_catalog, get_catalog_version
+
+# Publieurs ouverts (un par répertoire de données)
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+# Événement interne : réveille le flux d'une page pour lui envoyer resync
+RESYNC = {'resync': True}
+
+# Champs de synthèse transmis pour chaque hôte
+EVENT_FIELDS = (
+    'hostname',
+    'last_seen',
+    'status',
+    'cpu_percent',
+    'memory_percent',
+    'disk_percent',
+)
+
+
+class Subscription:
+    """Abonnement d'une page aux mises à jour"""
+
+    def __init__(self, max_events=256):
+        self.events = queue.Queue(maxsize=max_events)
+        # File pleine (abonné trop lent) : la page doit recharger ses données
+        self.overflow = False
+
+    def put(self, event):
+        """Ajoute un événement, ou signale un débordement si la file est pleine"""
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflow = True
+
+    def resync(self):
+        """Invite la page à recharger ses données (mises à jour non transmises)"""
+        self.overflow = True
+        self.put(RESYNC)
+
+
+class MetricsPublisher:
+    """Publieur des mises à jour du catalogue des hôtes"""
+
+    # Intervalle (en secondes) de vérification de la version du catalogue
+    poll_interval = 0.5
+
+    # Hôtes par événement, et lots lus par vérification avant de renoncer au rattrapage
+    batch_size = 1000
+    max_batches = 10
+
+    def __init__(self, data_dir):
+        """
+        Initialise le publieur
+        Args:
+            data_dir (str): Répertoire de données de l'application
+        """
+        self.data_dir = data_dir
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.version = None
+
+    def subscribe(self):
+        """
+        Enregistre un nouvel abonné (démarre le publieur si nécessaire)
+        Returns:
+            Subscription: Abonnement à passer à unsubscribe
+        """
+        subscription = Subscription()
+
+        with self.lock:
+            self.subscriptions.add(subscription)
+
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Retire un abonné"""
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def run(self):
+        """Boucle du publieur : diffuse les hôtes modifiés à chaque changement de version"""
+        catalog = get_host_catalog(self.data_dir)
+        self.version = catalog.version()
+
+        while True:
+            with self.lock:
+                if not self.subscriptions:
+                    # Plus d'abonnés : arrêt du thread jusqu'au prochain abonnement
+                    self.thread = None
+                    return
+
+            try:
+                # Version lue en mémoire partagée : pas de requête tant que rien ne change
+                version = get_catalog_version(self.data_dir)
+
+                if version != self.version:
+                    self.publish_changes(catalog, version)
+            except Exception as e:
+                print(f"Erreur lors de la diffusion des métriques : {str(e)}")
+
+            time.sleep(self.poll_interval)
+
+    def publish_changes(self, catalog, version):
+        """
+        Diffuse par lots les hôtes modifiés depuis la dernière version publiée
+        Args:
+            catalog (HostCatalog): Catalogue des hôtes
+            version (int): Version courante du catalogue
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+
+        total = catalog.count()
+
+        for _ in range(self.max_batches):
+            hosts = catalog.changed_since(self.version, limit=self.batch_size)
+            event = {
+                'version': hosts[-1]['version'] if hosts else version,
+                'total': total,
+                'hosts': [format_host_event(host) for host in hosts]
+            }
+            self.version = event['version']
+
+            if hosts:
+                for subscription in subscriptions:
+                    subscription.put(event)
+
+            # Catalogue rattrapé
+            if len(hosts) < self.batch_size:
+                return
+
+        # Retard trop important : les pages rechargent leurs données
+        self.version = catalog.version()
+
+        for subscription in subscriptions:
+            subscription.resync()
+
+
+def format_host_event(host):
+    """Retourne les champs de synthèse d'un hôte transmis aux pages"""
+    return {field: host.get(field) for field in EVENT_FIELDS}
+
+
+def get_publisher(data_dir):
+    """
+    Retourne le publieur des mises à jour du répertoire de données
+    Args:
+        data_dir (str): Répertoire de données de l'application
+    Returns:
+        MetricsPublisher: Publieur partagé par tous les abonnés
+    """
+    with _publishers_lock:
+        publisher = _publishers.get(data_dir)
+
+        if publisher is None:
+            publisher = _publishers[data_dir] = MetricsPublisher(data_dir)
+
+    return publisher
+
+
+def format_sse(data, event=None, event_id=None):
+    """
+    Formate un message Server-Sent Events
+    Args:
+        data (dict): Données du message (sérialisées en JSON)
+        event (str, optional): Type d'événement
+        event_id (int, optional): Identifiant (renvoyé par le navigateur à la reconnexion)
+    Returns:
+        str: Message au format text/event-stream
+    """
+    message = ''
+
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    if event:
+        message += f"event: {event}\n"
+
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def stream_events(data_dir, hostname=None, last_event_id=None, keepalive=15):
+    """
+    Générateur du flux d'événements d'une page
+    Args:
+        data_dir (str): Répertoire de données de l'application
+        hostname (str, optional): Ne transmettre que les mises à jour de cet hôte
+        last_event_id (int, optional): Dernière version reçue avant une reconnexion
+        keepalive (int): Délai (en secondes) entre deux commentaires de maintien
+    Yields:
+        str: Messages au format text/event-stream
+    """
+    publisher = get_publisher(data_dir)
+    subscription = publisher.subscribe()
+
+    try:
+        catalog = get_host_catalog(data_dir)
+        version = catalog.version()
+
+        yield "retry: 3000\n"
+        yield format_sse({'version': version, 'online_timeout': ONLINE_TIMEOUT}, 'hello', version)
+
+        # Reconnexion : envoi des mises à jour manquées
+        if last_event_id is not None and last_event_id < version:
+            hosts = [
+                format_host_event(host) for host in catalog.changed_since(last_event_id)
+                if hostname is None or host['hostname'] == hostname
+            ]
+            if hosts:
+                yield format_sse({'total': catalog.count(), 'hosts': hosts}, 'hosts', version)
+
+        while True:
+            if subscription.overflow:
+                subscription.overflow = False
+                yield format_sse({}, 'resync')
+
+            try:
+                event = subscription.events.get(timeout=keepalive)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+
+            if event is RESYNC:
+                continue
+
+            hosts = event['hosts']
+            if hostname is not None:
+                hosts = [host for host in hosts if host['hostname'] == hostname]
+                if not hosts:
+                    continue
+
+            yield format_sse({'total': event['total'], 'hosts': hosts}, 'hosts', event['version'])
+    finally:
+        publisher.unsubscribe(subscription)
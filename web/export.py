@@ -0,0 +1,228 @@
+"""
+    export.py
+
+    Ce module exporte l'historique complet d'un client (NDJSON ou CSV).
+
+    L'export est produit par un générateur : les entrées de l'index temporel sont
+    lues par paquets, chaque échantillon est lu (fichier isolé ou archive), projeté
+    sur les champs demandés puis écrit dans le flux. La mémoire utilisée ne dépend
+    donc pas de la taille de l'historique. Le flux peut être compressé en gzip au fil
+    de l'eau, et un export interrompu reprend après le dernier horodatage reçu.
+"""
+
+import io
+import csv
+import json
+import math
+import os
+import zlib
+
+from server.archive import is_archive, read_zdict
+from server.history import HistoryIndex
+from server.series import flatten_metrics
+
+# Formats d'export : extension et type de contenu
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Nombre d'entrées de l'index lues (et d'échantillons écrits) par paquet
+EXPORT_CHUNK = 256
+
+
+class SampleReader:
+    """Lecture des échantillons de l'historique, en gardant ouverte l'archive courante"""
+
+    def __init__(self, client_dir):
+        self.client_dir = client_dir
+        self.location = None
+        self.file = None
+        self.zdict = None
+
+    def read(self, entry):
+        """
+        Lit les données brutes d'une entrée de l'index
+        Args:
+            entry (HistoryEntry): Entrée de l'index (fichier isolé ou archive)
+        Returns:
+            bytes: Document JSON de l'échantillon
+        """
+        path = os.path.join(self.client_dir, entry.location)
+
+        if not is_archive(entry.location):
+            with open(path, 'rb') as f:
+                return f.read()
+
+        # Les échantillons d'une même journée se suivent : l'archive reste ouverte
+        if entry.location != self.location:
+            self.close()
+            self.file = open(path, 'rb')
+            self.zdict = read_zdict(self.file)
+            self.location = entry.location
+
+        self.file.seek(entry.offset)
+        decompressor = zlib.decompressobj(zdict=self.zdict)
+        return decompressor.decompress(self.file.read(entry.length)) + decompressor.flush()
+
+    def close(self):
+        """Ferme l'archive courante"""
+        if self.file is not None:
+            self.file.close()
+            self.file = self.location = self.zdict = None
+
+
+def iter_samples(client_dir, start=None, end=None, after=None):
+    """
+    Parcourt les échantillons de l'historique d'un client par ordre chronologique
+    Les entrées ajoutées pendant l'export ne sont pas incluses (borne fixée au départ).
+    Args:
+        client_dir (str): Répertoire des métriques du client
+        start (float, optional): Début de l'intervalle (inclus)
+        end (float, optional): Fin de l'intervalle (incluse)
+        after (float, optional): Reprise : échantillons strictement postérieurs
+    Yields:
+        tuple: (timestamp, métriques)
+    """
+    index = HistoryIndex(client_dir)
+    index.ensure()
+
+    lower = start
+    if after is not None:
+        lower = max(lower if lower is not None else -math.inf, math.nextafter(after, math.inf))
+
+    position = index.bisect_left(lower) if lower is not None else 0
+    stop = index.bisect_left(math.nextafter(end, math.inf)) if end is not None else len(index)
+
+    reader = SampleReader(client_dir)
+
+    try:
+        while position < stop:
+            entries = index.read_range(position, min(position + EXPORT_CHUNK, stop))
+            if not entries:
+                break
+
+            for offset, entry in enumerate(entries):
+                try:
+                    data = reader.read(entry)
+                except FileNotFoundError:
+                    # Journée archivée entre la lecture de l'index et celle du fichier :
+                    # l'entrée pointe désormais vers l'archive
+                    entry = index.get(position + offset)
+                    data = reader.read(entry)
+
+                yield entry.timestamp, json.loads(data)
+
+            position += len(entries)
+    finally:
+        reader.close()
+
+
+def project(metrics, fields):
+    """
+    Ne conserve que les champs demandés d'un document de métriques
+    Args:
+        metrics (dict): Document de métriques
+        fields (list): Chemins des champs (ex. "cpu" ou "memory.virtual_memory.percent")
+    Returns:
+        dict: Document réduit aux champs présents
+    """
+    projected = {}
+
+    for field in fields:
+        value = metrics
+        keys = field.split('.')
+
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+
+    return projected
+
+
+def select_columns(flat, fields):
+    """Colonnes CSV : champs aplatis correspondant aux champs demandés (tous par défaut)"""
+    if not fields:
+        return sorted(flat)
+
+    return sorted(
+        path for path in flat
+        if any(path == field or path.startswith(f"{field}.") for field in fields)
+    )
+
+
+def iter_ndjson(samples, fields):
+    """Génère une ligne JSON par échantillon : {"timestamp": ..., "metrics": {...}}"""
+    for timestamp, metrics in samples:
+        if fields:
+            metrics = project(metrics, fields)
+        yield json.dumps({'timestamp': timestamp, 'metrics': metrics}, separators=(',', ':')) + '\n'
+
+
+def iter_csv(samples, fields):
+    """
+    Génère un fichier CSV à plat (une colonne par champ numérique)
+    Les colonnes sont fixées par le premier échantillon : un champ apparu plus
+    tard (nouvelle partition, nouvelle interface) n'est pas exporté.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    columns = None
+
+    for timestamp, metrics in samples:
+        flat = flatten_metrics(metrics)
+
+        if columns is None:
+            columns = select_columns(flat, fields)
+            writer.writerow(['timestamp'] + columns)
+
+        writer.writerow([timestamp] + [flat.get(column, '') for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_history(client_dir, fmt='ndjson', fields=None, start=None, end=None,
+                   after=None, compress=False):
+    """
+    Générateur de l'export de l'historique d'un client
+    Args:
+        client_dir (str): Répertoire des métriques du client
+        fmt (str): Format ('ndjson' ou 'csv')
+        fields (list, optional): Champs exportés (tous par défaut)
+        start (float, optional): Début de l'intervalle (inclus)
+        end (float, optional): Fin de l'intervalle (incluse)
+        after (float, optional): Reprise après ce timestamp (dernier reçu)
+        compress (bool): Si True, le flux est compressé en gzip
+    Yields:
+        bytes: Morceaux du fichier exporté
+    """
+    samples = iter_samples(client_dir, start, end, after)
+    lines = iter_csv(samples, fields) if fmt == 'csv' else iter_ndjson(samples, fields)
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    chunk = []
+
+    for line in lines:
+        chunk.append(line)
+
+        if len(chunk) >= EXPORT_CHUNK:
+            data = ''.join(chunk).encode('utf-8')
+            chunk = []
+
+            if compressor:
+                # Vidage à chaque paquet : le client reçoit les données au fur et à mesure
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield data
+
+    data = ''.join(chunk).encode('utf-8')
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
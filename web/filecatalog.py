@@ -0,0 +1,454 @@
+"""
+    filecatalog.py
+
+    Ce module gère le catalogue des fichiers partagés.
+
+    Le catalogue est une base SQLite (un enregistrement par fichier : nom, taille,
+    date de modification, empreinte SHA-256, type MIME) placée dans le répertoire
+    de données, hors du dossier partagé (jamais listée, téléchargée ni supprimée
+    depuis l'interface). Il est mis à jour à chaque téléversement et suppression, et
+    rapproché en arrière-plan du contenu réel du dossier (os.scandir) pour prendre
+    en compte les fichiers ajoutés, modifiés ou supprimés en dehors de l'application.
+    La liste des fichiers est ainsi paginée, triée et filtrée par des requêtes
+    indexées, sans parcourir le dossier à chaque affichage.
+
+    Le catalogue associe aussi chaque nom à son contenu (empreinte) dans le
+    stockage dédupliqué (voir blobs.py) : un contenu déjà présent est retrouvé par
+    une seule requête sur l'index des empreintes. Les fichiers du partage sont
+    remplacés, jamais modifiés sur place (un contenu peut être lié à plusieurs noms).
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import mimetypes
+
+from server.utils import FileLock
+
+from .blobs import BlobStore
+
+CATALOG_NAME = 'files.db'
+
+# Fichier de verrouillage du rapprochement (un seul processus à la fois)
+RECONCILE_LOCK_NAME = 'files.lock'
+
+# Emplacement des versions précédentes (dans le dossier partagé)
+LEGACY_CATALOG_NAME = '.catalog.db'
+LEGACY_RECONCILE_LOCK_NAME = '.catalog.lock'
+
+# Intervalle (en secondes) entre deux rapprochements avec le contenu du dossier
+RECONCILE_INTERVAL = 60
+
+# Taille des blocs lus pour le calcul des empreintes
+HASH_BLOCK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    name_lower TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    mimetype TEXT
+);
+CREATE INDEX IF NOT EXISTS files_name_lower ON files (name_lower);
+CREATE INDEX IF NOT EXISTS files_size ON files (size);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+FILE_COLUMNS = ('name', 'size', 'mtime', 'sha256', 'mimetype')
+
+# Tris disponibles : nom -> colonne indexée
+SORT_COLUMNS = {
+    'name': 'name_lower',
+    'size': 'size',
+    'date': 'mtime',
+}
+
+
+def is_listed(name):
+    """Vérifie si un fichier du dossier fait partie du partage (fichiers cachés et internes exclus)"""
+    return not name.startswith('.')
+
+
+def file_sha256(path):
+    """Calcule l'empreinte SHA-256 d'un fichier, par blocs"""
+    hasher = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+class FileCatalog:
+    """Catalogue des fichiers partagés (nom, taille, date, empreinte, type)"""
+
+    def __init__(self, upload_folder, data_dir):
+        """
+        Initialise le catalogue
+        Args:
+            upload_folder (str): Dossier de téléchargement
+            data_dir (str): Répertoire de données (catalogue et verrou, hors du partage)
+        """
+        self.upload_folder = upload_folder
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, CATALOG_NAME)
+        self.blobs = BlobStore(upload_folder)
+        self._local = threading.local()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.reconcile_lock = FileLock(os.path.join(data_dir, RECONCILE_LOCK_NAME))
+        self._usage = None
+
+        os.makedirs(data_dir, exist_ok=True)
+        self.migrate()
+
+    def migrate(self):
+        """Déplace hors du partage le catalogue d'une version précédente (s'il existe)"""
+        legacy = os.path.join(self.upload_folder, LEGACY_CATALOG_NAME)
+
+        if os.path.exists(legacy) and not os.path.exists(self.path):
+            # Base et journaux WAL déplacés ensemble (même contenu, sans nouveau calcul d'empreintes)
+            for suffix in ('-wal', '-shm', ''):
+                if os.path.exists(legacy + suffix):
+                    os.replace(legacy + suffix, self.path + suffix)
+
+        # Anciens fichiers restants (catalogue déjà présent à la nouvelle place)
+        for name in (LEGACY_CATALOG_NAME + '-wal', LEGACY_CATALOG_NAME + '-shm',
+                     LEGACY_CATALOG_NAME, LEGACY_RECONCILE_LOCK_NAME):
+            try:
+                os.remove(os.path.join(self.upload_folder, name))
+            except FileNotFoundError:
+                pass
+
+    def connect(self):
+        """Retourne la connexion SQLite du thread courant"""
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            os.makedirs(self.upload_folder, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+
+        return connection
+
+    def start(self):
+        """Démarre le rapprochement périodique en arrière-plan (une seule fois)"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        """Boucle de rapprochement avec le contenu du dossier"""
+        while True:
+            # Plusieurs processus web : le rapprochement en cours n'est pas répété par les autres
+            if self.reconcile_lock.acquire(blocking=False):
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    print(f"Erreur lors du rapprochement du catalogue des fichiers : {str(e)}")
+                finally:
+                    self.reconcile_lock.release()
+
+            time.sleep(RECONCILE_INTERVAL)
+
+    def version(self):
+        """Retourne la version du catalogue (modifiée à chaque changement)"""
+        row = self.connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def remove(self, name):
+        """Retire un fichier du catalogue"""
+        connection = self.connect()
+
+        with connection:
+            cursor = connection.execute("DELETE FROM files WHERE name = ?", (name,))
+            if cursor.rowcount:
+                connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def get_sha256(self, name):
+        """Retourne l'empreinte connue d'un fichier (None si inconnue)"""
+        row = self.connect().execute("SELECT sha256 FROM files WHERE name = ?", (name,)).fetchone()
+        return row['sha256'] if row else None
+
+    def find(self, sha256):
+        """
+        Recherche un fichier du partage ayant l'empreinte donnée (index des empreintes)
+        Args:
+            sha256 (str): Empreinte SHA-256
+        Returns:
+            dict: Nom et taille d'un fichier ayant ce contenu, ou None
+        """
+        row = self.connect().execute(
+            "SELECT name, size FROM files WHERE sha256 = ? LIMIT 1", (sha256,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def store(self, name, source, sha256):
+        """
+        Enregistre un fichier reçu : contenu ajouté au stockage (ou doublon
+        supprimé), puis nom lié au contenu
+        Args:
+            name (str): Nom du fichier dans le partage
+            source (str): Fichier reçu (déplacé ou supprimé)
+            sha256 (str): Empreinte du fichier reçu
+        """
+        with self.blobs.lock:
+            self.blobs.put(source, sha256)
+            self._link(name, sha256)
+
+    def link(self, name, sha256, size=None):
+        """
+        Lie un nom à un contenu déjà présent dans le partage (téléversement instantané)
+        Args:
+            name (str): Nom du fichier dans le partage
+            sha256 (str): Empreinte du contenu
+            size (int, optional): Taille attendue du contenu
+        Returns:
+            dict: Nom et taille du fichier, ou None si le contenu est absent
+        """
+        with self.blobs.lock:
+            existing = self.find(sha256)
+            if existing is None or (size is not None and existing['size'] != size):
+                return None
+
+            try:
+                # Fichier déposé hors de l'application : rattaché au stockage au passage
+                self.blobs.adopt(os.path.join(self.upload_folder, existing['name']), sha256)
+                self._link(name, sha256)
+            except FileNotFoundError:
+                return None
+
+        return {'name': name, 'size': existing['size']}
+
+    def _link(self, name, sha256):
+        """Lie un nom à un contenu et libère l'ancien contenu de ce nom"""
+        previous = self.get_sha256(name)
+
+        self.blobs.link(sha256, name)
+        self._upsert([(name, os.stat(os.path.join(self.upload_folder, name)), sha256)])
+
+        if previous and previous != sha256:
+            self.blobs.release(previous)
+
+    def delete(self, name):
+        """
+        Supprime un fichier du partage et libère son contenu s'il n'est plus lié à aucun nom
+        Args:
+            name (str): Nom du fichier
+        """
+        with self.blobs.lock:
+            sha256 = self.get_sha256(name)
+
+            os.remove(os.path.join(self.upload_folder, name))
+            self.remove(name)
+
+            if sha256:
+                self.blobs.release(sha256)
+
+    def usage(self):
+        """
+        Retourne l'occupation du partage
+        Returns:
+            dict: Taille totale des fichiers et taille des contenus distincts (octets)
+        """
+        # Agrégat sur tout le catalogue : recalculé seulement si le catalogue a changé
+        version = self.version()
+        if self._usage is not None and self._usage[0] == version:
+            return self._usage[1]
+
+        row = self.connect().execute(
+            """
+            SELECT
+                (SELECT COALESCE(SUM(size), 0) FROM files),
+                (SELECT COALESCE(SUM(size), 0) FROM (
+                    SELECT MAX(size) AS size FROM files WHERE sha256 IS NOT NULL GROUP BY sha256
+                )) + (SELECT COALESCE(SUM(size), 0) FROM files WHERE sha256 IS NULL)
+            """
+        ).fetchone()
+
+        self._usage = (version, {'total': row[0], 'stored': row[1]})
+        return self._usage[1]
+
+    def _upsert(self, entries):
+        """Enregistre une liste de (nom, os.stat_result, empreinte)"""
+        if not entries:
+            return
+
+        connection = self.connect()
+
+        with connection:
+            connection.executemany(
+                """
+                INSERT OR REPLACE INTO files (name, name_lower, size, mtime, mtime_ns, sha256, mimetype)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        name,
+                        name.lower(),
+                        stat.st_size,
+                        stat.st_mtime,
+                        stat.st_mtime_ns,
+                        sha256,
+                        mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                    )
+                    for name, stat, sha256 in entries
+                ]
+            )
+            connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def reconcile(self, hash_missing=True):
+        """
+        Rapproche le catalogue du contenu réel du dossier : fichiers ajoutés,
+        modifiés (taille ou date différente) ou supprimés hors de l'application,
+        puis calcule les empreintes manquantes
+        Args:
+            hash_missing (bool): Si False, les empreintes ne sont pas calculées
+        Returns:
+            tuple: Nombre de fichiers (ajoutés ou modifiés, supprimés, empreintes calculées)
+        """
+        connection = self.connect()
+        known = {}
+        digests = {}
+        for row in connection.execute("SELECT name, size, mtime_ns, sha256 FROM files"):
+            known[row['name']] = (row['size'], row['mtime_ns'])
+            digests[row['name']] = row['sha256']
+
+        changed = []
+        present = set()
+
+        with os.scandir(self.upload_folder) as entries:
+            for entry in entries:
+                if not is_listed(entry.name) or not entry.is_file():
+                    continue
+
+                stat = entry.stat()
+                present.add(entry.name)
+
+                if known.get(entry.name) != (stat.st_size, stat.st_mtime_ns):
+                    changed.append((entry.name, stat, None))
+
+        removed = [name for name in known if name not in present]
+
+        self._upsert(changed)
+
+        if removed:
+            with connection:
+                connection.executemany("DELETE FROM files WHERE name = ?", [(name,) for name in removed])
+                connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+            # Contenus des fichiers supprimés hors de l'application
+            for name in removed:
+                if digests[name]:
+                    self.blobs.release(digests[name])
+
+        # Empreintes manquantes (fichiers déposés hors de l'application)
+        hashed = 0
+        missing = [] if not hash_missing else connection.execute(
+            "SELECT name, mtime_ns FROM files WHERE sha256 IS NULL"
+        ).fetchall()
+
+        for row in missing:
+            path = os.path.join(self.upload_folder, row['name'])
+
+            try:
+                digest = file_sha256(path)
+
+                with self.blobs.lock:
+                    # Fichier modifié pendant le calcul : empreinte recalculée au prochain passage
+                    if os.stat(path).st_mtime_ns != row['mtime_ns']:
+                        continue
+
+                    # Fichier rattaché au stockage : une copie d'un contenu existant est libérée
+                    self.blobs.adopt(path, digest)
+                    self._upsert([(row['name'], os.stat(path), digest)])
+            except OSError:
+                continue
+
+            hashed += 1
+
+        if hash_missing:
+            self.blobs.sweep()
+
+        return len(changed), len(removed), hashed
+
+    def list_files(self, page=1, per_page=50, sort='name', descending=False, search=None):
+        """
+        Retourne une page de fichiers
+        Args:
+            page (int): Numéro de page (à partir de 1)
+            per_page (int): Nombre de fichiers par page
+            sort (str): Tri (clé de SORT_COLUMNS)
+            descending (bool): Si True, ordre décroissant
+            search (str, optional): Texte recherché dans le nom (sans distinction de casse)
+        Returns:
+            tuple: (fichiers de la page, nombre total de fichiers correspondants)
+        """
+        column = SORT_COLUMNS.get(sort, 'name_lower')
+        order = 'DESC' if descending else 'ASC'
+
+        where = ''
+        params = []
+        if search:
+            escaped = search.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where = "WHERE name_lower LIKE ? ESCAPE '\\'"
+            params.append(f"%{escaped}%")
+
+        connection = self.connect()
+        total = connection.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+
+        rows = connection.execute(
+            f"SELECT {', '.join(FILE_COLUMNS)} FROM files {where} "
+            f"ORDER BY {column} {order}, name {order} LIMIT ? OFFSET ?",
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+
+        return [dict(row) for row in rows], total
+
+
+# Catalogues ouverts (un par dossier de téléchargement)
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_file_catalog(upload_folder, data_dir):
+    """
+    Retourne le catalogue des fichiers d'un dossier (rapprochement démarré à la première utilisation)
+    Args:
+        upload_folder (str): Dossier de téléchargement
+        data_dir (str): Répertoire de données (emplacement du catalogue)
+    Returns:
+        FileCatalog: Catalogue partagé par toutes les requêtes
+    """
+    with _catalogs_lock:
+        catalog = _catalogs.get(upload_folder)
+
+        if catalog is None:
+            catalog = _catalogs[upload_folder] = FileCatalog(upload_folder, data_dir)
+
+            # Catalogue neuf : liste construite avant le premier affichage
+            if catalog.version() == 0:
+                catalog.reconcile(hash_missing=False)
+            catalog.start()
+
+    return catalog
@@ -0,0 +1,201 @@
+"""
+    fleet.py
+
+    Ce module calcule les statistiques agrégées de la flotte (CPU, mémoire, disque).
+
+    Les dernières valeurs de tous les hôtes sont lues dans la table en mémoire
+    partagée publiée par le serveur de réception (à défaut, en une seule requête
+    dans le catalogue), rangées dans des tableaux compacts (un par métrique), puis
+    résumées (minimum, maximum, moyenne, percentiles, histogramme). NumPy est
+    utilisé lorsqu'il est disponible ; à défaut, un calcul en Python pur donne les
+    mêmes résultats. Le résumé est recalculé au plus une fois par SUMMARY_INTERVAL
+    (la version du catalogue change à chaque échantillon reçu), et seulement si
+    le catalogue a changé.
+"""
+
+import math
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel
+    np = None
+
+from server.latest import TableUnavailable
+
+from .utils import get_host_catalog, get_latest_table
+
+# Métriques résumées (colonnes du catalogue)
+SUMMARY_METRICS = ('cpu_percent', 'memory_percent', 'disk_percent')
+
+# Percentiles calculés
+PERCENTILES = (50, 90, 99)
+
+# Les pourcentages sont répartis sur [0, 100]
+HISTOGRAM_RANGE = (0.0, 100.0)
+
+# Délai minimal (en secondes) entre deux calculs du résumé
+SUMMARY_INTERVAL = 2.0
+
+# Résumés calculés : (répertoire, paramètres) -> (date du calcul, version, résumé)
+_summaries = {}
+_summaries_lock = threading.Lock()
+
+
+def pack_columns(rows):
+    """
+    Range les lignes du catalogue dans des tableaux compacts, groupés par plateforme
+    Args:
+        rows (list): Lignes (plateforme, cpu, mémoire, disque)
+    Returns:
+        dict: {plateforme: {métrique: tableau de valeurs}} (valeurs absentes ignorées)
+    """
+    groups = {}
+
+    for row in rows:
+        platform = row[0] or 'Inconnue'
+        columns = groups.get(platform)
+
+        if columns is None:
+            columns = groups[platform] = {metric: array('d') for metric in SUMMARY_METRICS}
+
+        for metric, value in zip(SUMMARY_METRICS, row[1:]):
+            if value is not None:
+                columns[metric].append(value)
+
+    return groups
+
+
+def merge_columns(groups):
+    """Concatène les tableaux de toutes les plateformes"""
+    merged = {metric: array('d') for metric in SUMMARY_METRICS}
+
+    for columns in groups.values():
+        for metric in SUMMARY_METRICS:
+            merged[metric].extend(columns[metric])
+
+    return merged
+
+
+def percentile(sorted_values, q):
+    """Percentile par interpolation linéaire (même méthode que numpy.percentile)"""
+    position = (len(sorted_values) - 1) * q / 100
+    low = math.floor(position)
+    high = math.ceil(position)
+
+    if low == high:
+        return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def describe(values, bins):
+    """
+    Résume un tableau de valeurs
+    Args:
+        values (array): Valeurs d'une métrique
+        bins (int): Nombre d'intervalles de l'histogramme
+    Returns:
+        dict: count, min, max, mean, p50, p90, p99 et histogramme
+    """
+    if not len(values):
+        return {'count': 0, 'min': None, 'max': None, 'mean': None,
+                **{f"p{q}": None for q in PERCENTILES},
+                'histogram': [0] * bins}
+
+    low, high = HISTOGRAM_RANGE
+
+    if np is not None:
+        data = np.frombuffer(values, dtype=np.float64)
+        quantiles = np.percentile(data, PERCENTILES)
+        counts, _ = np.histogram(np.clip(data, low, high), bins=bins, range=HISTOGRAM_RANGE)
+
+        return {
+            'count': int(data.size),
+            'min': float(data.min()),
+            'max': float(data.max()),
+            'mean': float(data.mean()),
+            **{f"p{q}": float(value) for q, value in zip(PERCENTILES, quantiles)},
+            'histogram': counts.tolist()
+        }
+
+    sorted_values = sorted(values)
+    counts = [0] * bins
+    width = (high - low) / bins
+
+    for value in sorted_values:
+        # Valeurs hors de [0, 100] comptées dans le premier ou le dernier intervalle
+        index = int((min(max(value, low), high) - low) / width)
+        counts[min(index, bins - 1)] += 1
+
+    return {
+        'count': len(sorted_values),
+        'min': sorted_values[0],
+        'max': sorted_values[-1],
+        'mean': math.fsum(sorted_values) / len(sorted_values),
+        **{f"p{q}": percentile(sorted_values, q) for q in PERCENTILES},
+        'histogram': counts
+    }
+
+
+def summarize_columns(columns, bins):
+    """Résume chaque métrique d'un groupe de tableaux"""
+    return {metric: describe(columns[metric], bins) for metric in SUMMARY_METRICS}
+
+
+def fleet_summary(data_dir, bins=10, group_by=None):
+    """
+    Retourne le résumé statistique de la flotte, recalculé au plus une fois par
+    SUMMARY_INTERVAL et seulement si le catalogue a changé
+    Args:
+        data_dir (str): Répertoire de données de l'application
+        bins (int): Nombre d'intervalles des histogrammes
+        group_by (str, optional): 'platform' pour un résumé par plateforme
+    Returns:
+        tuple: (version du catalogue résumée, résumé de la flotte)
+    """
+    # Table en mémoire partagée si le serveur de réception la publie, sinon catalogue
+    source = get_latest_table(data_dir)
+    if source is not None:
+        version = source.generation()
+    else:
+        source = get_host_catalog(data_dir)
+        version = source.version()
+    key = (data_dir, bins, group_by)
+    now = time.monotonic()
+
+    with _summaries_lock:
+        cached = _summaries.get(key)
+        if cached and (cached[1] == version or now - cached[0] < SUMMARY_INTERVAL):
+            return cached[1], cached[2]
+
+    try:
+        rows = source.summary_rows()
+    except TableUnavailable:
+        # Table illisible (écrivain interrompu pendant une écriture) : lecture du catalogue
+        source = get_host_catalog(data_dir)
+        rows = source.summary_rows()
+
+    groups = pack_columns(rows)
+
+    low, high = HISTOGRAM_RANGE
+    width = (high - low) / bins
+
+    summary = {
+        'hosts': source.count(),
+        'bins': [low + index * width for index in range(bins + 1)],
+        'metrics': summarize_columns(merge_columns(groups), bins),
+        'backend': 'numpy' if np is not None else 'python'
+    }
+
+    if group_by == 'platform':
+        summary['groups'] = {
+            platform: summarize_columns(columns, bins)
+            for platform, columns in sorted(groups.items())
+        }
+
+    with _summaries_lock:
+        _summaries[key] = (now, version, summary)
+
+    return version, summary
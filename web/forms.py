@@ -12,38 +12,42 @@ from wtforms.fields import (
 from flask_wtf.file import FileRequired, FileAllowed
 
 
+# Extensions des fichiers acceptés par le partage de fichiers
+ALLOWED_EXTENSIONS = [
+    "pdf",
+    "doc",
+    "docx",
+    "xls",
+    "xlsx",
+    "py",
+    "csv",
+    "txt",
+    "json",
+    "xml",
+    "zip",
+    "tar",
+    "gz",
+    "jpg",
+    "jpeg",
+    "png",
+    "svg",
+    "mp3",
+    "wav",
+    "mp4",
+    "avi",
+    "mov",
+    "mkv",
+    "iso"
+]
+
+
 class UploadForm(FlaskForm):
     file = FileField(
         label="Fichier",
         validators=[
             FileRequired(message="Aucun fichier sélectionné."),
             FileAllowed(
-                upload_set=[
-                    "pdf",
-                    "doc",
-                    "docx",
-                    "xls",
-                    "xlsx",
-                    "py",
-                    "csv",
-                    "txt",
-                    "json",
-                    "xml",
-                    "zip",
-                    "tar",
-                    "gz",
-                    "jpg",
-                    "jpeg",
-                    "png",
-                    "svg",
-                    "mp3",
-                    "wav",
-                    "mp4",
-                    "avi",
-                    "mov",
-                    "mkv",
-                    "iso"
-                ],
+                upload_set=ALLOWED_EXTENSIONS,
                 message="Format de fichier non autorisé."
             )
         ]
@@ -5,10 +5,10 @@
 """
 
 from pathlib import Path
+import os
 import uuid
 
 from flask import Flask
-from flask_minify import Minify
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -18,7 +18,9 @@ DATA_DIR = str(BASE_DIR / "data")
 UPLOAD_FOLDER = str(BASE_DIR / "data/files")
 
 # La clé de sécurité de l'application
-SECRET_KEY = str(uuid.uuid4())
+# Fixée par l'environnement lorsque plusieurs processus servent l'application
+# (jetons CSRF et sessions valables quel que soit le processus qui répond)
+SECRET_KEY = os.environ.get("NETMONITOR_SECRET_KEY") or str(uuid.uuid4())
 
 # Initialisation de l'application Flask
 app = Flask(
@@ -45,9 +47,16 @@ app.jinja_env.cache = {}
 app.jinja_env.trim_blocks = True
 app.jinja_env.lstrip_blocks = True
 
-# Configuration de Flask-Minify pour la minification 
-# des fichiers CSS, JS et HTML
-Minify(app=app, html=True, js=True, cssless=True)
+# Fichiers CSS, JS et polices minifiés, nommés par empreinte et précompressés
+# une seule fois au démarrage ; compression gzip des réponses dynamiques
+from .bundles import (
+    init_assets,
+    compress_response,
+    AssetView,
+)
+
+init_assets(app)
+app.after_request(compress_response)
 
 # Filtres personnalisés pour Jinja2
 from .filters import (
@@ -68,14 +77,31 @@ app.register_error_handler(500, internal_server_error)
 from .views import (
     IndexView,
     DashBoardView,
+    StreamView,
     ClientMetricsView,
+    SeriesView,
+    ExportView,
+    FleetSummaryView,
+    TopView,
+    ForecastView,
+    AlertsView,
+    AlertsApiView,
     FilesView,
+    UploadsView,
+    UploadView,
+    UploadCompleteView,
     DownloadView,
     DeleteFileView,
+    HealthView,
     AboutView,
     LegalNoticeView,
 )
 
+# Route des fichiers statiques produits au démarrage
+app.add_url_rule(
+    "/assets/<path:filename>",
+    view_func=AssetView.as_view("assets")
+)
 # Routes pour la page d'accueil
 app.add_url_rule(
     "/", 
@@ -95,11 +121,64 @@ app.add_url_rule(
     '/data/metrics/<hostname>/<file>/', 
     view_func=ClientMetricsView.as_view('client_metrics_file')
 )
+# Flux des mises à jour (Server-Sent Events), hors de /dashboard/ : un hôte nommé
+# "stream" reste accessible par /dashboard/<hostname>/
+app.add_url_rule(
+    "/api/stream/",
+    view_func=StreamView.as_view("api_stream")
+)
+# Route de l'API des séries temporelles
+app.add_url_rule(
+    "/api/series/",
+    view_func=SeriesView.as_view("api_series")
+)
+# Route de l'export de l'historique d'un client
+app.add_url_rule(
+    "/api/export/",
+    view_func=ExportView.as_view("api_export")
+)
+# Route de l'API des statistiques de la flotte
+app.add_url_rule(
+    "/api/fleet/summary/",
+    view_func=FleetSummaryView.as_view("api_fleet_summary")
+)
+# Route de l'API des classements (hôtes les plus chargés)
+app.add_url_rule(
+    "/api/top/",
+    view_func=TopView.as_view("api_top")
+)
+# Route de l'API des prévisions de remplissage des partitions
+app.add_url_rule(
+    "/api/forecast/",
+    view_func=ForecastView.as_view("api_forecast")
+)
+# Routes des alertes (page et API)
+app.add_url_rule(
+    "/alerts/",
+    view_func=AlertsView.as_view("alerts")
+)
+app.add_url_rule(
+    "/api/alerts/",
+    view_func=AlertsApiView.as_view("api_alerts")
+)
 # Routes pour la gestion des fichiers
 app.add_url_rule(
     "/files/", 
     view_func=FilesView.as_view("files")
 )
+# API de téléversement par morceaux (ouverture, envoi des morceaux, finalisation)
+app.add_url_rule(
+    "/files/uploads/",
+    view_func=UploadsView.as_view("uploads")
+)
+app.add_url_rule(
+    "/files/uploads/<upload_id>/",
+    view_func=UploadView.as_view("upload")
+)
+app.add_url_rule(
+    "/files/uploads/<upload_id>/complete/",
+    view_func=UploadCompleteView.as_view("upload_complete")
+)
 app.add_url_rule(
     "/files/download/<path:filename>/", 
     view_func=DownloadView.as_view("download")
@@ -108,6 +187,11 @@ app.add_url_rule(
     "/files/delete/<path:filename>/", 
     view_func=DeleteFileView.as_view("delete")
 )
+# Point de santé (supervision)
+app.add_url_rule(
+    "/health/",
+    view_func=HealthView.as_view("health")
+)
 # Routes pour les pages d'informations
 app.add_url_rule(
     "/about/", 
@@ -0,0 +1,306 @@
+"""
+    uploads.py
+
+    Ce module gère les téléversements de fichiers par morceaux (reprise possible).
+
+    Un téléversement est ouvert (nom et taille du fichier), puis le contenu est
+    envoyé par morceaux, chacun à sa position dans le fichier, avant d'être finalisé.
+    Chaque morceau est écrit directement dans un fichier partiel situé dans le
+    dossier de téléchargement (sous-répertoire .uploads) : la finalisation se
+    limite à un renommage vers le stockage dédupliqué, sans copie. L'empreinte
+    SHA-256 est calculée au fil des morceaux. Un téléversement interrompu reprend
+    à la position enregistrée.
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+from server.utils import atomic_write
+
+# Sous-répertoire (dans le dossier de téléchargement) des téléversements en cours
+UPLOADS_DIR = '.uploads'
+
+# Taille des lectures du corps de la requête et du recalcul de l'empreinte
+IO_BLOCK_SIZE = 1024 * 1024
+
+# Taille conseillée et taille maximale d'un morceau
+CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Délai (en secondes) au-delà duquel un téléversement abandonné est supprimé
+UPLOAD_EXPIRY = 24 * 3600
+
+
+class UploadError(Exception):
+    """Erreur de téléversement (message destiné à l'utilisateur et code HTTP)"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class Upload:
+    """Téléversement en cours : état enregistré sur disque et empreinte incrémentale"""
+
+    def __init__(self, uploads_dir, upload_id, state):
+        self.uploads_dir = uploads_dir
+        self.id = upload_id
+        self.state = state
+        self.lock = threading.Lock()
+        self.hasher = None
+
+    @property
+    def part_path(self):
+        return os.path.join(self.uploads_dir, f"{self.id}.part")
+
+    @property
+    def state_path(self):
+        return os.path.join(self.uploads_dir, f"{self.id}.json")
+
+    @property
+    def offset(self):
+        return self.state['offset']
+
+    def save(self):
+        """Enregistre l'état du téléversement"""
+        self.state['updated'] = time.time()
+        atomic_write(self.state_path, json.dumps(self.state))
+
+    def refresh(self):
+        """
+        Relit l'état enregistré : un autre processus web a pu recevoir des morceaux
+        (l'empreinte est alors recalculée à partir du fichier partiel)
+        """
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if state['offset'] != self.state['offset']:
+            self.state = state
+            self.hasher = None
+
+    def to_dict(self):
+        """Retourne l'état transmis au navigateur"""
+        return {
+            'id': self.id,
+            'filename': self.state['filename'],
+            'size': self.state['size'],
+            'offset': self.state['offset'],
+            'chunk_size': CHUNK_SIZE,
+        }
+
+    def get_hasher(self):
+        """
+        Retourne l'empreinte des données déjà reçues
+        Après un redémarrage, elle est recalculée une fois à partir du fichier partiel.
+        """
+        if self.hasher is None:
+            hasher = hashlib.sha256()
+            remaining = self.offset
+
+            with open(self.part_path, 'rb') as f:
+                while remaining > 0:
+                    block = f.read(min(IO_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+
+            self.hasher = hasher
+
+        return self.hasher
+
+    def write_chunk(self, offset, stream, length):
+        """
+        Écrit un morceau à sa position dans le fichier partiel
+        Args:
+            offset (int): Position du morceau (doit être la position courante)
+            stream: Flux du corps de la requête
+            length (int): Taille du morceau
+        Returns:
+            int: Nouvelle position
+        """
+        with self.lock:
+            self.refresh()
+
+            if offset != self.offset:
+                raise UploadError("Position du morceau incorrecte.", 409, self.offset)
+
+            if offset + length > self.state['size']:
+                raise UploadError("Le morceau dépasse la taille annoncée du fichier.", 400, self.offset)
+
+            hasher = self.get_hasher().copy()
+            written = 0
+
+            with open(self.part_path, 'r+b') as f:
+                f.seek(offset)
+
+                while written < length:
+                    block = stream.read(min(IO_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    hasher.update(block)
+                    written += len(block)
+
+            # Connexion interrompue : le morceau incomplet sera renvoyé
+            if written != length:
+                raise UploadError("Morceau incomplet.", 400, self.offset)
+
+            self.hasher = hasher
+            self.state['offset'] = offset + written
+            self.save()
+
+            return self.offset
+
+    def complete(self, catalog, sha256=None):
+        """
+        Finalise le téléversement : vérifie la taille et l'empreinte, puis
+        enregistre le fichier partiel dans le stockage du partage (doublon supprimé)
+        Args:
+            catalog (FileCatalog): Catalogue des fichiers du partage
+            sha256 (str, optional): Empreinte attendue
+        Returns:
+            dict: Nom, taille et empreinte du fichier
+        """
+        with self.lock:
+            self.refresh()
+
+            if self.offset != self.state['size']:
+                raise UploadError("Le fichier n'a pas été entièrement reçu.", 409, self.offset)
+
+            digest = self.get_hasher().hexdigest()
+
+            if sha256 and sha256.lower() != digest:
+                raise UploadError("L'empreinte du fichier reçu ne correspond pas.", 422, self.offset)
+
+            catalog.store(self.state['filename'], self.part_path, digest)
+            os.remove(self.state_path)
+
+            return {'filename': self.state['filename'], 'size': self.state['size'], 'sha256': digest}
+
+    def abort(self):
+        """Supprime le fichier partiel et l'état du téléversement"""
+        with self.lock:
+            for path in (self.part_path, self.state_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class UploadManager:
+    """Téléversements en cours d'un dossier de téléchargement"""
+
+    def __init__(self, upload_folder):
+        self.upload_folder = upload_folder
+        self.uploads_dir = os.path.join(upload_folder, UPLOADS_DIR)
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    def create(self, filename, size):
+        """
+        Ouvre un téléversement
+        Args:
+            filename (str): Nom du fichier (déjà validé)
+            size (int): Taille du fichier en octets
+        Returns:
+            Upload: Téléversement créé
+        """
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        self.cleanup()
+
+        upload = Upload(self.uploads_dir, uuid.uuid4().hex, {
+            'filename': filename,
+            'size': size,
+            'offset': 0,
+            'created': time.time(),
+        })
+
+        # Le fichier partiel est créé vide : les morceaux y sont écrits à leur position
+        open(upload.part_path, 'wb').close()
+        upload.save()
+
+        with self.lock:
+            self.uploads[upload.id] = upload
+
+        return upload
+
+    def get(self, upload_id):
+        """
+        Retourne un téléversement en cours (rechargé depuis le disque si besoin)
+        Args:
+            upload_id (str): Identifiant du téléversement
+        Returns:
+            Upload: Téléversement, ou None s'il est inconnu
+        """
+        # L'identifiant désigne des fichiers : seuls les identifiants générés sont acceptés
+        if len(upload_id) != 32 or not all(c in '0123456789abcdef' for c in upload_id):
+            return None
+
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+
+            if upload is None:
+                try:
+                    with open(os.path.join(self.uploads_dir, f"{upload_id}.json")) as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    return None
+
+                upload = self.uploads[upload_id] = Upload(self.uploads_dir, upload_id, state)
+
+        return upload
+
+    def discard(self, upload):
+        """Oublie un téléversement terminé ou annulé"""
+        with self.lock:
+            self.uploads.pop(upload.id, None)
+
+    def cleanup(self):
+        """Supprime les téléversements abandonnés depuis plus de UPLOAD_EXPIRY"""
+        now = time.time()
+
+        # L'état est réécrit à chaque morceau : sa date indique la dernière activité
+        for filename in os.listdir(self.uploads_dir):
+            upload_id = os.path.splitext(filename)[0]
+            path = os.path.join(self.uploads_dir, filename)
+
+            try:
+                if now - os.path.getmtime(path) <= UPLOAD_EXPIRY:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+
+            with self.lock:
+                self.uploads.pop(upload_id, None)
+
+
+# Gestionnaires ouverts (un par dossier de téléchargement)
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_upload_manager(upload_folder):
+    """
+    Retourne le gestionnaire des téléversements d'un dossier
+    Args:
+        upload_folder (str): Dossier de téléchargement
+    Returns:
+        UploadManager: Gestionnaire partagé par toutes les requêtes
+    """
+    with _managers_lock:
+        manager = _managers.get(upload_folder)
+
+        if manager is None:
+            manager = _managers[upload_folder] = UploadManager(upload_folder)
+
+    return manager
@@ -4,7 +4,554 @@ utils.py
 Ce module contient des fonctions utilitaires pour l'application Flask.
 """
 
+import os
+import sys
+import json
 import math
+import base64
+import struct
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime
+
+from flask import request, current_app
+
+from server.history import history_filename
+from server.catalog import HostCatalog, ONLINE_TIMEOUT, SUMMARY_FIELDS
+from server.latest import LatestTable, CHECK_INTERVAL
+from server.alerts import AlertStore
+from server.forecast import ForecastStore
+from server.series import SeriesStore
+from server.utils import host_dir
+
+# Catalogues des hôtes ouverts (un par répertoire de métriques)
+_host_catalogs = {}
+
+# Bases des alertes (une par répertoire de métriques)
+_alert_stores = {}
+
+# Bases des prévisions de remplissage (une par répertoire de métriques)
+_forecast_stores = {}
+
+# Instantanés de la flotte (un par répertoire de métriques)
+_fleet_snapshots = {}
+
+# Tables des dernières métriques en mémoire partagée : (table, prochain essai)
+_latest_tables = {}
+_latest_tables_lock = threading.Lock()
+
+# Couleurs des barres du graphique CPU (répétées pour les machines à nombreux cœurs)
+CPU_BACKGROUND_COLORS = [
+    'rgba(54, 162, 235, 0.5)',
+    'rgba(75, 192, 192, 0.5)',
+    'rgba(255, 159, 64, 0.5)',
+    'rgba(153, 102, 255, 0.5)',
+    'rgba(255, 99, 132, 0.5)',
+    'rgba(255, 205, 86, 0.5)',
+] * 10
+CPU_BORDER_COLORS = [
+    'rgb(54, 162, 235)',
+    'rgb(75, 192, 192)',
+    'rgb(255, 159, 64)',
+    'rgb(153, 102, 255)',
+    'rgb(255, 99, 132)',
+    'rgb(255, 205, 86)',
+] * 10
+
+# Nombre maximal de champs d'une projection (paramètre fields)
+MAX_FIELDS = 64
+
+# Tableaux typés des séries compactes : (champ, code du module array, type annoncé au
+# navigateur). Les horodatages sont des décalages en secondes depuis le début de l'intervalle.
+SERIES_ARRAYS = (
+    ('timestamps', 'I', 'uint32'),
+    ('values', 'f', 'float32'),
+)
+
+# Type MIME des séries binaires (en-tête JSON suivi des tableaux little-endian)
+SERIES_MIMETYPE = 'application/vnd.netmonitor.series'
+
+# Politiques de cache HTTP : revalidation systématique, ou contenu immuable
+REVALIDATE = 'no-cache'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def get_host_catalog(data_dir):
+    """
+    Retourne le catalogue des hôtes du répertoire de données
+    Args:
+        data_dir (str): Répertoire de données de l'application
+    Returns:
+        HostCatalog: Catalogue des hôtes
+    """
+    metrics_dir = os.path.join(data_dir, 'metrics')
+    catalog = _host_catalogs.get(metrics_dir)
+
+    if catalog is None:
+        catalog = _host_catalogs[metrics_dir] = HostCatalog(metrics_dir)
+
+    return catalog
+
+
+def get_alert_store(data_dir):
+    """
+    Retourne la base des alertes du répertoire de données
+    Args:
+        data_dir (str): Répertoire de données de l'application
+    Returns:
+        AlertStore: Base des alertes
+    """
+    metrics_dir = os.path.join(data_dir, 'metrics')
+    store = _alert_stores.get(metrics_dir)
+
+    if store is None:
+        store = _alert_stores[metrics_dir] = AlertStore(metrics_dir)
+
+    return store
+
+
+def get_forecast_store(data_dir):
+    """
+    Retourne la base des prévisions de remplissage du répertoire de données
+    Args:
+        data_dir (str): Répertoire de données de l'application
+    Returns:
+        ForecastStore: Base des prévisions
+    """
+    metrics_dir = os.path.join(data_dir, 'metrics')
+    store = _forecast_stores.get(metrics_dir)
+
+    if store is None:
+        store = _forecast_stores[metrics_dir] = ForecastStore(metrics_dir)
+
+    return store
+
+
+def get_latest_table(data_dir):
+    """
+    Retourne la table des dernières métriques publiée en mémoire partagée par
+    le serveur de réception (rattachée si le serveur a redémarré)
+    Args:
+        data_dir (str): Répertoire de données de l'application
+    Returns:
+        LatestTable: Table, ou None si elle n'est pas disponible (lecture du catalogue)
+    """
+    metrics_dir = os.path.join(data_dir, 'metrics')
+
+    with _latest_tables_lock:
+        table, retry_at = _latest_tables.get(metrics_dir, (None, 0))
+
+        if table is not None and table.is_valid():
+            return table
+
+        # Table fermée ou absente : nouvel essai au plus une fois par CHECK_INTERVAL
+        # (l'ancienne table n'est pas fermée : un autre thread peut encore la lire)
+        now = time.monotonic()
+        if table is None and now < retry_at:
+            return None
+
+        table = LatestTable.attach(metrics_dir)
+        _latest_tables[metrics_dir] = (table, now + CHECK_INTERVAL)
+
+        return table
+
+
+def get_catalog_version(data_dir):
+    """
+    Retourne la version du catalogue des hôtes, lue en mémoire partagée si
+    possible (sans requête SQLite)
+    Args:
+        data_dir (str): Répertoire de données de l'application
+    Returns:
+        int: Version du catalogue
+    """
+    table = get_latest_table(data_dir)
+    if table is not None:
+        return table.generation()
+    return get_host_catalog(data_dir).version()
+
+
+def make_etag(*parts):
+    """
+    Construit un ETag fort à partir des éléments identifiant une version d'une ressource
+    Args:
+        *parts: Éléments de version (chemin, date de modification, taille, version...)
+    Returns:
+        str: ETag (sans guillemets)
+    """
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def file_version(path):
+    """Retourne les éléments de version d'un fichier (date de modification, taille)"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def set_validators(response, etag, cache_control=REVALIDATE):
+    """
+    Ajoute l'ETag et la politique de cache à une réponse
+    Args:
+        response: Réponse Flask
+        etag (str): ETag de la ressource
+        cache_control (str): Valeur de l'en-tête Cache-Control
+    Returns:
+        Response: Réponse modifiée
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+@lru_cache(maxsize=256)
+def compile_fields(value):
+    """
+    Compile le paramètre fields (chemins séparés par des virgules, ex.
+    "hostname,metrics.cpu.cpu_percent_avg") en arbre de projection
+    Args:
+        value (str): Valeur du paramètre
+    Returns:
+        dict: Arbre {clé: sous-arbre}, None désignant la valeur entière
+    Raises:
+        ValueError: Si un chemin est vide ou si les chemins sont trop nombreux
+    """
+    paths = [path.strip() for path in value.split(',')]
+
+    if len(paths) > MAX_FIELDS:
+        raise ValueError(f"Au plus {MAX_FIELDS} champs peuvent être demandés.")
+
+    tree = {}
+    for path in paths:
+        keys = path.split('.')
+        if not all(keys):
+            raise ValueError(f"Champ invalide : {path!r}")
+
+        node = tree
+        for key in keys[:-1]:
+            child = node.setdefault(key, {})
+            # Valeur entière déjà demandée (ex. "metrics" puis "metrics.cpu")
+            if child is None:
+                break
+            node = child
+        else:
+            node[keys[-1]] = None
+
+    return tree
+
+
+def project(data, tree):
+    """
+    Ne garde d'un document que les champs d'un arbre de projection (les
+    listes sont projetées élément par élément, ex. partitions)
+    Args:
+        data: Document (dictionnaire, liste ou valeur)
+        tree (dict): Arbre de projection (voir compile_fields)
+    Returns:
+        Document projeté
+    """
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [project(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project(data[key], subtree) for key, subtree in tree.items() if key in data}
+
+
+def get_fields():
+    """
+    Retourne l'arbre de projection du paramètre fields de la requête
+    Returns:
+        dict: Arbre de projection, ou None si tous les champs sont demandés
+    Raises:
+        ValueError: Si le paramètre est invalide
+    """
+    value = request.args.get('fields')
+    return compile_fields(value) if value else None
+
+
+def host_summary(host):
+    """
+    Retourne la synthèse d'un hôte calculée à la réception (enregistrement du
+    catalogue), sans lire ses dernières métriques
+    Args:
+        host (dict): Enregistrement du catalogue
+    Returns:
+        dict: Synthèse (voir SUMMARY_FIELDS) et date de mise à jour lisible
+    """
+    summary = {field: host.get(field) for field in SUMMARY_FIELDS}
+    summary['last_update'] = datetime.fromtimestamp(host['last_seen']).strftime('%d/%m/%Y %H:%M:%S')
+    return summary
+
+
+def not_modified(etag, cache_control=REVALIDATE):
+    """
+    Répond 304 si le client possède déjà cette version de la ressource (If-None-Match)
+    À appeler avant d'ouvrir ou de décoder la ressource.
+    Args:
+        etag (str): ETag de la version courante
+        cache_control (str): Valeur de l'en-tête Cache-Control
+    Returns:
+        Response: Réponse 304, ou None si le contenu doit être envoyé
+    """
+    # Comparaison faible : l'ETag devient faible lorsque la réponse est compressée
+    if request.if_none_match.contains_weak(etag):
+        return set_validators(current_app.response_class(status=304), etag, cache_control)
+    return None
+
+
+class FleetSnapshot:
+    """
+    Cache des pages du tableau de bord.
+    Chaque page est conservée tant que la version du catalogue n'a pas changé et
+    qu'aucun hôte de la page n'est passé hors ligne. Une page contient la
+    synthèse de ses hôtes, lue dans le catalogue ; les métriques complètes ne
+    sont chargées qu'à la demande (réponse JSON complète), et seuls les hôtes
+    dont la date de réception a changé relisent alors leur latest.json.
+    Les rendus (JSON, HTML) d'une page inchangée sont également conservés.
+    """
+
+    # Nombre maximal de pages conservées
+    max_pages = 64
+
+    def __init__(self, data_dir):
+        """
+        Initialise le cache
+        Args:
+            data_dir (str): Répertoire de données de l'application
+        """
+        self.data_dir = data_dir
+        self.metrics_dir = os.path.join(data_dir, 'metrics')
+        self.catalog = get_host_catalog(data_dir)
+
+        # Métriques par hôte : hostname -> (version, client)
+        self.entries = {}
+
+        # Pages calculées : (after, before, limit) -> page
+        self.pages = OrderedDict()
+
+        self.lock = threading.Lock()
+
+    def load_client(self, host):
+        """
+        Retourne l'entrée d'un hôte, en relisant latest.json seulement s'il a changé
+        (version de l'enregistrement dans le catalogue différente de celle en cache)
+        Args:
+            host (dict): Enregistrement de l'hôte dans le catalogue
+        Returns:
+            dict: Client (nom, métriques, dernière mise à jour), ou None si illisible
+        """
+        hostname = host['hostname']
+        cached = self.entries.get(hostname)
+
+        if cached and cached[0] == host['version']:
+            return cached[1]
+
+        latest_file = os.path.join(host_dir(self.metrics_dir, hostname), 'latest.json')
+
+        try:
+            with open(latest_file, 'r') as f:
+                metrics = json.load(f)
+        except Exception as e:
+            print(f"Erreur lors de la lecture des métriques pour {hostname}: {str(e)}")
+            return None
+
+        client = {
+            'hostname': hostname,
+            'metrics': metrics,
+            'last_seen': host['last_seen'],
+            'last_update': datetime.fromtimestamp(host['last_seen']).strftime('%d/%m/%Y %H:%M:%S'),
+        }
+        self.entries[hostname] = (host['version'], client)
+
+        return client
+
+    def get_page(self, after=None, before=None, limit=60):
+        """
+        Retourne une page du tableau de bord, depuis le cache si elle est toujours valide
+        Args:
+            after (str, optional): Curseur, hôtes dont le nom suit celui-ci
+            before (str, optional): Curseur, hôtes dont le nom précède celui-ci
+            limit (int): Nombre d'hôtes par page
+        Returns:
+            dict: Page (clients, total, pagination, rendus déjà calculés)
+        """
+        key = (after, before, limit)
+        version = get_catalog_version(self.data_dir)
+        now = time.time()
+
+        with self.lock:
+            page = self.pages.get(key)
+
+            if page and page['version'] == version and now < page['expires']:
+                self.pages.move_to_end(key)
+                return page
+
+            page = self.build_page(after, before, limit, version, now)
+
+            self.pages[key] = page
+            self.pages.move_to_end(key)
+            if len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+
+            return page
+
+    def get_clients(self, page):
+        """
+        Retourne les métriques complètes des hôtes d'une page (chargées à la
+        première demande, puis conservées avec la page)
+        Args:
+            page (dict): Page (voir get_page)
+        Returns:
+            list: Clients (nom, métriques, dernière mise à jour, statut)
+        """
+        with self.lock:
+            if page['clients'] is None:
+                clients = []
+
+                for host in page['hosts']:
+                    client = self.load_client(host)
+                    if client is not None:
+                        clients.append(dict(client, status=host['status']))
+
+                page['clients'] = clients
+
+            return page['clients']
+
+    def build_page(self, after, before, limit, version, now):
+        """Construit une page du tableau de bord à partir du catalogue"""
+        hosts = self.catalog.list_hosts(after=after, before=before, limit=limit)
+
+        # La page devient invalide dès qu'un hôte en ligne passe hors ligne
+        expires = min(
+            (host['last_seen'] + ONLINE_TIMEOUT for host in hosts if host['status'] == 'Online'),
+            default=float('inf')
+        )
+
+        pagination = {
+            'has_prev': False,
+            'has_next': False,
+            'prev_cursor': None,
+            'next_cursor': None
+        }
+
+        if hosts:
+            first, last = hosts[0]['hostname'], hosts[-1]['hostname']
+            pagination['has_prev'] = self.catalog.has_before(first)
+            pagination['has_next'] = self.catalog.has_after(last)
+            pagination['prev_cursor'] = first if pagination['has_prev'] else None
+            pagination['next_cursor'] = last if pagination['has_next'] else None
+
+        # Version de la page : catalogue, curseurs et statuts affichés
+        etag = make_etag(version, after, before, limit, *(host['status'] for host in hosts))
+
+        return {
+            'version': version,
+            'etag': etag,
+            'expires': expires,
+            'hosts': hosts,
+            'summaries': [host_summary(host) for host in hosts],
+            'clients': None,
+            'total': self.catalog.count(),
+            'pagination': pagination,
+            'renders': {}
+        }
+
+
+def get_fleet_snapshot(data_dir):
+    """
+    Retourne le cache des pages du tableau de bord du répertoire de données
+    Args:
+        data_dir (str): Répertoire de données de l'application
+    Returns:
+        FleetSnapshot: Cache du tableau de bord
+    """
+    metrics_dir = os.path.join(data_dir, 'metrics')
+    snapshot = _fleet_snapshots.get(metrics_dir)
+
+    if snapshot is None:
+        snapshot = _fleet_snapshots[metrics_dir] = FleetSnapshot(data_dir)
+
+    return snapshot
+
+
+def load_json_file(path):
+    """Lit un fichier JSON"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class ChartDataCache:
+    """
+    Cache LRU des métriques décodées et des données de graphiques d'un échantillon.
+    La clé identifie une version de l'échantillon (hôte, timestamp de l'historique,
+    ou nom, date de modification et taille du fichier) : un échantillon de
+    l'historique n'est donc préparé qu'une seule fois.
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        Initialise le cache
+        Args:
+            maxsize (int): Nombre maximal d'échantillons conservés
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load_metrics):
+        """
+        Retourne les métriques et les données de graphiques d'un échantillon
+        Args:
+            key (tuple): Identifiant de la version de l'échantillon
+            load_metrics (callable): Fonction lisant les métriques (appelée en cas d'absence)
+        Returns:
+            tuple: (métriques, données des graphiques, True si lues depuis le cache)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry + (True,)
+
+            self.misses += 1
+
+        metrics = load_metrics()
+        entry = (metrics, make_json_serializable(prepare_chart_data(metrics)))
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return entry + (False,)
+
+    def stats(self):
+        """Retourne les statistiques du cache (succès, échecs, taille)"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self.entries),
+                'maxsize': self.maxsize
+            }
+
+
+# Cache des données de graphiques partagé par les vues
+chart_cache = ChartDataCache()
+
 
 def make_json_serializable(obj):
     """
@@ -49,22 +596,8 @@ def prepare_chart_data(metrics):
             'datasets': [{
                 'label': 'Utilisation CPU (%)',
                 'data': metrics['cpu']['cpu_percent'],
-                'backgroundColor': [
-                    'rgba(54, 162, 235, 0.5)',
-                    'rgba(75, 192, 192, 0.5)',
-                    'rgba(255, 159, 64, 0.5)',
-                    'rgba(153, 102, 255, 0.5)',
-                    'rgba(255, 99, 132, 0.5)',
-                    'rgba(255, 205, 86, 0.5)',
-                ] * 10,  # Répète les couleurs si besoin
-                'borderColor': [
-                    'rgb(54, 162, 235)',
-                    'rgb(75, 192, 192)',
-                    'rgb(255, 159, 64)',
-                    'rgb(153, 102, 255)',
-                    'rgb(255, 99, 132)',
-                    'rgb(255, 205, 86)',
-                ] * 10,
+                'backgroundColor': CPU_BACKGROUND_COLORS,
+                'borderColor': CPU_BORDER_COLORS,
                 'borderWidth': 1
             }]
         }
@@ -211,43 +744,71 @@ def prepare_chart_data(metrics):
 
 
 
-def paginate_history_files(files, page, per_page):
+def format_history_entry(entry):
+    """
+    Prépare l'affichage d'une entrée de l'index d'historique
+    Args:
+        entry (HistoryEntry): Entrée de l'index
+    Returns:
+        dict: Informations sur le fichier historique
+    """
+    date_display = datetime.fromtimestamp(entry.timestamp).strftime('%d/%m/%Y %H:%M:%S')
+
+    return {
+        'filename': history_filename(entry.timestamp, entry.sequence),
+        'display_name': date_display,
+        'timestamp': date_display,
+        'cursor': entry.timestamp
+    }
+
+
+def paginate_history_index(index, page, per_page, before=None, after=None):
     """
-    Pagine les fichiers historiques.
+    Pagine l'historique à partir de l'index temporel du client.
+    La pagination par curseur (before/after) est prioritaire sur le numéro de page ;
+    dans les deux cas, seule la page demandée est lue dans l'index.
     Args:
-        files (list): Liste complète des fichiers historiques
+        index (HistoryIndex): Index d'historique du client
         page (int): Numéro de page actuel
-        per_page (int): Nombre d'éléments par page 
+        per_page (int): Nombre d'éléments par page
+        before (float, optional): Curseur, entrées plus anciennes que ce timestamp
+        after (float, optional): Curseur, entrées plus récentes que ce timestamp
     Returns:
         tuple: (Liste paginée, informations de pagination)
     """
     # Nombre total d'éléments
-    total = len(files)
+    total = len(index)
         
     # Nombre total de pages
     pages = math.ceil(total / per_page) if total > 0 else 1
-        
-    # Ajuster la page si elle est hors limites
-    if page < 1:
-        page = 1
-    elif page > pages:
-        page = pages
-        
-    # Calculer les indices de début et de fin
-    start = (page - 1) * per_page
-    end = min(start + per_page, total)
-        
-    # Extraire la tranche
-    paginated_files = files[start:end]
-        
-    # Calculer l'index du premier et du dernier élément affichés
-    first_item = start + 1 if total > 0 else 0
-    last_item = end
+
+    if before is not None:
+        entries = index.before(before, per_page)
+    elif after is not None:
+        entries = index.after(after, per_page)
+    else:
+        # Ajuster la page si elle est hors limites
+        page = min(max(page, 1), pages)
+        entries = index.page(page, per_page)
+
+    # Rang (1 = plus récent) du premier élément affiché
+    if entries:
+        first_item = total - index.bisect_left(entries[0].timestamp)
+    else:
+        first_item = 0
+    last_item = first_item + len(entries) - 1 if entries else 0
+
+    # Numéro de page correspondant au premier élément affiché
+    if first_item:
+        page = (first_item - 1) // per_page + 1
+
+    has_prev = first_item > 1
+    has_next = 0 < last_item < total
         
     # Créer les informations de pagination
     pagination = {
-        'has_prev': page > 1,
-        'has_next': page < pages,
+        'has_prev': has_prev,
+        'has_next': has_next,
         'page': page,
         'pages': pages,
         'total': total,
@@ -256,10 +817,216 @@ def paginate_history_files(files, page, per_page):
         'last_item': last_item,
         'prev_page': page - 1 if page > 1 else None,
         'next_page': page + 1 if page < pages else None,
+        'prev_cursor': entries[0].timestamp if has_prev else None,
+        'next_cursor': entries[-1].timestamp if has_next else None,
         'page_range': list(range(max(1, page - 2), min(pages + 1, page + 3)))  # Convertir en liste
     }
         
-    return paginated_files, pagination
+    return [format_history_entry(entry) for entry in entries], pagination
+
+
+def downsample_lttb(timestamps, values, max_points):
+    """
+    Réduit une série à `max_points` points avec l'algorithme LTTB
+    (Largest-Triangle-Three-Buckets), qui conserve l'allure visuelle de la courbe.
+    Args:
+        timestamps (list): Horodatages, triés
+        values (list): Valeurs correspondantes (sans valeurs manquantes)
+        max_points (int): Nombre maximal de points
+    Returns:
+        tuple: (horodatages, valeurs) réduits
+    """
+    count = len(timestamps)
+
+    if max_points >= count or max_points < 3:
+        return list(timestamps), list(values)
+
+    sampled_timestamps = [timestamps[0]]
+    sampled_values = [values[0]]
+
+    # Le premier et le dernier point sont conservés, les autres répartis en seaux
+    bucket_size = (count - 2) / (max_points - 2)
+    previous = 0
+
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Moyenne du seau suivant (troisième sommet du triangle)
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_count = next_end - next_start
+        average_x = sum(timestamps[next_start:next_end]) / next_count
+        average_y = sum(values[next_start:next_end]) / next_count
+
+        previous_x = timestamps[previous]
+        previous_y = values[previous]
+
+        # Point du seau formant le plus grand triangle
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            area = abs(
+                (previous_x - average_x) * (values[index] - previous_y)
+                - (previous_x - timestamps[index]) * (average_y - previous_y)
+            )
+            if area > best_area:
+                best, best_area = index, area
+
+        sampled_timestamps.append(timestamps[best])
+        sampled_values.append(values[best])
+        previous = best
+
+    sampled_timestamps.append(timestamps[-1])
+    sampled_values.append(values[-1])
+
+    return sampled_timestamps, sampled_values
+
+
+def downsample_minmax(timestamps, values, max_points):
+    """
+    Réduit une série en conservant le minimum et le maximum de chaque intervalle
+    (les pics sont toujours visibles, contrairement à une moyenne).
+    Args:
+        timestamps (list): Horodatages, triés
+        values (list): Valeurs correspondantes (sans valeurs manquantes)
+        max_points (int): Nombre maximal de points
+    Returns:
+        tuple: (horodatages, valeurs) réduits
+    """
+    count = len(timestamps)
+
+    if max_points >= count or max_points < 2:
+        return list(timestamps), list(values)
+
+    sampled_timestamps = []
+    sampled_values = []
+    buckets = max_points // 2
+    bucket_size = count / buckets
+
+    for bucket in range(buckets):
+        start = int(bucket * bucket_size)
+        end = int((bucket + 1) * bucket_size)
+
+        chunk = values[start:end]
+        low = start + chunk.index(min(chunk))
+        high = start + chunk.index(max(chunk))
+
+        # Les deux points sont ajoutés dans l'ordre chronologique
+        for index in sorted({low, high}):
+            sampled_timestamps.append(timestamps[index])
+            sampled_values.append(values[index])
+
+    return sampled_timestamps, sampled_values
+
+
+def query_series(client_dir, metric, start, end, max_points, mode='lttb'):
+    """
+    Lit la série d'un champ numérique d'un client et la réduit au budget de points
+    Args:
+        client_dir (str): Répertoire des métriques du client
+        metric (str): Champ aplati (ex. "cpu.cpu_percent_avg")
+        start (int): Début de l'intervalle (inclus)
+        end (int): Fin de l'intervalle (incluse)
+        max_points (int): Nombre maximal de points renvoyés
+        mode (str): Méthode de réduction ('lttb' ou 'minmax')
+    Returns:
+        dict: Horodatages et valeurs alignés, nombre de points avant réduction
+    """
+    timestamps, columns = SeriesStore(client_dir).query([metric], start, end)
+    values = columns[metric]
 
+    # Les points où le champ est absent (NaN) sont ignorés
+    points = [
+        (int(timestamp), float(value))
+        for timestamp, value in zip(timestamps, values)
+        if not math.isnan(value)
+    ]
+    timestamps = [point[0] for point in points]
+    values = [point[1] for point in points]
+
+    downsample = downsample_minmax if mode == 'minmax' else downsample_lttb
+    sampled_timestamps, sampled_values = downsample(timestamps, values, max_points)
+
+    return {
+        'timestamps': sampled_timestamps,
+        'values': sampled_values,
+        'points': len(points)
+    }
+
+
+def series_arrays(data, start):
+    """
+    Convertit les horodatages et valeurs d'une série en tableaux typés little-endian
+    Args:
+        data (dict): Série (voir query_series)
+        start (int): Début de l'intervalle (origine des horodatages)
+    Returns:
+        list: Octets de chaque tableau, dans l'ordre de SERIES_ARRAYS
+    """
+    columns = {
+        'timestamps': [timestamp - start for timestamp in data['timestamps']],
+        'values': data['values'],
+    }
+    arrays = []
+
+    for field, typecode, _ in SERIES_ARRAYS:
+        values = array(typecode, columns[field])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        arrays.append(values.tobytes())
+
+    return arrays
+
+
+def series_header(payload):
+    """Retourne l'en-tête d'une réponse de séries compacte (sans les tableaux)"""
+    header = {key: value for key, value in payload.items() if key != 'series'}
+    header['arrays'] = {field: name for field, _, name in SERIES_ARRAYS}
+    header['series'] = []
+
+    for data in payload['series']:
+        entry = {key: value for key, value in data.items() if key not in ('timestamps', 'values')}
+        entry['count'] = len(data['timestamps'])
+        header['series'].append(entry)
+
+    return header
+
+
+def encode_series_base64(payload):
+    """
+    Encode les séries d'une réponse en tableaux typés base64 (dans le JSON)
+    Args:
+        payload (dict): Réponse de l'API des séries
+    Returns:
+        dict: Réponse dont chaque série porte ses tableaux en base64
+    """
+    header = series_header(payload)
+
+    for data, encoded in zip(payload['series'], header['series']):
+        for (field, _, _), raw in zip(SERIES_ARRAYS, series_arrays(data, payload['from'])):
+            encoded[field] = base64.b64encode(raw).decode('ascii')
+
+    return header
+
+
+def encode_series_binary(payload):
+    """
+    Encode une réponse de séries au format binaire : longueur de l'en-tête
+    (uint32), en-tête JSON, puis horodatages (uint32, décalages depuis "from")
+    et valeurs (float32) de chaque série, chaque bloc étant aligné sur 8 octets
+    (lecture directe par les tableaux typés du navigateur)
+    Args:
+        payload (dict): Réponse de l'API des séries
+    Returns:
+        bytes: Corps de la réponse
+    """
+    header = json.dumps(series_header(payload), separators=(',', ':')).encode()
+    header += b' ' * (-(len(header) + 4) % 8)
 
+    chunks = [struct.pack('<I', len(header)), header]
+    for data in payload['series']:
+        for raw in series_arrays(data, payload['from']):
+            chunks.append(raw)
+            chunks.append(bytes(-len(raw) % 8))
 
+    return b''.join(chunks)
@@ -5,6 +5,8 @@ Ce module contient les vues de l'application Flask.
 """
 
 import os
+import io
+import time
 from datetime import datetime
 import json
 
@@ -16,17 +18,52 @@ from flask import (
     flash,
     send_file,
     jsonify,
+    make_response,
     current_app
 )
 from flask.views import MethodView
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError
+
+from server.history import HistoryIndex, history_filename
+from server.archive import read_entry
+from server.series import SERIES_NAME, OPEN_NAME, ROLLUP_DIR
+from server.utils import host_dir, sanitize_path, read_heartbeat
+from server.catalog import TOP_METRICS
+from server.alerts import load_rules, RULES_NAME
 
 from .utils import (
-    make_json_serializable,
-    prepare_chart_data,
-    paginate_history_files
+    chart_cache,
+    load_json_file,
+    paginate_history_index,
+    get_fleet_snapshot,
+    get_fields,
+    project,
+    get_host_catalog,
+    get_alert_store,
+    get_forecast_store,
+    get_catalog_version,
+    get_latest_table,
+    query_series,
+    encode_series_base64,
+    encode_series_binary,
+    SERIES_MIMETYPE,
+    make_etag,
+    file_version,
+    not_modified,
+    set_validators,
+    REVALIDATE,
+    IMMUTABLE
 )
+from .events import stream_events
+from .fleet import fleet_summary
+from .export import EXPORT_FORMATS, export_history
+from .bundles import accepts_gzip
 from .errors import get_forms_errors
-from .forms import UploadForm
+from .forms import UploadForm, ALLOWED_EXTENSIONS
+from .downloads import send_file_ranges
+from .filecatalog import get_file_catalog, SORT_COLUMNS
+from .uploads import get_upload_manager, UploadError, MAX_CHUNK_SIZE
 
 
 class IndexView(MethodView):
@@ -39,65 +76,126 @@ class IndexView(MethodView):
 class DashBoardView(MethodView):
     template_name = "dashboard.html"
     
+    # Nombre de machines par page
+    per_page = 60
+
+    # Nombre maximal de rendus conservés par page
+    max_renders = 8
+    
     def get(self):
         # Récupération du répertoire de données
         data_dir = current_app.config["DATA_DIR"]
         metrics_dir = os.path.join(data_dir, 'metrics')
 
-        # Récupération des clients
-        clients = []
-        
         # Vérification de l'existence du répertoire
         if not os.path.exists(metrics_dir):
-            clients = []
-        
-        # Parcourir le répertoire des métriques
-        for hostname in os.listdir(metrics_dir):
-            client_dir = os.path.join(metrics_dir, hostname)
-            
-            if not os.path.isdir(client_dir):
-                continue
-            
-            # Récupération des dernières métriques
-            latest_file = os.path.join(client_dir, 'latest.json')
-            
-            if not os.path.exists(latest_file):
-                continue
-            
-            try:
-                with open(latest_file, 'r') as f:
-                    metrics = json.load(f)
-                
-                # Création d'un objet client avec ses métriques
-                client = {
-                    'hostname': hostname,
-                    'metrics': metrics,
-                    'last_update': datetime.fromtimestamp(os.path.getmtime(latest_file)).strftime('%d/%m/%Y %H:%M:%S'),
-                    'status': 'Online' if (datetime.now() - datetime.fromtimestamp(os.path.getmtime(latest_file))).total_seconds() < 300 else 'Offline'
-                }
-                
-                # Ajout du client à la liste
-                clients.append(client)
-                
-            except Exception as e:
-                print(f"Erreur lors de la lecture des métriques pour {hostname}: {str(e)}")
-        
-        # Tri des clients par nom d'hôte
-        clients.sort(key=lambda x: x['hostname'])
+            page = {
+                'hosts': [],
+                'summaries': [],
+                'clients': [],
+                'total': 0,
+                'pagination': {
+                    'has_prev': False,
+                    'has_next': False,
+                    'prev_cursor': None,
+                    'next_cursor': None
+                },
+                'etag': make_etag('empty'),
+                'renders': {}
+            }
+        else:
+            # Page de machines (triée par nom d'hôte), reconstruite seulement si le catalogue a changé
+            page = get_fleet_snapshot(data_dir).get_page(
+                after=request.args.get('after'),
+                before=request.args.get('before'),
+                limit=self.per_page
+            )
 
-        # Ajouter le support pour le format JSON
-        if request.args.get('format') == 'json':
-            return jsonify({
-                "clients": clients
-            })
+        format_json = request.args.get('format') == 'json'
 
-        ctx = {
-            "clients": clients,
-        }
-        
-        return render_template(self.template_name, **ctx)  
+        # Réponse JSON : synthèse calculée à la réception (view=summary) ou
+        # métriques complètes, éventuellement réduites aux champs demandés (fields)
+        view = 'summary' if request.args.get('view') == 'summary' else 'full'
+        fields = request.args.get('fields', '')
+
+        try:
+            tree = get_fields()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Page inchangée depuis la dernière requête du navigateur : réponse 304 sans corps
+        if format_json:
+            etag = make_etag(page['etag'], 'json', view, fields)
+        else:
+            etag = make_etag(page['etag'], 'html')
+        response = not_modified(etag)
+        if response:
+            return response
+
+        if format_json:
+            def build(page):
+                if view == 'summary':
+                    clients = page['summaries']
+                else:
+                    clients = get_fleet_snapshot(data_dir).get_clients(page)
+
+                return current_app.json.dumps({
+                    "clients": project(clients, tree),
+                    "total": page['total'],
+                    "pagination": page['pagination']
+                })
+
+            body = self.render(page, ('json', view, fields), build)
+            response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+        else:
+            # Cartes des machines construites à partir de la synthèse du catalogue
+            response = make_response(self.render(page, 'html', lambda page: render_template(
+                self.template_name,
+                clients=page['summaries'],
+                total=page['total'],
+                pagination=page['pagination']
+            )))
+
+        return set_validators(response, etag)
+
+    def render(self, page, name, builder):
+        """Retourne le rendu d'une page, mis en cache avec celle-ci"""
+        renders = page['renders']
+
+        if name in renders:
+            return renders[name]
+
+        body = builder(page)
+
+        # Nombre de rendus conservés borné (projections fields arbitraires)
+        if len(renders) < self.max_renders:
+            renders[name] = body
+
+        return body
     
 
+class StreamView(MethodView):
+    """
+    Flux Server-Sent Events des mises à jour des métriques.
+    Le paramètre host limite le flux à un seul client (page d'un client).
+    """
+
+    def get(self):
+        data_dir = current_app.config["DATA_DIR"]
+        hostname = request.args.get('host')
+
+        # Identifiant du dernier événement reçu, renvoyé par le navigateur à la reconnexion
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+        response = current_app.response_class(
+            stream_events(data_dir, hostname, last_event_id),
+            mimetype='text/event-stream'
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class ClientMetricsView(MethodView):
     """
     Vue pour afficher les métriques d'un client spécifique.
@@ -119,6 +217,12 @@ class ClientMetricsView(MethodView):
         # Vérifier si c'est une demande de format JSON
         format_json = request.args.get('format') == 'json'
         
+        # Projection de la réponse JSON (paramètre fields, ex. "metrics.cpu,pagination")
+        try:
+            tree = get_fields() if format_json else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Récupérer le numéro de page depuis la requête (par défaut: 1)
         try:
             page = int(request.args.get('page', 1))
@@ -129,10 +233,16 @@ class ClientMetricsView(MethodView):
                 page_str = page_str.split('?')[0]
             page = int(page_str) if page_str.isdigit() else 1
         
+        # Curseurs de pagination (timestamps des entrées de l'index)
+        before = request.args.get('before', type=float)
+        after = request.args.get('after', type=float)
+        
         # Nombre d'éléments par page
         per_page = 10
         
         # Initialisation des variables pour éviter les erreurs
+        etag = None
+        cache_hit = None
         metrics = {}
         chart_data = {}
         history_files = []
@@ -163,7 +273,7 @@ class ClientMetricsView(MethodView):
                 flash("Le répertoire des métriques n'existe pas.", "danger")
                 return redirect(url_for("dashboard"))
             
-            client_dir = os.path.join(metrics_dir, hostname)
+            client_dir = host_dir(metrics_dir, hostname)
             
             # Vérification de l'existence du répertoire du client
             if not os.path.exists(client_dir):
@@ -174,18 +284,28 @@ class ClientMetricsView(MethodView):
                 flash(f"Aucun client trouvé avec le nom d'hôte : {hostname}", "danger")
                 return redirect(url_for("dashboard"))
             
-            # Déterminer quel fichier de métriques charger
-            if file and os.path.exists(os.path.join(client_dir, file)):
+            # Index temporel de l'historique du client
+            history_index = HistoryIndex(client_dir)
+            history_index.ensure()
+            
+            # Déterminer quel fichier de métriques charger :
+            # un échantillon de l'historique (fichier isolé ou archive) ou latest.json
+            history_entry = None
+            
+            if file and file != 'latest.json':
+                history_entry = history_index.find_by_name(file)
+            
+            if history_entry is None and file and os.path.exists(os.path.join(client_dir, file)):
                 metrics_file = os.path.join(client_dir, file)
-            else:
+            elif history_entry is None:
                 # Utiliser latest.json ou le fichier le plus récent
                 latest_file = os.path.join(client_dir, "latest.json")
                 
                 if not os.path.exists(latest_file):
                     # Chercher le fichier de métriques le plus récent
-                    available_files = [f for f in os.listdir(client_dir) if f.endswith('.json')]
+                    history_entry = history_index.last()
                     
-                    if not available_files:
+                    if not history_entry:
                         ctx = {
                             "hostname": hostname,
                             "metrics": {},
@@ -202,66 +322,68 @@ class ClientMetricsView(MethodView):
                         flash(f"Aucune métrique disponible pour {hostname}", "warning")
 
                         return render_template(self.template_name, **ctx)
-                    
-                    # Trier par date de modification (le plus récent en premier)
-                    available_files.sort(key=lambda x: os.path.getmtime(os.path.join(client_dir, x)), reverse=True)
-                    metrics_file = os.path.join(client_dir, available_files[0])
                 else:
                     metrics_file = latest_file
             
+            # Version de la ressource, vérifiée avant toute lecture : un échantillon de
+            # l'historique ne change jamais, les autres fichiers sont identifiés par
+            # leur date de modification et leur taille
+            if history_entry:
+                version = (history_entry.timestamp, history_entry.sequence)
+            else:
+                version = (os.path.basename(metrics_file),) + file_version(metrics_file)
+            
+            if download:
+                etag = make_etag(hostname, 'download', *version)
+                cache_control = IMMUTABLE if history_entry else REVALIDATE
+            else:
+                # La page affiche aussi la liste de l'historique, qui s'allonge à chaque réception
+                etag = make_etag(hostname, request.full_path, len(history_index), *version)
+                cache_control = REVALIDATE
+            
+            response = not_modified(etag, cache_control)
+            if response:
+                return response
+            
             # Si c'est une demande de téléchargement et que nous avons un fichier valide
+            if download and history_entry:
+                # Échantillon lu directement dans le fichier ou l'archive de l'historique
+                response = send_file(
+                    io.BytesIO(read_entry(client_dir, history_entry)),
+                    mimetype='application/json',
+                    as_attachment=True,
+                    download_name=history_filename(history_entry.timestamp, history_entry.sequence),
+                    etag=etag
+                )
+                return set_validators(response, etag, cache_control)
+            
             if download and metrics_file:
                 # Obtenir le nom du fichier à partir du chemin complet
                 filename = os.path.basename(metrics_file)
                 
                 # Renvoyer le fichier en tant que pièce jointe
-                return send_file(
+                response = send_file(
                     metrics_file, 
                     mimetype='application/json',
                     as_attachment=True,
-                    download_name=filename
+                    download_name=filename,
+                    etag=etag
                 )
+                return set_validators(response, etag, cache_control)
             
             # Charger les données du fichier pour l'affichage normal
             try:
-                with open(metrics_file, 'r') as f:
-                    metrics = json.load(f)
-                
-                # Préparation des données pour Chart.js
-                chart_data = prepare_chart_data(metrics)
+                if history_entry:
+                    current_file = history_filename(history_entry.timestamp, history_entry.sequence)
+                    load_metrics = lambda: json.loads(read_entry(client_dir, history_entry))
+                else:
+                    current_file = os.path.basename(metrics_file)
+                    load_metrics = lambda: load_json_file(metrics_file)
                 
-                # Récupérer la liste des fichiers de métriques historiques
-                history_files = [f for f in os.listdir(client_dir) if f.endswith('.json') and f != 'latest.json']
-                history_files.sort(key=lambda x: os.path.getmtime(os.path.join(client_dir, x)), reverse=True)
-                
-                # Préparer les informations sur les fichiers historiques
-                history_info = []
-
-                for history_file in history_files:
-                    file_path = os.path.join(client_dir, history_file)
-                    timestamp = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    
-                    # Pour les fichiers au format "metrics-YYYYMMDD-HHMMSS.json"
-                    display_name = history_file
-
-                    if history_file.startswith('metrics-'):
-                        date_str = history_file.replace('metrics-', '').replace('.json', '')
-
-                        try:
-                            date_obj = datetime.strptime(date_str, '%Y%m%d-%H%M%S')
-                            display_name = date_obj.strftime('%d/%m/%Y %H:%M:%S')
-
-                        except:
-                            pass
-                    
-                    history_info.append({
-                        'filename': history_file,
-                        'display_name': display_name,
-                        'timestamp': timestamp.strftime('%d/%m/%Y %H:%M:%S')
-                    })
+                # Métriques et données pour Chart.js, préparées une seule fois par version
+                metrics, chart_data, cache_hit = chart_cache.get((hostname,) + version, load_metrics)
                 
                 # Ajouter l'information sur le fichier actuel
-                current_file = os.path.basename(metrics_file)
                 current_file_display = current_file
 
                 if current_file == 'latest.json':
@@ -275,10 +397,13 @@ class ClientMetricsView(MethodView):
                     except:
                         pass
                 
-                # Pagination des fichiers historiques
-                history_files, pagination = paginate_history_files(history_info, page, per_page)
+                # Pagination des fichiers historiques à partir de l'index
+                history_files, pagination = paginate_history_index(
+                    history_index, page, per_page, before=before, after=after
+                )
                 
             except Exception as e:
+                etag = None
                 error_msg = f"Erreur lors de la lecture du fichier de métriques : {str(e)}"
                 if format_json:
                     return jsonify({
@@ -295,6 +420,7 @@ class ClientMetricsView(MethodView):
         
         # Garder les variables initiales vides 
         except Exception as e:
+            etag = None
             error_msg = f"Erreur lors de l'accès aux métriques : {str(e)}"
 
             if format_json:
@@ -323,44 +449,438 @@ class ClientMetricsView(MethodView):
         
         # Retourner JSON si demandé
         if format_json:
-            # Nous devons nous assurer que tous les objets sont JSON sérialisables
-            return jsonify(make_json_serializable(ctx))
+            # Les données en cache sont déjà sérialisables en JSON
+            response = jsonify(project(ctx, tree))
+        else:
+            # Sinon, retourner le template HTML
+            response = make_response(render_template(self.template_name, **ctx))
         
-        # Sinon, retourner le template HTML
-        return render_template(self.template_name, **ctx)
+        if etag:
+            set_validators(response, etag)
+        if cache_hit is not None:
+            response.headers['X-Cache'] = 'HIT' if cache_hit else 'MISS'
+        return response
+
+
+class SeriesView(MethodView):
+    """
+    API des séries temporelles : valeurs d'un champ numérique sur un intervalle,
+    pour un ou plusieurs clients, réduites à un nombre maximal de points.
+    """
+    # Bornes des paramètres de la requête
+    default_range = 3600
+    default_points = 500
+    max_points = 5000
+    max_hosts = 20
+
+    # Durée maximale lue par requête (séries brutes, séries agrégées) : un début
+    # plus ancien est ramené à cette limite, indiquée par "from" dans la réponse
+    max_range = 31 * 86400
+    max_range_rollup = 366 * 86400
+
+    # Budget de points des formats compacts (tableaux typés, sans coût d'analyse JSON)
+    max_points_typed = 100000
+
+    # Encodages des séries : listes JSON, tableaux typés base64 ou binaires
+    encodings = ('json', 'base64', 'binary')
+
+    def get(self):
+        """
+        Retourne les séries demandées au format JSON ou binaire
+        Paramètres : host (répétable), metric, from, to (timestamps, 31 jours au plus),
+        max_points, mode ('lttb' ou 'minmax'), encoding ('json', 'base64' ou 'binary'),
+        rollup ('true' : séries agrégées par intervalle, ex. metric=cpu.cpu_percent_avg.max)
+        """
+        hosts = request.args.getlist('host')[:self.max_hosts]
+        metric = request.args.get('metric')
+        encoding = request.args.get('encoding', 'json')
+        rollup = request.args.get('rollup') == 'true'
+
+        if not hosts or not metric:
+            return jsonify({
+                "error": "Les paramètres host et metric sont obligatoires."
+            }), 400
+
+        # Chaque nom d'hôte désigne un répertoire : refus des chemins
+        for hostname in hosts:
+            if not hostname or sanitize_path(hostname) != hostname or hostname in ('.', '..'):
+                return jsonify({"error": "Nom d'hôte invalide (paramètre host)."}), 400
+
+        if encoding not in self.encodings:
+            return jsonify({
+                "error": f"Encodage inconnu. Valeurs possibles : {', '.join(self.encodings)}."
+            }), 400
+
+        end = request.args.get('to', type=int) or int(time.time())
+        start = request.args.get('from', type=int) or end - self.default_range
+        start = max(start, end - (self.max_range_rollup if rollup else self.max_range))
+
+        if start > end:
+            return jsonify({
+                "error": "Le début de l'intervalle (from) doit précéder sa fin (to)."
+            }), 400
+
+        max_points = request.args.get('max_points', self.default_points, type=int)
+        max_points = min(max(max_points, 3), self.max_points if encoding == 'json' else self.max_points_typed)
+        mode = request.args.get('mode', 'lttb')
+
+        metrics_dir = os.path.join(current_app.config["DATA_DIR"], 'metrics')
+        series = []
+
+        # Version des séries demandées (taille des blocs complets, bloc en cours)
+        versions = []
+        for hostname in hosts:
+            client_dir = self.series_dir(metrics_dir, hostname, rollup)
+            for name in (SERIES_NAME, OPEN_NAME):
+                try:
+                    versions.extend(file_version(os.path.join(client_dir, name)))
+                except OSError:
+                    versions.append(None)
+
+        etag = make_etag(hosts, metric, start, end, max_points, mode, encoding, rollup, *versions)
+        response = not_modified(etag)
+        if response:
+            return response
+
+        for hostname in hosts:
+            client_dir = self.series_dir(metrics_dir, hostname, rollup)
+
+            if not os.path.isdir(client_dir):
+                series.append({"host": hostname, "timestamps": [], "values": [], "points": 0})
+                continue
+
+            data = query_series(client_dir, metric, start, end, max_points, mode)
+            data['host'] = hostname
+            series.append(data)
+
+        payload = {
+            "metric": metric,
+            "from": start,
+            "to": end,
+            "max_points": max_points,
+            "series": series
+        }
+
+        if encoding == 'binary':
+            response = current_app.response_class(encode_series_binary(payload), mimetype=SERIES_MIMETYPE)
+        elif encoding == 'base64':
+            response = jsonify(encode_series_base64(payload))
+        else:
+            response = jsonify(payload)
+        return set_validators(response, etag)
+
+    def series_dir(self, metrics_dir, hostname, rollup):
+        """Retourne le répertoire des séries complètes ou agrégées d'un client"""
+        client_dir = host_dir(metrics_dir, hostname)
+        return os.path.join(client_dir, ROLLUP_DIR) if rollup else client_dir
+
+
+class ExportView(MethodView):
+    """
+    Export de l'historique complet d'un client au format NDJSON ou CSV.
+    Le fichier est produit au fil de l'eau (mémoire constante) et compressé
+    en gzip si le navigateur l'accepte.
+    """
+
+    def get(self):
+        """
+        Exporte l'historique d'un client
+        Paramètres : host, format ('ndjson' ou 'csv'), fields (champs séparés par
+        des virgules), from, to (timestamps inclus), after (reprise : timestamp du
+        dernier échantillon reçu)
+        """
+        hostname = request.args.get('host', '')
+        fmt = request.args.get('format', 'ndjson')
+
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({
+                "error": f"Format inconnu. Valeurs possibles : {', '.join(EXPORT_FORMATS)}."
+            }), 400
+
+        # Le nom d'hôte désigne un répertoire : refus des chemins
+        if not hostname or sanitize_path(hostname) != hostname or hostname in ('.', '..'):
+            return jsonify({"error": "Le paramètre host est obligatoire."}), 400
+
+        client_dir = host_dir(os.path.join(current_app.config["DATA_DIR"], 'metrics'), hostname)
+        if not os.path.isdir(client_dir):
+            return jsonify({
+                "error": f"Aucun client trouvé avec le nom d'hôte : {hostname}"
+            }), 404
+
+        fields = [field for field in request.args.get('fields', '').split(',') if field]
+        compress = accepts_gzip()
+
+        response = current_app.response_class(
+            export_history(
+                client_dir,
+                fmt,
+                fields,
+                start=request.args.get('from', type=float),
+                end=request.args.get('to', type=float),
+                after=request.args.get('after', type=float),
+                compress=compress
+            ),
+            mimetype=EXPORT_FORMATS[fmt]
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{hostname}-metrics.{fmt}"'
+        response.headers['Cache-Control'] = 'no-store'
+        response.vary.add('Accept-Encoding')
+
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+
+        return response
+
+
+class FleetSummaryView(MethodView):
+    """
+    API des statistiques de la flotte : distribution des taux d'utilisation
+    CPU, mémoire et disque de tous les hôtes, éventuellement par plateforme.
+    """
+
+    def get(self):
+        """
+        Retourne le résumé de la flotte au format JSON
+        Paramètres : bins (nombre d'intervalles des histogrammes),
+        group_by ('platform')
+        """
+        bins = min(max(request.args.get('bins', 10, type=int), 1), 100)
+        group_by = request.args.get('group_by')
+
+        if group_by not in (None, 'platform'):
+            return jsonify({
+                "error": "Seul le regroupement par plateforme (group_by=platform) est disponible."
+            }), 400
+
+        data_dir = current_app.config["DATA_DIR"]
+
+        # Résumé identifié par la version du catalogue à partir de laquelle il a été calculé
+        version, summary = fleet_summary(data_dir, bins, group_by)
+        etag = make_etag('fleet', version, bins, group_by)
+        response = not_modified(etag)
+        if response:
+            return response
+
+        return set_validators(jsonify(summary), etag)
+
+
+class TopView(MethodView):
+    """
+    API des classements : hôtes en ligne les plus chargés pour une métrique
+    (CPU, mémoire, partition la plus remplie, erreurs ou pertes réseau par seconde).
+    """
+
+    # Période (en secondes) de recalcul des statuts : un hôte passe hors ligne sans
+    # modifier le catalogue
+    status_interval = 10
+
+    def get(self):
+        """
+        Retourne les premiers hôtes d'un classement au format JSON
+        Paramètres : metric (cpu, memory, disk, net_errors, net_drops), n (nombre d'hôtes),
+        fields (champs des hôtes à retourner, ex. "hostname,value"),
+        offline ('true' pour classer aussi les hôtes hors ligne)
+        """
+        metric = request.args.get('metric', 'cpu')
+        limit = min(max(request.args.get('n', 10, type=int), 1), 100)
+        fields = request.args.get('fields', '')
+        include_offline = request.args.get('offline') == 'true'
+
+        if metric not in TOP_METRICS:
+            return jsonify({
+                "error": f"Métrique inconnue. Valeurs possibles : {', '.join(TOP_METRICS)}."
+            }), 400
+
+        try:
+            tree = get_fields()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        catalog = get_host_catalog(current_app.config["DATA_DIR"])
+
+        # Le classement ne change qu'avec la version du catalogue et la date de
+        # référence des statuts (arrondie à status_interval)
+        now = time.time() // self.status_interval * self.status_interval
+        etag = make_etag(
+            'top', get_catalog_version(current_app.config["DATA_DIR"]), now, metric, limit, fields,
+            include_offline
+        )
+        response = not_modified(etag)
+        if response:
+            return response
+
+        column = TOP_METRICS[metric]
+        hosts = [
+            {
+                'hostname': host['hostname'],
+                'status': host['status'],
+                'last_seen': host['last_seen'],
+                'value': host[column]
+            }
+            for host in catalog.top(metric, limit, include_offline, now)
+        ]
+
+        return set_validators(jsonify({'metric': metric, 'hosts': project(hosts, tree)}), etag)
+
+
+class ForecastView(MethodView):
+    """
+    API des prévisions de remplissage des partitions, recalculées
+    périodiquement par le serveur de réception pour toute la flotte
+    """
+
+    def get(self):
+        """
+        Retourne les prévisions au format JSON
+        Paramètres : hostname (partitions d'un hôte), sinon n (partitions
+        qui seront pleines le plus tôt)
+        """
+        hostname = request.args.get('hostname') or None
+        limit = min(max(request.args.get('n', 10, type=int), 1), 100)
+        store = get_forecast_store(current_app.config["DATA_DIR"])
+
+        # Les prévisions ne changent qu'à chaque calcul
+        etag = make_etag('forecast', store.version(), hostname, limit)
+        response = not_modified(etag)
+        if response:
+            return response
+
+        computed_at = store.computed_at()
+        partitions = store.for_host(hostname) if hostname else store.soonest(limit)
+
+        for partition in partitions:
+            partition['percent'] = round(partition['used'] * 100 / partition['total'], 1)
+            partition['seconds_left'] = (
+                max(int(partition['full_at'] - computed_at), 0)
+                if partition['full_at'] is not None else None
+            )
+
+        return set_validators(jsonify({
+            'computed_at': computed_at or None,
+            'partitions': partitions
+        }), etag)
+
+
+def format_alert(alert, now):
+    """Ajoute à une alerte ses dates et sa durée lisibles"""
+    end = alert['resolved_at'] or now
+    alert['started'] = datetime.fromtimestamp(alert['started_at']).strftime('%d/%m/%Y %H:%M:%S')
+    alert['duration'] = int(end - alert['started_at'])
+    return alert
+
+
+class AlertsView(MethodView):
+    """Page des alertes : alertes en cours, dernières alertes résolues et règles"""
+    template_name = "alerts.html"
+
+    # Nombre d'alertes résolues affichées
+    recent_limit = 50
+
+    def get(self):
+        data_dir = current_app.config["DATA_DIR"]
+        store = get_alert_store(data_dir)
+        hostname = request.args.get('hostname') or None
+
+        try:
+            rules = load_rules(os.path.join(data_dir, RULES_NAME))
+        except ValueError as e:
+            current_app.logger.error(str(e))
+            rules = []
+
+        try:
+            now = time.time()
+            active = [format_alert(alert, now) for alert in store.active(hostname)]
+            recent = [format_alert(alert, now) for alert in store.recent(self.recent_limit, hostname)]
+        except Exception as e:
+            current_app.logger.error(f"Error reading alerts: {str(e)}")
+            flash("Impossible de lire les alertes.", "danger")
+            active, recent = [], []
+
+        return render_template(
+            self.template_name,
+            active=active,
+            recent=recent,
+            rules=rules,
+            hostname=hostname
+        )
+
+
+class AlertsApiView(MethodView):
+    """API des alertes (en cours et dernières résolues)"""
+
+    def get(self):
+        """
+        Retourne les alertes au format JSON
+        Paramètres : hostname (alertes d'un hôte), limit (nombre d'alertes résolues)
+        """
+        hostname = request.args.get('hostname') or None
+        limit = min(max(request.args.get('limit', 50, type=int), 0), 1000)
+        store = get_alert_store(current_app.config["DATA_DIR"])
+
+        # Les alertes ne changent qu'à un déclenchement ou une résolution
+        etag = make_etag('alerts', store.version(), hostname, limit)
+        response = not_modified(etag)
+        if response:
+            return response
+
+        return set_validators(jsonify({
+            'active': store.active(hostname),
+            'recent': store.recent(limit, hostname) if limit else [],
+        }), etag)
 
 
 class FilesView(MethodView):
     template_name = "files.html"
     form_class = UploadForm
 
+    # Nombre de fichiers par page
+    per_page = 50
+
     def get(self):
         form = self.form_class()
 
-        try:
-            files = []
+        # Page, tri et recherche
+        page = max(request.args.get('page', 1, type=int), 1)
+        sort = request.args.get('sort', 'name')
+        if sort not in SORT_COLUMNS:
+            sort = 'name'
+        order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+        search = request.args.get('q', '').strip()
 
-            # Parcourir le répertoire de téléchargement
-            for root, _, filenames in os.walk(current_app.config["UPLOAD_FOLDER"]):
-                for filename in filenames:
-                    file_path = os.path.join(root, filename)
+        try:
+            # Catalogue des fichiers : requête indexée, sans parcourir le dossier
+            catalog = get_file_catalog(current_app.config["UPLOAD_FOLDER"], current_app.config["DATA_DIR"])
+            files, total = catalog.list_files(page, self.per_page, sort, order == 'desc', search)
 
-                    # Informations sur le fichier
-                    file_info = {
-                        "name": filename,
-                        "size": os.path.getsize(file_path),
-                        "last_modified": datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%d/%m/%Y"),
-                    }
+            # Espace occupé : les contenus identiques ne sont comptés qu'une fois
+            usage = catalog.usage()
 
-                    files.append(file_info)
+            for file in files:
+                file["last_modified"] = datetime.fromtimestamp(file["mtime"]).strftime("%d/%m/%Y")
 
         except Exception as e:
             flash(f"Erreur lors de la récupération des fichiers : {e}", "danger")
-            files = []
-            
+            files, total = [], 0
+            usage = None
+
+        pages = max((total + self.per_page - 1) // self.per_page, 1)
+
         ctx = {
             "form": form,
-            "files": files
+            "files": files,
+            "sort": sort,
+            "order": order,
+            "search": search,
+            "usage": usage,
+            "pagination": {
+                "page": page,
+                "pages": pages,
+                "total": total,
+                "has_prev": page > 1,
+                "has_next": page < pages,
+                "first_item": (page - 1) * self.per_page + 1 if files else 0,
+                "last_item": (page - 1) * self.per_page + len(files),
+            }
         }
         return render_template(self.template_name, **ctx)
     
@@ -370,10 +890,18 @@ class FilesView(MethodView):
         if form.validate_on_submit():
             file = form.file.data
 
-            filename = file.filename
-            # Utilisation de BASE_DIR qui est probablement un objet Path
-            file_path = f"{current_app.config["UPLOAD_FOLDER"]}/{filename}"
-            file.save(file_path)
+            filename = os.path.basename(file.filename)
+
+            # Fichiers cachés réservés (stockage interne du partage)
+            if not filename or filename.startswith('.'):
+                flash("Nom de fichier invalide.", "danger")
+                return redirect(url_for("files"))
+
+            catalog = get_file_catalog(current_app.config["UPLOAD_FOLDER"], current_app.config["DATA_DIR"])
+
+            # Empreinte calculée pendant l'écriture : un contenu déjà présent n'est pas dupliqué
+            temp_path, sha256, _ = catalog.blobs.write(file.stream)
+            catalog.store(filename, temp_path, sha256)
             
             #flash("Fichier téléchargé avec succès.", "success")
             return redirect(url_for("files"))
@@ -388,18 +916,178 @@ class FilesView(MethodView):
         return render_template(self.template_name, **ctx)
     
 
+def upload_error(message, status=400, offset=None):
+    """Réponse JSON d'erreur de l'API de téléversement"""
+    body = {"error": message}
+    if offset is not None:
+        body["offset"] = offset
+    return jsonify(body), status
+
+
+def check_upload_csrf():
+    """
+    Vérifie le jeton CSRF (en-tête X-CSRFToken) des requêtes de l'API de téléversement
+    Returns:
+        Response: Réponse d'erreur, ou None si le jeton est valide
+    """
+    try:
+        validate_csrf(request.headers.get('X-CSRFToken'))
+    except ValidationError:
+        return upload_error("Jeton CSRF invalide ou absent.", 400)
+    return None
+
+
+class UploadsView(MethodView):
+    """
+    API de téléversement par morceaux : ouverture d'un téléversement.
+    Corps JSON : filename, size, sha256 (optionnel).
+    Si le contenu d'empreinte sha256 est déjà présent dans le partage, le fichier
+    est créé immédiatement sans transfert (réponse 200 avec complete à true).
+    """
+
+    def post(self):
+        error = check_upload_csrf()
+        if error:
+            return error
+
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename') or ''
+        size = data.get('size')
+
+        # Mêmes règles que le formulaire : nom de base et extension autorisée
+        if os.path.basename(filename) != filename or filename.startswith('.'):
+            return upload_error("Nom de fichier invalide.")
+
+        if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
+            return upload_error("Format de fichier non autorisé.")
+
+        if not isinstance(size, int) or size < 0 or size > current_app.config["MAX_CONTENT_LENGTH"]:
+            return upload_error("Taille de fichier invalide.")
+
+        # Contenu déjà présent : une recherche dans l'index des empreintes suffit
+        sha256 = data.get('sha256')
+        if isinstance(sha256, str) and len(sha256) == 64:
+            sha256 = sha256.lower()
+
+            if get_file_catalog(current_app.config["UPLOAD_FOLDER"], current_app.config["DATA_DIR"]).link(filename, sha256, size):
+                return jsonify({"filename": filename, "size": size, "sha256": sha256, "complete": True})
+
+        upload = get_upload_manager(current_app.config["UPLOAD_FOLDER"]).create(filename, size)
+        return jsonify(upload.to_dict()), 201
+
+
+class UploadView(MethodView):
+    """
+    API de téléversement par morceaux : état (reprise), envoi d'un morceau,
+    annulation.
+    """
+
+    def get_upload(self, upload_id):
+        return get_upload_manager(current_app.config["UPLOAD_FOLDER"]).get(upload_id)
+
+    def get(self, upload_id):
+        """Retourne l'état du téléversement (position à partir de laquelle reprendre)"""
+        upload = self.get_upload(upload_id)
+        if upload is None:
+            return upload_error("Téléversement inconnu ou expiré.", 404)
+
+        # Morceaux éventuellement reçus par un autre processus web
+        with upload.lock:
+            upload.refresh()
+        return jsonify(upload.to_dict())
+
+    def put(self, upload_id):
+        """
+        Écrit un morceau (corps brut de la requête) à la position donnée
+        Paramètre : offset (position du morceau dans le fichier)
+        """
+        error = check_upload_csrf()
+        if error:
+            return error
+
+        upload = self.get_upload(upload_id)
+        if upload is None:
+            return upload_error("Téléversement inconnu ou expiré.", 404)
+
+        offset = request.args.get('offset', type=int)
+        length = request.content_length
+
+        if offset is None or length is None:
+            return upload_error("Les paramètres offset et Content-Length sont obligatoires.")
+
+        if length > MAX_CHUNK_SIZE:
+            return upload_error("Morceau trop volumineux.", 413, upload.offset)
+
+        try:
+            offset = upload.write_chunk(offset, request.stream, length)
+        except UploadError as e:
+            return upload_error(str(e), e.status, e.offset)
+
+        return jsonify({"offset": offset})
+
+    def delete(self, upload_id):
+        """Annule le téléversement"""
+        error = check_upload_csrf()
+        if error:
+            return error
+
+        manager = get_upload_manager(current_app.config["UPLOAD_FOLDER"])
+        upload = manager.get(upload_id)
+        if upload is None:
+            return upload_error("Téléversement inconnu ou expiré.", 404)
+
+        upload.abort()
+        manager.discard(upload)
+        return '', 204
+
+
+class UploadCompleteView(MethodView):
+    """
+    API de téléversement par morceaux : finalisation.
+    Corps JSON (optionnel) : sha256, empreinte attendue du fichier.
+    """
+
+    def post(self, upload_id):
+        error = check_upload_csrf()
+        if error:
+            return error
+
+        manager = get_upload_manager(current_app.config["UPLOAD_FOLDER"])
+        upload = manager.get(upload_id)
+        if upload is None:
+            return upload_error("Téléversement inconnu ou expiré.", 404)
+
+        data = request.get_json(silent=True) or {}
+
+        try:
+            catalog = get_file_catalog(current_app.config["UPLOAD_FOLDER"], current_app.config["DATA_DIR"])
+            result = upload.complete(catalog, data.get('sha256'))
+        except UploadError as e:
+            return upload_error(str(e), e.status, e.offset)
+
+        manager.discard(upload)
+        return jsonify(result)
+
+
 class DownloadView(MethodView):
     def get(self, filename):
-        # Sécurisation du chemin pour éviter les attaques de traversée de répertoire
-        if os.path.basename(filename) != filename:
+        # Sécurisation du chemin (traversée de répertoire, fichiers cachés internes au partage)
+        if os.path.basename(filename) != filename or filename.startswith('.'):
             flash("Nom de fichier invalide.", "danger")
             return redirect(url_for("files"))
             
         file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
         
-        if os.path.exists(file_path):
-            # Ajout du type MIME pour améliorer la compatibilité
-            return send_file(file_path, as_attachment=True, download_name=filename)
+        if os.path.isfile(file_path):
+            # Fichier inchangé : réponse 304 sans ouvrir le fichier
+            etag = make_etag(filename, *file_version(file_path))
+            response = not_modified(etag)
+            if response:
+                return response
+            
+            # Fichier entier ou plages demandées (reprise, segments parallèles)
+            response = send_file_ranges(file_path, filename, etag)
+            return set_validators(response, etag)
         else:
             flash("Le fichier demandé n'existe pas.", "danger")
             return redirect(url_for("files"))
@@ -407,8 +1095,8 @@ class DownloadView(MethodView):
 
 class DeleteFileView(MethodView):
     def post(self, filename):
-        # Sécurisation du chemin pour éviter les attaques de traversée de répertoire
-        if os.path.basename(filename) != filename:
+        # Sécurisation du chemin (traversée de répertoire, fichiers cachés internes au partage)
+        if os.path.basename(filename) != filename or filename.startswith('.'):
             flash("Nom de fichier invalide.", "danger")
             return redirect(url_for("files"))
             
@@ -416,7 +1104,8 @@ class DeleteFileView(MethodView):
         
         try:
             if os.path.exists(file_path):
-                os.remove(file_path)
+                # Contenu supprimé seulement s'il n'est plus lié à aucun autre nom
+                get_file_catalog(current_app.config["UPLOAD_FOLDER"], current_app.config["DATA_DIR"]).delete(filename)
                 flash("Fichier supprimé avec succès.", "success")
             else:
                 flash("Le fichier demandé n'existe pas.", "danger")
@@ -428,6 +1117,56 @@ class DeleteFileView(MethodView):
         return redirect(url_for("files"))
     
 
+class HealthView(MethodView):
+    """
+    Point de santé : état du processus web, du serveur de réception (lu dans
+    le répertoire de données) et du stockage. Réponse 503 si un composant est
+    indisponible.
+    """
+
+    # Délai (en secondes) au-delà duquel le serveur de réception est considéré arrêté
+    heartbeat_timeout = 15
+
+    def get(self):
+        data_dir = current_app.config["DATA_DIR"]
+        healthy = True
+
+        # Serveur de réception : processus distinct, état enregistré périodiquement
+        heartbeat = read_heartbeat(data_dir)
+        if heartbeat is not None and time.time() - heartbeat['updated'] <= self.heartbeat_timeout:
+            ingest = dict(heartbeat, status="ok", age=round(time.time() - heartbeat['updated'], 1))
+        else:
+            ingest = {"status": "down"}
+            healthy = False
+
+        try:
+            catalog = get_host_catalog(data_dir)
+            storage = {"status": "ok", "version": catalog.version(), "hosts": catalog.count()}
+        except Exception as e:
+            storage = {"status": "error", "error": str(e)}
+            healthy = False
+
+        # Table des dernières métriques en mémoire partagée (facultative)
+        table = get_latest_table(data_dir)
+        latest_table = {
+            "status": "ok", "hosts": table.count(), "generation": table.generation()
+        } if table is not None else {"status": "unavailable"}
+
+        body = {
+            "status": "ok" if healthy else "degraded",
+            "pid": os.getpid(),
+            "ingest": ingest,
+            "storage": storage,
+            "latest_table": latest_table,
+            "chart_cache": chart_cache.stats(),
+        }
+
+        response = jsonify(body)
+        response.status_code = 200 if healthy else 503
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+
 class AboutView(MethodView):
     template_name = "about.html"
 